@@ -1,27 +1,38 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Request, UploadFile, File, Header
+import logging
+from fastapi import APIRouter, HTTPException, Depends, status, Request, UploadFile, File, Query, Response
 from pydantic import BaseModel, ValidationError
-from sqlalchemy import Column, Integer, String, create_engine, ForeignKey, Text  # Ajoute Text
-from sqlalchemy.orm import sessionmaker, declarative_base, Session, relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Float, Index, func, text  # Ajoute Text
+from sqlalchemy.orm import declarative_base, Session, relationship
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 import inspect
+import threading
+import time
+from collections import OrderedDict
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
+from settings import AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS, AUTO_MIGRATE, BCRYPT_ROUNDS, USERS_DEFAULT_LIMIT, USERS_MAX_LIMIT
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from executors import password_executor, run_in
+from image_gc import image_reclaimer
+from migrations import prepare_database
+
+logger = logging.getLogger(__name__)
 
 # Configuration
 SECRET_KEY = "TON_SECRET_KEY_SUPER_SECRET"  # change ça !
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-# DB Setup
-SQLALCHEMY_DATABASE_URL = "sqlite:///./users.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# DB Setup (moteur configuré dans database.py)
+from database import engine, SessionLocal, case_insensitive_indexes, get_async_db
 Base = declarative_base()
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # Si tu veux supprimer le warning, mets à jour la librairie bcrypt :
 # pip install --upgrade bcrypt
@@ -40,15 +51,22 @@ class User(Base):
     role = Column(String, nullable=False)
     predictions = relationship("Prediction", back_populates="user")
 
+    # Liste /users : filtre par rôle parcouru dans l'ordre des id, recherche par préfixe (sans FTS5)
+    __table_args__ = (
+        Index("ix_users_role_id", "role", "id"),
+        *case_insensitive_indexes("ix_users_nom_search", nom),
+        *case_insensitive_indexes("ix_users_prenom_search", prenom),
+    )
+
 class Prediction(Base):
     __tablename__ = "predictions"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     image_name = Column(String, nullable=True)
     predicted_class = Column(String, nullable=False)
-    confidence = Column(String, nullable=True)
-    date = Column(String, nullable=False)
-    notes = Column(Text, nullable=True)
+    confidence = Column(Float, nullable=True)
+    date = Column(DateTime, nullable=False, default=datetime.utcnow)
+    notes = Column(Text, nullable=True)  # Ancien stockage JSON des notes, vidé par la migration 0003 (voir PredictionNote)
     top_predictions = Column(Text, nullable=True)
     comparison = Column(Text, nullable=True)
     patient_nom = Column(String, nullable=True)      # <-- Ajout
@@ -58,6 +76,92 @@ class Prediction(Base):
     age = Column(String, nullable=True)               # <-- Ajout
     user = relationship("User", back_populates="predictions")
 
+    # Historique d'un utilisateur trié par date, recherche par patient (voir migrations.py)
+    __table_args__ = (
+        Index("ix_predictions_user_date", "user_id", "date"),
+        Index("ix_predictions_patient", "patient_nom", "patient_prenom"),
+        Index("ix_predictions_telephone", "telephone"),
+        # Comptage des références d'une image (image_gc.py)
+        Index("ix_predictions_image_name", "image_name"),
+    )
+
+class Patient(Base):
+    __tablename__ = "patients"
+    id = Column(Integer, primary_key=True, index=True)
+    nom = Column(String, nullable=False)
+    prenom = Column(String, nullable=False)
+    telephone = Column(String, nullable=True)
+    sexe = Column(String, nullable=True)
+    age = Column(String, nullable=True)
+
+    # Un patient est identifié par son téléphone, ou à défaut par nom + prénom + âge (index uniques :
+    # deux créations concurrentes ne font pas de doublon). Recherche par préfixe insensible à la casse.
+    __table_args__ = (
+        Index("ux_patients_telephone", "telephone", unique=True),
+        Index("ux_patients_identity", nom, prenom, func.coalesce(age, ""), unique=True,
+              sqlite_where=text("telephone IS NULL"), postgresql_where=text("telephone IS NULL")),
+        Index("ix_patients_nom_prenom_age", "nom", "prenom", "age"),
+        *case_insensitive_indexes("ix_patients_nom_search", nom),
+        *case_insensitive_indexes("ix_patients_prenom_search", prenom),
+    )
+
+class PredictionNote(Base):
+    __tablename__ = "prediction_notes"
+    id = Column(Integer, primary_key=True)
+    prediction_id = Column(Integer, ForeignKey("predictions.id"), nullable=False)
+    note = Column(Text, nullable=False)
+    date = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    # Notes d'une prédiction, plus récentes d'abord
+    __table_args__ = (
+        Index("ix_prediction_notes_prediction_date", "prediction_id", "date"),
+    )
+
+class CachedPrediction(Base):
+    __tablename__ = "prediction_cache"
+    # SHA-256 du contenu de l'image + version du modèle
+    key = Column(String, primary_key=True)
+    probabilities = Column(Text, nullable=False)
+    created_at = Column(String, nullable=False)
+
+    # Élagage des entrées les plus anciennes (prediction_cache.py)
+    __table_args__ = (Index("ix_prediction_cache_created_at", "created_at"),)
+
+class StoredImage(Base):
+    """Image stockée par contenu (image_store.py) et nombre de prédictions / jobs qui la référencent."""
+    __tablename__ = "stored_images"
+    name = Column(String, primary_key=True)  # <sha256><extension>
+    refcount = Column(Integer, nullable=False, default=0)
+    size = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Dernière prise de référence : la récupération (image_gc.py) ne touche pas une image reprise récemment
+    last_acquired_at = Column(DateTime, nullable=True)
+
+class PredictionJob(Base):
+    __tablename__ = "prediction_jobs"
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # queued -> running -> done | error
+    status = Column(String, nullable=False, default="queued")
+    image_name = Column(String, nullable=False)
+    content_hash = Column(String, nullable=False)
+    patient = Column(Text, nullable=True)  # JSON {nom, prenom, telephone, sexe, age}
+    result = Column(Text, nullable=True)   # JSON, comme la réponse de /predict
+    error = Column(Text, nullable=True)
+    prediction_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    # Processus qui exécute le job et dernier signe de vie (bail, voir jobs.py)
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    # File d'attente : prochain job en statut "queued" par ordre d'arrivée
+    __table_args__ = (
+        Index("ix_prediction_jobs_status_created", "status", "created_at"),
+        Index("ix_prediction_jobs_image_name", "image_name"),
+    )
+
 # Pydantic schemas
 class UserCreate(BaseModel):
     email: str
@@ -84,18 +188,28 @@ class UserProfileUpdate(BaseModel):
     sexe: str | None = None
     telephone: str | None = None
 
+class CurrentUser(BaseModel):
+    """Instantané de l'utilisateur authentifié (détaché de la session, donc partageable en cache)."""
+    id: int
+    email: str
+    role: str | None = None
+    nom: str | None = None
+    prenom: str | None = None
+    claims: dict = {}
+
 class PredictionOut(BaseModel):
     id: int
     image_name: str | None = None
     predicted_class: str
-    confidence: str | None = None
-    date: str
+    confidence: float | None = None
+    date: datetime
 
     class Config:
         orm_mode = True
 
-# Create DB tables
-Base.metadata.create_all(bind=engine)
+# Crée les tables et met à niveau les bases existantes (colonnes typées, index), sous un verrou
+# partagé par les workers ; sans AUTO_MIGRATE, les migrations passent par python migrations.py
+prepare_database(engine, Base.metadata, migrate=AUTO_MIGRATE)
 
 # Helpers
 def get_password_hash(password: str):
@@ -104,6 +218,10 @@ def get_password_hash(password: str):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password, hashed_password):
+    """Renvoie (valide, nouveau hash) ; le nouveau hash n'est pas None si le coût bcrypt a changé."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
@@ -117,6 +235,93 @@ def get_db():
     finally:
         db.close()
 
+class AuthCache:
+    """Cache TTL token -> CurrentUser, invalidable par email (mise à jour ou suppression du compte)."""
+
+    def __init__(self, ttl=AUTH_CACHE_TTL_SECONDS, max_entries=AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tokens_by_email = {}
+        self._lock = threading.Lock()
+
+    def get(self, token, verify_exp=True):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            cached_until, user = entry
+            exp = user.claims.get("exp")
+            if cached_until < now or (verify_exp and exp is not None and exp < now):
+                self._drop(token)
+                return None
+            return user
+
+    def put(self, token, user):
+        with self._lock:
+            self._entries[token] = (time.time() + self.ttl, user)
+            self._tokens_by_email.setdefault(user.email, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, email):
+        with self._lock:
+            for token in self._tokens_by_email.pop(email, set()):
+                self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_email.clear()
+
+    def _drop(self, token):
+        _, user = self._entries.pop(token)
+        tokens = self._tokens_by_email.get(user.email)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_email[user.email]
+
+auth_cache = AuthCache()
+
+class UserAuth:
+    """Dépendance FastAPI : lit le Bearer token, le vérifie une fois et résout l'utilisateur via auth_cache."""
+
+    def __init__(self, verify_exp: bool = True):
+        self.verify_exp = verify_exp
+
+    def __call__(self, request: Request, db: Session = Depends(get_db)) -> CurrentUser:
+        # Les en-têtes Starlette sont insensibles à la casse ("authorization" ou "Authorization")
+        authorization = request.headers.get("authorization")
+        if not authorization or not authorization.startswith("Bearer "):
+            raise HTTPException(status_code=401, detail="Token manquant")
+        token = authorization.split(" ")[1]
+        cached = auth_cache.get(token, verify_exp=self.verify_exp)
+        if cached is not None:
+            return cached
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": self.verify_exp})
+        except Exception:
+            raise HTTPException(status_code=401, detail="Token invalide")
+        user = db.query(User).filter(User.email == payload.get("sub")).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+        current = CurrentUser(
+            id=user.id,
+            email=user.email,
+            role=user.role,
+            nom=user.nom,
+            prenom=user.prenom,
+            claims=payload,
+        )
+        auth_cache.put(token, current)
+        return current
+
+get_current_user = UserAuth()
+# /predict accepte les tokens expirés (comportement historique de la route)
+get_current_user_allow_expired = UserAuth(verify_exp=False)
+
 # Créer un utilisateur admin par défaut s'il n'existe pas
 def create_default_admin():
     db = SessionLocal()
@@ -133,9 +338,12 @@ def create_default_admin():
             )
             db.add(admin_user)
             db.commit()
-            print("Utilisateur admin créé avec succès")
+            logger.info("Utilisateur admin créé avec succès")
+    except IntegrityError:
+        # Créé au même instant par un autre worker
+        db.rollback()
     except Exception as e:
-        print(f"Erreur lors de la création de l'admin: {e}")
+        logger.exception("Erreur lors de la création de l'admin")
     finally:
         db.close()
 
@@ -145,12 +353,13 @@ create_default_admin()
 # FastAPI router
 router = APIRouter()
 
+# bcrypt tourne dans password_executor (voir executors.py), jamais dans le threadpool des routes
 @router.post("/register", status_code=201)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email déjà utilisé")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await run_in(password_executor, get_password_hash, user.password)
     new_user = User(
         email=user.email,
         hashed_password=hashed_password,
@@ -162,15 +371,22 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         role=user.role,  # Enregistre le rôle
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return {"msg": "Utilisateur créé avec succès"}
 
 @router.post("/login", response_model=Token)
-def login(request: Request, user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login(request: Request, user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalars().first()
+    if not db_user:
         raise HTTPException(status_code=401, detail="Email ou mot de passe invalide")
+    valid, new_hash = await run_in(password_executor, verify_and_update_password, user.password, db_user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Email ou mot de passe invalide")
+    if new_hash:
+        # Coût bcrypt modifié depuis le dernier hachage : on profite du mot de passe en clair pour re-hacher
+        db_user.hashed_password = new_hash
+        await db.commit()
     # Vérifie le rôle attendu dans l'URL (query param)
     role_expected = request.query_params.get("role")
     if role_expected and db_user.role != role_expected:
@@ -201,8 +417,46 @@ def login(request: Request, user: UserLogin, db: Session = Depends(get_db)):
     }
 
 @router.get("/users")
-def list_users(db: Session = Depends(get_db)):
-    users = db.query(User).all()
+async def list_users(
+    response: Response,
+    limit: int = Query(USERS_DEFAULT_LIMIT, ge=1, le=USERS_MAX_LIMIT),
+    cursor: str | None = None,
+    role: str | None = None,
+    q: str | None = None,
+    email: str | None = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Utilisateurs paginés par id croissant, filtrables par rôle, e-mail exact ou recherche q (email / nom / prénom).
+
+    La page suivante s'obtient via l'en-tête X-Next-Cursor ; X-Total-Count (première page seulement)
+    donne le nombre total de résultats du filtre.
+    """
+    from user_search import fts_available, search_filter
+
+    conditions = []
+    if role:
+        conditions.append(User.role == role)
+    if email:
+        conditions.append(User.email == email)
+    if q:
+        condition = search_filter(q, await fts_available(db), db.bind.dialect.name)
+        if condition is not None:
+            conditions.append(condition)
+    if cursor is None:
+        # Comptage sur les index (pas de lecture des lignes), une seule fois par recherche
+        total = (await db.execute(select(func.count()).select_from(User).where(*conditions))).scalar_one()
+        response.headers["X-Total-Count"] = str(total)
+    query = select(User).where(*conditions)
+    if cursor:
+        try:
+            query = query.where(User.id > int(cursor))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Curseur invalide")
+    # Une ligne de plus pour savoir s'il reste une page
+    users = (await db.execute(query.order_by(User.id).limit(limit + 1))).scalars().all()
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = str(users[-1].id)
     return [
         {
             "id": user.id,
@@ -220,30 +474,17 @@ def list_users(db: Session = Depends(get_db)):
 @router.put("/users/update_profile")
 def update_profile(
     update: UserProfileUpdate,
-    authorization: str = Header(None),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    print("=== DEBUG UPDATE PROFILE ===")
-    print("Headers reçus:", authorization)
-    print("Données reçues:", update)
-    print("Type des données:", type(update))
-    print("Dict des données:", update.dict())
-    
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Token manquant")
-    token = authorization.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-    except Exception:
-        raise HTTPException(status_code=401, detail="Token invalide")
-    user = db.query(User).filter(User.email == email).first()
+    user = db.query(User).filter(User.id == current_user.id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
     
     # Convertir le modèle Pydantic en dict et filtrer les valeurs None
     update_data = update.dict(exclude_unset=True)
-    print("Données à mettre à jour:", update_data)
+    # Noms des champs seulement, pas leurs valeurs
+    logger.debug("Mise à jour du profil", extra={"user_id": current_user.id, "fields": sorted(update_data)})
     
     # Met à jour les champs si présents dans la requête
     for field in ["nom", "prenom", "sexe", "age", "telephone"]:
@@ -255,7 +496,7 @@ def update_profile(
                 setattr(user, field, update_data[field])
     db.commit()
     db.refresh(user)
-    print("=== FIN DEBUG ===")
+    auth_cache.invalidate(user.email)
     return {"msg": "Profil mis à jour"}
 
 @router.delete("/users/{user_id}")
@@ -268,12 +509,19 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
     if user.role == "admin":
         raise HTTPException(status_code=403, detail="Impossible de supprimer l'administrateur")
     
-    # Supprimer d'abord toutes les prédictions associées
+    # Supprimer d'abord toutes les prédictions associées et leurs notes
+    image_names = [name for (name,) in db.query(Prediction.image_name)
+                   .filter(Prediction.user_id == user_id, Prediction.image_name.isnot(None))]
+    user_predictions = select(Prediction.id).where(Prediction.user_id == user_id)
+    db.query(PredictionNote).filter(PredictionNote.prediction_id.in_(user_predictions)).delete(synchronize_session=False)
     db.query(Prediction).filter(Prediction.user_id == user_id).delete()
     
     # Puis supprimer l'utilisateur
     db.delete(user)
     db.commit()
+    auth_cache.invalidate(user.email)
+    # Images libérées en arrière-plan (une image partagée avec d'autres prédictions reste en place)
+    image_reclaimer.enqueue(*image_names)
     return {"msg": "Utilisateur supprimé avec succès"}
 
 @router.put("/users/{user_id}")
@@ -294,6 +542,7 @@ def update_user(user_id: int, update_data: dict, db: Session = Depends(get_db)):
     
     db.commit()
     db.refresh(user)
+    auth_cache.invalidate(user.email)
     return {"msg": "Utilisateur mis à jour avec succès"}
 
 @router.get("/history/{email}", response_model=list[PredictionOut])
@@ -301,8 +550,13 @@ def get_history(email: str, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == email).first()
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
-    # Trie l'historique du plus récent au plus ancien
-    return sorted(user.predictions, key=lambda p: p.date, reverse=True)
+    # Trie l'historique du plus récent au plus ancien (index ix_predictions_user_date)
+    return (
+        db.query(Prediction)
+        .filter(Prediction.user_id == user.id)
+        .order_by(Prediction.date.desc(), Prediction.id.desc())
+        .all()
+    )
 
 # Après avoir ajouté la colonne "telephone" dans la classe User,
 # il faut générer la migration ou supprimer le fichier users.db pour SQLite
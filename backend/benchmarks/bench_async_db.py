@@ -0,0 +1,86 @@
+"""Charge à 50 clients concurrents : route d'historique sur session synchrone vs session asynchrone.
+
+Usage : python benchmarks/bench_async_db.py [--clients 50] [--requests 2000] [--rows 200]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from common import percentiles, print_report
+
+
+async def load(client, url, clients, requests):
+    latencies = []
+    remaining = [requests]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            t0 = time.perf_counter()
+            res = await client.get(url)
+            latencies.append(time.perf_counter() - t0)
+            assert res.status_code == 200, res.text
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - t0
+    return {"requests_per_sec": round(requests / elapsed, 1), **percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import httpx
+        from fastapi import Depends, FastAPI
+        from sqlalchemy import select
+        from sqlalchemy.ext.asyncio import AsyncSession
+        from sqlalchemy.orm import Session
+
+        from auth import Prediction, SessionLocal, User, get_db
+        from database import get_async_db
+
+        db = SessionLocal()
+        user = User(email="bench@bench.local", hashed_password="x", role="patient")
+        db.add(user)
+        db.flush()
+        start = datetime(2025, 1, 1)
+        db.add_all([Prediction(user_id=user.id, predicted_class="Eczema", confidence=0.5,
+                               date=start + timedelta(minutes=i)) for i in range(args.rows)])
+        db.commit()
+        user_id = user.id
+        db.close()
+
+        app = FastAPI()
+
+        @app.get("/sync")
+        def sync_history(db: Session = Depends(get_db)):
+            rows = (db.query(Prediction).filter(Prediction.user_id == user_id)
+                      .order_by(Prediction.date.desc()).limit(50).all())
+            return [r.id for r in rows]
+
+        @app.get("/async")
+        async def async_history(db: AsyncSession = Depends(get_async_db)):
+            rows = (await db.execute(select(Prediction).where(Prediction.user_id == user_id)
+                                     .order_by(Prediction.date.desc()).limit(50))).scalars().all()
+            return [r.id for r in rows]
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                return [{"variant": route.strip("/"), **await load(client, route, args.clients, args.requests)}
+                        for route in ("/sync", "/async")]
+
+        print_report(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Requêtes/s sur un endpoint authentifié vide : ancien décodage par route vs dépendance get_current_user.
+
+Usage : python benchmarks/bench_auth.py [--requests 2000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import print_report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        from fastapi import Depends, FastAPI, Header, HTTPException
+        from fastapi.testclient import TestClient
+        from jose import jwt
+        from sqlalchemy.orm import Session
+
+        from auth import (ALGORITHM, SECRET_KEY, CurrentUser, SessionLocal, User, create_access_token,
+                          get_current_user, get_db)
+
+        db = SessionLocal()
+        db.add(User(email="bench@bench.local", hashed_password="x", role="patient"))
+        db.commit()
+        db.close()
+
+        app = FastAPI()
+
+        @app.get("/legacy")
+        def legacy(authorization: str = Header(None), db: Session = Depends(get_db)):
+            if not authorization or not authorization.startswith("Bearer "):
+                raise HTTPException(status_code=401, detail="Token manquant")
+            payload = jwt.decode(authorization.split(" ")[1], SECRET_KEY, algorithms=[ALGORITHM])
+            user = db.query(User).filter(User.email == payload.get("sub")).first()
+            return {"id": user.id}
+
+        @app.get("/cached")
+        def cached(current_user: CurrentUser = Depends(get_current_user)):
+            return {"id": current_user.id}
+
+        client = TestClient(app)
+        token = create_access_token(data={"sub": "bench@bench.local", "role": "patient"})
+        headers = {"Authorization": f"Bearer {token}"}
+        rows = []
+        for route in ("/legacy", "/cached"):
+            client.get(route, headers=headers)
+            t0 = time.perf_counter()
+            for _ in range(args.requests):
+                assert client.get(route, headers=headers).status_code == 200
+            elapsed = time.perf_counter() - t0
+            rows.append({"route": route, "requests_per_sec": round(args.requests / elapsed, 1)})
+        print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
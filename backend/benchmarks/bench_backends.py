@@ -0,0 +1,81 @@
+"""Parité et performances des backends d'inférence (keras, compiled, tflite-float16, tflite-int8).
+
+Pour chaque backend : écart maximal des probabilités par rapport à Keras sur les 11 classes,
+accord sur la classe prédite, latence p50/p99 pour un lot d'une image et RSS maximal
+(chaque backend est mesuré dans un processus séparé).
+
+Usage : python benchmarks/bench_backends.py [--model chemin.keras] [--runs 50]
+"""
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common import NUM_CLASSES, load_model, percentiles, print_report, random_inputs
+
+BACKENDS = ["keras", "compiled", "tflite-float16", "tflite-int8"]
+
+
+def measure(name, model_path, inputs, runs, out):
+    from inference_backends import create_backend
+
+    backend = create_backend(name, model_path)
+    probs = backend.predict(inputs)
+    latencies = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        backend.predict(inputs[i % len(inputs)][None])
+        latencies.append(time.perf_counter() - t0)
+    out.put({
+        "probs": probs,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **percentiles(latencies[1:]),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=32)
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    args = parser.parse_args()
+
+    inputs = random_inputs(args.samples)
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = args.model
+        if not model_path:
+            model_path = str(Path(tmp) / "standin.keras")
+            load_model().save(model_path)
+
+        ctx = multiprocessing.get_context("spawn")
+        results = {}
+        for name in BACKENDS:
+            out = ctx.Queue()
+            proc = ctx.Process(target=measure, args=(name, model_path, inputs, args.runs, out))
+            proc.start()
+            results[name] = out.get()
+            proc.join()
+
+    reference = results["keras"].pop("probs")
+    assert reference.shape[1] == NUM_CLASSES
+    rows = []
+    for name in BACKENDS:
+        probs = results[name].pop("probs", reference)
+        max_abs_diff = float(np.max(np.abs(probs - reference)))
+        rows.append({
+            "backend": name,
+            "max_abs_diff": round(max_abs_diff, 6),
+            "top1_agreement": float(np.mean(probs.argmax(1) == reference.argmax(1))),
+            "within_tolerance": max_abs_diff <= args.tolerance,
+            **results[name],
+        })
+    print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Compare l'inférence image par image et le micro-batching sous différentes concurrences.
+
+Usage : python benchmarks/bench_batching.py [--model chemin.keras] [--requests 200]
+"""
+import argparse
+import asyncio
+import time
+
+from common import load_model, percentiles, print_report, random_inputs
+
+from inference import BatchInferenceEngine
+
+
+async def run_scenario(engine, inputs, concurrency):
+    latencies = []
+    queue = list(range(len(inputs)))
+
+    async def client():
+        while queue:
+            i = queue.pop()
+            t0 = time.perf_counter()
+            await engine.predict(inputs[i])
+            latencies.append(time.perf_counter() - t0)
+
+    await engine.start()
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    await engine.stop()
+    return {"images_per_sec": round(len(inputs) / elapsed, 2), **percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    predict_fn = lambda batch: model.predict(batch, verbose=0)
+    inputs = random_inputs(args.requests)
+    predict_fn(inputs[:1])  # préchauffage
+
+    rows = []
+    for concurrency in args.concurrency:
+        for mode, batch_size, wait_ms in (("single", 1, 0), ("batched", args.max_batch_size, args.max_wait_ms)):
+            engine = BatchInferenceEngine(predict_fn, max_batch_size=batch_size, max_wait_ms=wait_ms)
+            result = asyncio.run(run_scenario(engine, inputs, concurrency))
+            rows.append({"mode": mode, "concurrency": concurrency, **result})
+    print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
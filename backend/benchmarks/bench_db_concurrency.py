@@ -0,0 +1,108 @@
+"""Charge concurrente sur la base : insertions de prédictions et lectures d'historique en parallèle.
+
+Pour chaque configuration (SQLite par défaut, SQLite WAL réglé, et --url pour une base serveur),
+rapporte le débit d'écritures et de lectures et le nombre d'erreurs de verrouillage.
+
+Usage : python benchmarks/bench_db_concurrency.py [--seconds 5] [--writers 8] [--readers 8] [--url postgresql://...]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from common import print_report
+
+
+def hammer(engine, seconds, writers, readers):
+    from auth import Base, Prediction, User
+
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    user = User(email=f"bench{time.time_ns()}@bench.local", hashed_password="x", role="medecin")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    counts = {"writes": 0, "reads": 0, "lock_errors": 0, "other_errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer():
+        while time.perf_counter() < deadline:
+            db = Session()
+            try:
+                db.add(Prediction(user_id=user_id, image_name="x.jpg", predicted_class="Eczema",
+                                  confidence=0.5, date=datetime.utcnow()))
+                db.commit()
+                bump("writes")
+            except OperationalError as e:
+                db.rollback()
+                bump("lock_errors" if "locked" in str(e) else "other_errors")
+            finally:
+                db.close()
+
+    def reader():
+        while time.perf_counter() < deadline:
+            db = Session()
+            try:
+                (db.query(Prediction).filter(Prediction.user_id == user_id)
+                   .order_by(Prediction.date.desc()).limit(50).all())
+                bump("reads")
+            except OperationalError as e:
+                bump("lock_errors" if "locked" in str(e) else "other_errors")
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    return {
+        "writes_per_sec": round(counts["writes"] / seconds, 1),
+        "reads_per_sec": round(counts["reads"] / seconds, 1),
+        "lock_errors": counts["lock_errors"],
+        "other_errors": counts["other_errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--url", default=None, help="URL d'une base serveur à mesurer en plus")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.environ["DERMASCAN_AUTO_MIGRATE"] = "0"
+        from database import SQLITE_PRAGMAS, create_db_engine
+
+        configs = [
+            ("sqlite-default", create_db_engine(f"sqlite:///{tmp}/default.db", sqlite_pragmas={})),
+            ("sqlite-tuned", create_db_engine(f"sqlite:///{tmp}/tuned.db", sqlite_pragmas=SQLITE_PRAGMAS)),
+        ]
+        if args.url:
+            configs.append(("server-pool", create_db_engine(args.url)))
+        rows = []
+        for name, engine in configs:
+            rows.append({"config": name, **hammer(engine, args.seconds, args.writers, args.readers)})
+        print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Décodage + redimensionnement par résolution d'entrée : chemin pleine résolution vs réduction au décodage.
+
+Rapporte le temps médian de chaque chemin, l'écart moyen des pixels et l'écart maximal des
+probabilités du modèle entre les deux chemins ; le script échoue (code de sortie non nul) si cet
+écart dépasse --tolerance pour une résolution.
+
+Usage : python benchmarks/bench_decode.py [--model chemin.keras] [--tolerance 0.05]
+"""
+import argparse
+import io
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from common import load_model, print_report
+
+from preprocessing import decode_and_resize
+
+RESOLUTIONS = [(1024, 768), (2048, 1536), (4000, 3000), (6000, 4000)]
+
+
+def synthetic_jpeg(width, height, seed=0):
+    """Image JPEG pseudo-réaliste (dégradés + bruit flouté) pour ne pas avantager le décodeur."""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, size=(height // 16, width // 16, 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize((width, height), Image.Resampling.BILINEAR)
+    image = image.filter(ImageFilter.GaussianBlur(2))
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def median_time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples)) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    args = parser.parse_args()
+
+    from tensorflow.keras.applications.densenet import preprocess_input
+    model = load_model(args.model)
+
+    rows = []
+    for width, height in RESOLUTIONS:
+        data = synthetic_jpeg(width, height)
+        full = decode_and_resize(data, reducing_gap=None)
+        fast = decode_and_resize(data)
+        probs = model.predict(preprocess_input(np.stack([full, fast]).astype(np.float32)), verbose=0)
+        max_prob_diff = float(np.max(np.abs(probs[0] - probs[1])))
+        rows.append({
+            "resolution": f"{width}x{height}",
+            "full_decode_ms": round(median_time(lambda: decode_and_resize(data, reducing_gap=None), args.repeat), 2),
+            "reduced_decode_ms": round(median_time(lambda: decode_and_resize(data), args.repeat), 2),
+            "mean_pixel_diff": round(float(np.mean(np.abs(full.astype(int) - fast.astype(int)))), 3),
+            "max_prob_diff": round(max_prob_diff, 5),
+            "within_tolerance": max_prob_diff <= args.tolerance,
+        })
+    print_report(rows)
+    failed = [row["resolution"] for row in rows if not row["within_tolerance"]]
+    if failed:
+        sys.exit(f"Écart de probabilités au-delà de {args.tolerance} : {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Taille et latence de /history_full à 10/100/1000 lignes : mode base64 historique vs pagination.
+
+Le mode historique récupère tout l'historique (images incluses) ; le mode paginé, la première page.
+
+Usage : python benchmarks/bench_history.py [--image-kb 200] [--repeat 5]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from common import auth_headers, load_app, print_report
+
+from settings import HISTORY_DEFAULT_LIMIT, HISTORY_MAX_LIMIT
+
+ROW_COUNTS = [10, 100, 1000]
+
+
+def seed_user(main, email, rows, image_kb):
+    from auth import Prediction, SessionLocal, User
+
+    os.makedirs("uploads", exist_ok=True)
+    image_name = f"{email}.jpg"
+    with open(f"uploads/{image_name}", "wb") as f:
+        f.write(os.urandom(image_kb * 1024))
+    db = SessionLocal()
+    user = User(email=email, hashed_password="x", role="patient")
+    db.add(user)
+    db.flush()
+    start = datetime(2025, 1, 1)
+    db.add_all([
+        Prediction(
+            user_id=user.id,
+            image_name=image_name,
+            predicted_class="Eczema",
+            confidence=0.9,
+            date=start + timedelta(minutes=i),
+            top_predictions="[]",
+        )
+        for i in range(rows)
+    ])
+    db.commit()
+    db.close()
+
+
+def measure(client, url, headers, repeat, all_pages=False):
+    """Latence médiane et taille totale ; all_pages suit X-Next-Cursor jusqu'au bout de l'historique."""
+    samples, size = [], 0
+    for _ in range(repeat):
+        size = 0
+        t0 = time.perf_counter()
+        res = client.get(url, headers=headers)
+        size += len(res.content)
+        while all_pages and res.headers.get("X-Next-Cursor"):
+            res = client.get(f"{url}&cursor={res.headers['X-Next-Cursor']}", headers=headers)
+            size += len(res.content)
+        samples.append(time.perf_counter() - t0)
+    return round(float(np.median(samples)) * 1000, 2), size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image-kb", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module = load_app(tmp)
+        client = TestClient(app_module.app)
+        rows = []
+        for count in ROW_COUNTS:
+            email = f"history{count}@bench.local"
+            seed_user(app_module, email, count, args.image_kb)
+            headers = auth_headers(email)
+            legacy_ms, legacy_size = measure(
+                client, f"/history_full/{email}?limit={HISTORY_MAX_LIMIT}&inline_images=true", headers,
+                args.repeat, all_pages=True)
+            page_ms, page_size = measure(client, f"/history_full/{email}?limit={HISTORY_DEFAULT_LIMIT}", headers, args.repeat)
+            rows.append({
+                "rows": count,
+                "legacy_inline_ms": legacy_ms,
+                "legacy_inline_bytes": legacy_size,
+                "paginated_ms": page_ms,
+                "paginated_bytes": page_size,
+            })
+        print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Requêtes d'historique sur 100k prédictions : schéma historique (dates texte, sans index, tri Python)
+vs schéma migré (DATETIME, index (user_id, date), ORDER BY ... LIMIT). Mesure aussi la durée de la migration.
+
+Usage : python benchmarks/bench_history_queries.py [--rows 100000] [--users 100]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from common import print_report
+
+LEGACY_DDL = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR UNIQUE NOT NULL, hashed_password VARCHAR NOT NULL,
+    nom VARCHAR, prenom VARCHAR, age VARCHAR, sexe VARCHAR, telephone VARCHAR, role VARCHAR NOT NULL);
+CREATE TABLE predictions (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id), image_name VARCHAR,
+    predicted_class VARCHAR, confidence VARCHAR, date VARCHAR, notes TEXT, top_predictions TEXT, comparison TEXT,
+    patient_nom VARCHAR, patient_prenom VARCHAR, telephone VARCHAR, sexe VARCHAR, age VARCHAR);
+CREATE INDEX ix_predictions_id ON predictions (id);
+"""
+
+
+def seed_legacy(path, rows, users):
+    rng = random.Random(0)
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_DDL)
+    conn.executemany("INSERT INTO users (id, email, hashed_password, role) VALUES (?, ?, 'x', 'medecin')",
+                     [(u, f"user{u}@bench.local") for u in range(1, users + 1)])
+    start = datetime(2024, 1, 1)
+    conn.executemany(
+        "INSERT INTO predictions (user_id, image_name, predicted_class, confidence, date, patient_nom, patient_prenom) "
+        "VALUES (?, 'img.jpg', 'Eczema', ?, ?, ?, ?)",
+        [(rng.randint(1, users), str(rng.random()), (start + timedelta(seconds=rng.randint(0, 10**8))).isoformat(),
+          f"Nom{rng.randint(0, 5000)}", "Prenom") for _ in range(rows)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return round(samples[len(samples) // 2] * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_legacy(os.path.join(tmp, "users.db"), args.rows, args.users)
+        conn = sqlite3.connect(os.path.join(tmp, "users.db"))
+
+        def legacy_history():
+            rows = conn.execute("SELECT * FROM predictions WHERE user_id = 42").fetchall()
+            return sorted(rows, key=lambda r: r[5], reverse=True)[:50]
+
+        def legacy_patient():
+            return conn.execute("SELECT * FROM predictions WHERE patient_nom = 'Nom123' AND patient_prenom = 'Prenom'").fetchall()
+
+        before = {"history_ms": timed(legacy_history, args.repeat), "patient_lookup_ms": timed(legacy_patient, args.repeat)}
+
+        os.chdir(tmp)
+        os.environ["DERMASCAN_AUTO_MIGRATE"] = "0"
+        from auth import engine
+        from migrations import run_migrations
+        t0 = time.perf_counter()
+        run_migrations(engine)
+        migration_s = round(time.perf_counter() - t0, 2)
+
+        def typed_history():
+            return conn.execute(
+                "SELECT * FROM predictions WHERE user_id = 42 ORDER BY date DESC, id DESC LIMIT 50").fetchall()
+
+        after = {"history_ms": timed(typed_history, args.repeat), "patient_lookup_ms": timed(legacy_patient, args.repeat)}
+        print_report({"rows": args.rows, "before": before, "after": after, "migration_seconds": migration_s})
+
+
+if __name__ == "__main__":
+    main()
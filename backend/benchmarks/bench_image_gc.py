@@ -0,0 +1,108 @@
+"""Récupération des images (image_gc.py) : durée d'une passe de réconciliation et coût d'une suppression.
+
+Crée N images dans le stockage par contenu (fichiers + lignes stored_images) dont une part n'est plus
+référencée par aucune prédiction, plus des fichiers sans ligne et des temporaires abandonnés ; mesure une
+passe en simulation puis une passe réelle, et compare la libération synchrone d'une image (ancien
+comportement des routes de suppression) à sa mise en file.
+
+Usage : python benchmarks/bench_image_gc.py [--images 20000] [--orphans 0.3] [--batch 500]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from common import load_app, percentiles, print_report, seed_database
+
+OLD = datetime.utcnow() - timedelta(days=30)
+
+
+def populate(count, orphan_ratio):
+    from auth import Prediction, SessionLocal, StoredImage, User
+    from image_store import OBJECTS_DIR, TMP_DIR, image_path, shard
+
+    email, = seed_database(1, 0)
+    names = [hashlib.sha256(str(i).encode()).hexdigest() + ".jpg" for i in range(count)]
+    referenced = int(count * (1 - orphan_ratio))
+    for name in names:
+        path = image_path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 1024)
+    db = SessionLocal()
+    user_id = db.query(User.id).filter(User.email == email).scalar()
+    db.bulk_insert_mappings(StoredImage, [
+        {"name": name, "refcount": 1, "size": 1024, "created_at": OLD, "last_acquired_at": OLD} for name in names
+    ])
+    db.bulk_insert_mappings(Prediction, [
+        {"user_id": user_id, "image_name": name, "predicted_class": "Nevus", "confidence": 0.9, "date": OLD}
+        for name in names[:referenced]
+    ])
+    db.commit()
+    db.close()
+    # Fichiers sans ligne en base et temporaires abandonnés, vieillis au-delà du délai de grâce
+    old = OLD.timestamp()
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    for i in range(count // 10):
+        stray = hashlib.sha256(f"stray{i}".encode()).hexdigest() + ".jpg"
+        path = shard(OBJECTS_DIR, stray) / stray
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"y" * 1024)
+        os.utime(path, (old, old))
+        part = TMP_DIR / f"abandon{i}.part"
+        part.write_bytes(b"z" * 512)
+        os.utime(part, (old, old))
+    return names[:referenced]
+
+
+def delete_latencies(names, release):
+    latencies = []
+    for name in names:
+        t0 = time.perf_counter()
+        release(name)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=20_000)
+    parser.add_argument("--orphans", type=float, default=0.3, help="part des images sans référence")
+    parser.add_argument("--batch", type=int, default=500, help="taille des lots de réconciliation")
+    parser.add_argument("--deletes", type=int, default=500)
+    args = parser.parse_args()
+    os.environ.setdefault("DERMASCAN_LOG_LEVEL", "WARNING")
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        load_app(tmp)
+        from image_gc import ImageReclaimer
+        from image_store import release_image
+
+        t0 = time.perf_counter()
+        referenced = populate(args.images, args.orphans)
+        print(f"Stockage : {args.images} images ({time.perf_counter() - t0:.1f} s)")
+
+        reclaimer = ImageReclaimer(interval=0, batch_size=args.batch)
+        rows = []
+        for dry_run in (True, False):
+            report = asyncio.run(reclaimer.run_pass(dry_run=dry_run))
+            rows.append({"variant": f"passe {'simulation' if dry_run else 'réelle'} (lots de {args.batch})",
+                         **report})
+        # Deuxième passe réelle : plus rien à faire, coût du simple parcours
+        rows.append({"variant": "passe réelle sur stockage propre", **asyncio.run(reclaimer.run_pass(dry_run=False))})
+
+        half = min(args.deletes, len(referenced) // 2)
+        sync = delete_latencies(referenced[:half], release_image)
+        queued = delete_latencies(referenced[half:2 * half], reclaimer.enqueue)
+        t0 = time.perf_counter()
+        reclaimer.drain()
+        rows.append({"variant": "suppression synchrone (ancien)", "deletes": half, **percentiles(sync)})
+        rows.append({"variant": "suppression mise en file", "deletes": half, **percentiles(queued),
+                     "drain_s": round(time.perf_counter() - t0, 3)})
+        print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
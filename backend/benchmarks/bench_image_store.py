@@ -0,0 +1,99 @@
+"""Répertoire uploads/ à plat vs stockage par contenu réparti (image_store.py).
+
+Crée N petits fichiers dans chaque disposition puis mesure la création, l'accès à des fichiers
+au hasard (stat) et le listage d'un répertoire. Vérifie aussi la déduplication : des uploads
+répétés d'un même contenu ne produisent qu'un fichier et autant de références.
+
+Usage : python benchmarks/bench_image_store.py [--files 100000] [--lookups 20000] [--duplicates 4]
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common import percentiles, print_report
+
+
+def populate(root, names, path_for):
+    t0 = time.perf_counter()
+    for i, name in enumerate(names):
+        path = path_for(root, name)
+        if i == 0 or not path.parent.is_dir():
+            path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(name.encode())
+    return time.perf_counter() - t0
+
+
+def lookups(root, names, path_for, picks):
+    latencies = []
+    for i in picks:
+        t0 = time.perf_counter()
+        path_for(root, names[i]).stat()
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--duplicates", type=int, default=4, help="uploads de chaque contenu (déduplication)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        from image_store import image_path, release_image, shard, store_file, temp_path
+
+        names = [hashlib.sha256(str(i).encode()).hexdigest() + ".jpg" for i in range(args.files)]
+        picks = np.random.default_rng(0).integers(0, args.files, args.lookups)
+        layouts = {
+            "à plat (uploads/<nom>)": lambda root, name: root / name,
+            "réparti (objects/<ab>/<cd>/<clé>)": lambda root, name: shard(root, name) / name,
+        }
+        rows = []
+        for label, path_for in layouts.items():
+            root = Path(tmp) / ("flat" if "plat" in label else "sharded")
+            create = populate(root, names, path_for)
+            lat = lookups(root, names, path_for, picks)
+            listing_dir = path_for(root, names[0]).parent
+            t0 = time.perf_counter()
+            listed = len(os.listdir(listing_dir))
+            rows.append({
+                "layout": label,
+                "files": args.files,
+                "create_s": round(create, 2),
+                "stat_mean_us": round(float(np.mean(lat)) * 1e6, 2),
+                **percentiles(lat),
+                "listdir_entries": listed,
+                "listdir_ms": round((time.perf_counter() - t0) * 1000, 3),
+            })
+
+        # Déduplication : même contenu enregistré plusieurs fois via image_store (références en base)
+        from auth import StoredImage, SessionLocal
+        content = os.urandom(200_000)
+        key = hashlib.sha256(content).hexdigest() + ".jpg"
+        for _ in range(args.duplicates):
+            part = temp_path()
+            part.write_bytes(content)
+            store_file(part, key)
+        db = SessionLocal()
+        refcount = db.get(StoredImage, key).refcount
+        db.close()
+        objects = sum(len(files) for _, _, files in os.walk("uploads/objects"))
+        released = [release_image(key) for _ in range(args.duplicates)]
+        rows.append({
+            "dedupe_uploads": args.duplicates,
+            "files_written": objects,
+            "refcount": refcount,
+            "deleted_on_last_release_only": released == [False] * (args.duplicates - 1) + [True],
+            "file_left": image_path(key).exists(),
+        })
+        print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Latence de l'historique pendant une vague de connexions : bcrypt dans le threadpool par défaut vs password_executor.
+
+La variante "threadpool" est une route de comparaison (ancien /login synchrone) ajoutée par ce script.
+
+Usage : python benchmarks/bench_login_storm.py [--logins 100] [--rounds 10] [--history-clients 4]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from common import auth_headers, load_app, percentiles, print_report
+
+EMAIL = "bench@bench.local"
+PASSWORD = "motdepasse"
+
+
+async def history_load(client, headers, stop):
+    latencies = []
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        res = await client.get(f"/history/{EMAIL}", headers=headers)
+        latencies.append(time.perf_counter() - t0)
+        assert res.status_code == 200, res.text
+    return latencies
+
+
+async def scenario(client, headers, login_url, logins, history_clients):
+    stop = asyncio.Event()
+    history = [asyncio.create_task(history_load(client, headers, stop)) for _ in range(history_clients)]
+    t0 = time.perf_counter()
+    if login_url:
+        results = await asyncio.gather(*(client.post(login_url, json={"email": EMAIL, "password": PASSWORD})
+                                         for _ in range(logins)))
+        assert all(r.status_code == 200 for r in results), results[0].text
+    else:
+        await asyncio.sleep(2)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    latencies = [x for task in history for x in await task]
+    return {"history_requests": len(latencies), "storm_seconds": round(elapsed, 3), **percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--history-clients", type=int, default=4)
+    args = parser.parse_args()
+    os.environ["DERMASCAN_BCRYPT_ROUNDS"] = str(args.rounds)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        main_module = load_app(tmp)
+        import httpx
+        from auth import SessionLocal, User, get_db, get_password_hash, verify_password
+        from fastapi import Depends, HTTPException
+
+        db = SessionLocal()
+        db.add(User(email=EMAIL, hashed_password=get_password_hash(PASSWORD), role="patient"))
+        db.commit()
+        db.close()
+
+        @main_module.app.post("/bench/login_threadpool")
+        def login_threadpool(payload: dict, db=Depends(get_db)):
+            user = db.query(User).filter(User.email == payload["email"]).first()
+            if not user or not verify_password(payload["password"], user.hashed_password):
+                raise HTTPException(status_code=401)
+            return {"ok": True}
+
+        async def run():
+            transport = httpx.ASGITransport(app=main_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                headers = auth_headers(EMAIL)
+                rows = []
+                for variant, url in (("sans connexions", None),
+                                     ("bcrypt dans le threadpool par défaut", "/bench/login_threadpool"),
+                                     ("bcrypt dans password_executor (/login)", "/login")):
+                    rows.append({"variant": variant, **await scenario(client, headers, url, args.logins,
+                                                                      args.history_clients)})
+                return rows
+
+        print_report(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
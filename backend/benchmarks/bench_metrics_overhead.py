@@ -0,0 +1,75 @@
+"""Coût de l'instrumentation : micro-mesures des métriques, puis /predict (chemin le plus court, cache
+des prédictions) avec et sans métriques.
+
+Usage : python benchmarks/bench_metrics_overhead.py [--requests 300] [--ops 200000]
+"""
+import argparse
+import io
+import tempfile
+import time
+
+import numpy as np
+
+from common import auth_headers, load_app, percentiles, print_report
+
+EMAIL = "bench@bench.local"
+
+
+def micro(ops):
+    from metrics import Counter, Histogram
+    counter = Counter("bench_counter_total", "bench", ["result"])
+    histogram = Histogram("bench_seconds", "bench", ["stage"])
+    rows = []
+    for name, fn in (("Counter.inc", lambda: counter.inc(result="hit")),
+                     ("Histogram.observe", lambda: histogram.observe(0.003, stage="decode")),
+                     ("Histogram.time", lambda: histogram.time(stage="decode").__enter__().__exit__())):
+        t0 = time.perf_counter()
+        for _ in range(ops):
+            fn()
+        rows.append({"variant": name, "ns_per_op": round((time.perf_counter() - t0) / ops * 1e9, 1)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--ops", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        main_module = load_app(tmp)
+        import metrics
+        from auth import SessionLocal, User
+        from fastapi.testclient import TestClient
+        from PIL import Image
+
+        rows = micro(args.ops)
+
+        db = SessionLocal()
+        db.add(User(email=EMAIL, hashed_password="x", role="patient"))
+        db.commit()
+        db.close()
+        buf = io.BytesIO()
+        Image.fromarray(np.random.default_rng(0).integers(0, 255, (600, 800, 3), dtype=np.uint8)).save(buf, "JPEG")
+        files = {"file": ("x.jpg", buf.getvalue(), "image/jpeg")}
+        headers = auth_headers(EMAIL)
+
+        with TestClient(main_module.app) as client:
+            # Préchauffage et remplissage du cache : les requêtes suivantes ne passent plus par le modèle
+            for _ in range(20):
+                client.post("/predict", files=files, headers=headers)
+            for enabled in (False, True, False, True):
+                metrics.METRICS_ENABLED = enabled
+                samples = []
+                for _ in range(args.requests):
+                    t0 = time.perf_counter()
+                    res = client.post("/predict", files=files, headers=headers)
+                    samples.append(time.perf_counter() - t0)
+                    assert res.status_code == 200, res.text
+                rows.append({"variant": f"/predict (cache) métriques {'actives' if enabled else 'désactivées'}",
+                             "mean_ms": round(float(np.mean(samples)) * 1000, 3), **percentiles(samples)})
+        print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Registre des patients : import CSV en masse, latence de /patients/create_or_get et de /patients/search.
+
+Vérifie aussi que des créations concurrentes du même patient ne produisent qu'une seule ligne.
+
+Usage : python benchmarks/bench_patients.py [--patients 50000] [--requests 500] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from common import auth_headers, load_app, percentiles, print_report
+
+NOMS = ["Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy", "Moreau",
+        "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "David", "Bertrand", "Roux", "Vincent", "Fournier"]
+PRENOMS = ["Jean", "Marie", "Pierre", "Sophie", "Luc", "Claire", "Paul", "Julie", "Marc", "Anne",
+           "Louis", "Emma", "Hugo", "Léa", "Nora", "Yanis", "Inès", "Adam", "Sarah", "Karim"]
+
+
+def patients_csv(n, seed=0):
+    """CSV déterministe de n patients distincts (séparateur ;), environ un sur dix sans téléphone."""
+    rng = np.random.default_rng(seed)
+    lines = ["nom;prenom;telephone;sexe;age"]
+    for i in range(n):
+        phone = "" if i % 10 == 0 else f"06{i:08d}"
+        lines.append(f"{NOMS[i % len(NOMS)]}{i // len(NOMS)};{PRENOMS[int(rng.integers(len(PRENOMS)))]};"
+                     f"{phone};{'MF'[i % 2]};{int(rng.integers(1, 95))}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+async def timed(make_request, requests, concurrency):
+    latencies = []
+    indices = iter(range(requests))
+
+    async def client():
+        for i in indices:
+            t0 = time.perf_counter()
+            res = await make_request(i)
+            latencies.append(time.perf_counter() - t0)
+            assert res.status_code == 200, res.text
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=50_000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    os.environ.setdefault("DERMASCAN_LOG_LEVEL", "WARNING")
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        main_module = load_app(tmp)
+        import httpx
+        from auth import Patient, SessionLocal, User
+
+        db = SessionLocal()
+        db.add(User(email="medecin@bench.local", hashed_password="-", role="medecin"))
+        db.commit()
+        db.close()
+        headers = auth_headers("medecin@bench.local", "medecin")
+        payload = patients_csv(args.patients)
+
+        async def run():
+            rows = []
+            transport = httpx.ASGITransport(app=main_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                t0 = time.perf_counter()
+                res = await client.post("/patients/import", headers=headers,
+                                        files={"file": ("patients.csv", payload, "text/csv")})
+                elapsed = time.perf_counter() - t0
+                assert res.status_code == 200, res.text
+                stats = res.json()
+                rows.append({"scenario": "import_csv", "rows": stats["rows"], "inserted": stats["inserted"],
+                             "seconds": round(elapsed, 3), "rows_per_s": round(stats["rows"] / elapsed)})
+
+                # Réimport : tout est ignoré grâce aux index uniques
+                res = await client.post("/patients/import", headers=headers,
+                                        files={"file": ("patients.csv", payload, "text/csv")})
+                rows.append({"scenario": "reimport_csv", "inserted": res.json()["inserted"],
+                             "skipped": res.json()["skipped"]})
+
+                existing = [f"06{i:08d}" for i in range(1, args.patients, max(1, args.patients // args.requests))]
+                for name, make in (
+                    ("create_or_get_existing", lambda i: client.post("/patients/create_or_get", json={
+                        "nom": "X", "prenom": "Y", "telephone": existing[i % len(existing)]})),
+                    ("create_or_get_new", lambda i: client.post("/patients/create_or_get", json={
+                        "nom": "Nouveau", "prenom": f"P{i}", "telephone": f"07{i:08d}"})),
+                    ("search_prefix", lambda i: client.get(
+                        f"/patients/search?q={NOMS[i % len(NOMS)][:3].lower()}{i % 10}", headers=headers)),
+                ):
+                    latencies = await timed(make, args.requests, args.concurrency)
+                    rows.append({"scenario": name, "requests": args.requests, **percentiles(latencies)})
+
+                # Même patient (sans téléphone) créé par de nombreuses requêtes simultanées
+                results = await asyncio.gather(*(client.post("/patients/create_or_get", json={
+                    "nom": "Concurrent", "prenom": "Unique", "age": "40"}) for _ in range(50)))
+                ids = {r.json()["id"] for r in results if r.status_code == 200}
+                db = SessionLocal()
+                count = db.query(Patient).filter(Patient.nom == "Concurrent").count()
+                db.close()
+                rows.append({"scenario": "create_or_get_concurrent", "requests": 50,
+                             "ok": sum(r.status_code == 200 for r in results), "distinct_ids": len(ids),
+                             "rows_in_db": count})
+            return rows
+
+        print_report(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
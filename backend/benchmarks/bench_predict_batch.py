@@ -0,0 +1,99 @@
+"""Débit de /predict/batch sur N images (fichiers multiples ou ZIP) contre N appels /predict successifs.
+
+Les images sont toutes différentes pour que le cache des prédictions n'intervienne pas.
+
+Usage : python benchmarks/bench_predict_batch.py [--images 100] [--model chemin.keras]
+"""
+import argparse
+import io
+import json
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+
+from common import auth_headers, load_app, print_report
+
+EMAIL = "bench@bench.local"
+
+
+def make_images(n, seed):
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(n):
+        buf = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (900, 1200, 3), dtype=np.uint8)).save(buf, "JPEG", quality=90)
+        images.append(buf.getvalue())
+    return images
+
+
+def make_zip(images):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for i, data in enumerate(images):
+            zf.writestr(f"lesion_{i:03d}.jpg", data)
+    return buf.getvalue()
+
+
+def count_lines(res):
+    lines = [json.loads(line) for line in res.iter_lines() if line]
+    assert lines[-1].get("done"), lines[-1]
+    return lines[-1]["count"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--model", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        main_module = load_app(tmp, args.model)
+        from fastapi.testclient import TestClient
+        from auth import SessionLocal, User
+
+        db = SessionLocal()
+        db.add(User(email=EMAIL, hashed_password="x", role="medecin", nom="Bench", prenom="Bench"))
+        db.commit()
+        db.close()
+        headers = {**auth_headers(EMAIL, "medecin"), "patient_nom": "Doe", "patient_prenom": "Jane"}
+
+        rows = []
+        with TestClient(main_module.app) as client:
+            # Préchauffage (compilation du graphe, pools)
+            client.post("/predict", files={"file": ("w.jpg", make_images(1, 999)[0], "image/jpeg")}, headers=headers)
+
+            images = make_images(args.images, 1)
+            t0 = time.perf_counter()
+            for i, data in enumerate(images):
+                res = client.post("/predict", files={"file": (f"{i}.jpg", data, "image/jpeg")}, headers=headers)
+                assert res.status_code == 200, res.text
+            elapsed = time.perf_counter() - t0
+            rows.append({"variant": "sequential /predict", "images": args.images,
+                         "seconds": round(elapsed, 3), "images_per_sec": round(args.images / elapsed, 1)})
+
+            images = make_images(args.images, 2)
+            files = [("files", (f"{i}.jpg", data, "image/jpeg")) for i, data in enumerate(images)]
+            t0 = time.perf_counter()
+            with client.stream("POST", "/predict/batch", files=files, headers=headers) as res:
+                assert count_lines(res) == args.images
+            elapsed = time.perf_counter() - t0
+            rows.append({"variant": "/predict/batch (fichiers)", "images": args.images,
+                         "seconds": round(elapsed, 3), "images_per_sec": round(args.images / elapsed, 1)})
+
+            archive = make_zip(make_images(args.images, 3))
+            t0 = time.perf_counter()
+            with client.stream("POST", "/predict/batch", files={"files": ("lot.zip", archive, "application/zip")},
+                               headers=headers) as res:
+                assert count_lines(res) == args.images
+            elapsed = time.perf_counter() - t0
+            rows.append({"variant": "/predict/batch (zip)", "images": args.images,
+                         "seconds": round(elapsed, 3), "images_per_sec": round(args.images / elapsed, 1)})
+
+        print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Rapports PDF : ancien téléchargement côté navigateur vs rapport généré par le serveur (reports.py).
+
+L'ancien rapport téléchargeait tout l'historique avec les images en base64 (/history_full?inline_images=true)
+avant de construire le PDF dans le navigateur ; on mesure ce transfert, puis la génération du rapport
+d'historique côté serveur (première demande) et son téléchargement depuis le cache.
+
+Usage : python benchmarks/bench_reports.py [--scans 50] [--requests 20]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from common import load_app, percentiles, print_report, synthetic_lesion
+
+
+async def measure(client, url, headers, requests):
+    latencies, size = [], 0
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        res = await client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - t0)
+        assert res.status_code == 200, res.text
+        size = len(res.content)
+    return {"requests": requests, "bytes": size, **percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scans", type=int, default=50, help="analyses dans l'historique du patient")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+    os.environ.setdefault("DERMASCAN_LOG_LEVEL", "WARNING")
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        main_module = load_app(tmp)
+        import httpx
+
+        async def run():
+            rows = []
+            await main_module.app.router._startup()
+            transport = httpx.ASGITransport(app=main_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                await client.post("/register", json={"email": "medecin@bench.local", "password": "motdepasse",
+                                                     "role": "medecin", "nom": "Bench", "prenom": "Medecin"})
+                login = await client.post("/login", json={"email": "medecin@bench.local", "password": "motdepasse"})
+                headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+                patient = {"patient_nom": "Durand", "patient_prenom": "Zoe"}
+                for i in range(args.scans):
+                    res = await client.post("/predict", headers={**headers, **patient}, files={
+                        "file": ("lesion.jpg", synthetic_lesion(1600, 1200, seed=i), "image/jpeg")})
+                    assert res.status_code == 200, res.text
+
+                rows.append({"variant": "ancien : historique + images base64 (navigateur)", **await measure(
+                    client, "/history_full/medecin@bench.local?limit=500&inline_images=true", headers, args.requests)})
+                url = "/reports/history?patient_nom=Durand&patient_prenom=Zoe"
+                rows.append({"variant": "rapport serveur : première génération", **await measure(client, url, headers, 1)})
+                rows.append({"variant": "rapport serveur : depuis le cache", **await measure(
+                    client, url, headers, args.requests)})
+            await main_module.app.router._shutdown()
+            return rows
+
+        print_report(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Mesure le pic mémoire Python par upload concurrent sur le chemin d'ingestion en flux de /predict.
+
+Chaque upload simulé fait --size-mb Mo ; le pic (tracemalloc) doit rester de l'ordre de
+quelques blocs de lecture par upload, indépendamment de la taille du fichier.
+
+Usage : python benchmarks/bench_upload_memory.py [--size-mb 12] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from fastapi import UploadFile
+
+from common import print_report
+
+from settings import UPLOAD_CHUNK_SIZE
+from uploads import save_upload
+
+
+def make_upload(size):
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    block = os.urandom(1024 * 1024)
+    written = 0
+    while written < size:
+        written += spool.write(block[: size - written])
+    spool.seek(0)
+    return UploadFile(file=spool, filename="photo.jpg")
+
+
+async def ingest(uploads, dest_dir):
+    await asyncio.gather(*(save_upload(u, dest_dir / f"{i}.jpg") for i, u in enumerate(uploads)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=12)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-per-upload-mb", type=float, default=2)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    uploads = [make_upload(size) for _ in range(args.concurrency)]
+    with tempfile.TemporaryDirectory() as tmp:
+        tracemalloc.start()
+        asyncio.run(ingest(uploads, Path(tmp)))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    per_upload_mb = peak / args.concurrency / (1024 * 1024)
+    print_report({
+        "upload_mb": args.size_mb,
+        "concurrency": args.concurrency,
+        "chunk_kb": UPLOAD_CHUNK_SIZE // 1024,
+        "peak_mb": round(peak / (1024 * 1024), 2),
+        "peak_per_upload_mb": round(per_upload_mb, 3),
+    })
+    assert per_upload_mb <= args.max_per_upload_mb, "Pic mémoire par upload au-delà de la borne"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Liste /users à 100k utilisateurs : ancienne liste complète vs pages filtrées (rôle, recherche FTS5 ou préfixe).
+
+La variante "liste complète" est une route de comparaison (ancien list_users) ajoutée par ce script.
+
+Usage : python benchmarks/bench_users.py [--users 100000] [--requests 200]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from common import load_app, percentiles, print_report, seed_database
+
+SEARCHES = ["user0001", "nom12", "prenom4", "bench", "nom99999"]
+
+
+async def measure(client, url_for, requests):
+    latencies, sizes = [], []
+    for i in range(requests):
+        t0 = time.perf_counter()
+        res = await client.get(url_for(i))
+        latencies.append(time.perf_counter() - t0)
+        assert res.status_code == 200, res.text
+        sizes.append(len(res.content))
+    return {"requests": requests, "bytes": max(sizes), **percentiles(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    os.environ.setdefault("DERMASCAN_LOG_LEVEL", "WARNING")
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        main_module = load_app(tmp)
+        import httpx
+        import user_search
+        from auth import SessionLocal, User, get_db
+        from fastapi import Depends
+        from sqlalchemy import text
+
+        t0 = time.perf_counter()
+        seed_database(args.users, 0)
+        print(f"Base : {args.users} utilisateurs ({time.perf_counter() - t0:.1f} s)")
+
+        @main_module.app.get("/bench/users_all")
+        def users_all(db=Depends(get_db)):
+            return [{"id": u.id, "email": u.email, "nom": u.nom, "prenom": u.prenom, "age": u.age,
+                     "sexe": u.sexe, "telephone": u.telephone, "role": u.role} for u in db.query(User).all()]
+
+        # Quelques patients pour que le filtre par rôle soit sélectif
+        db = SessionLocal()
+        db.query(User).filter(User.id % 20 == 0).update({"role": "patient"})
+        db.commit()
+        db.close()
+
+        db = SessionLocal()
+        has_fts = db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'users_fts'")).first() is not None
+        db.close()
+
+        async def run():
+            rows = []
+            transport = httpx.ASGITransport(app=main_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                few = max(1, args.requests // 20)
+                rows.append({"variant": "liste complète (ancien /users)",
+                             **await measure(client, lambda i: "/bench/users_all", few)})
+                rows.append({"variant": "première page",
+                             **await measure(client, lambda i: "/users?limit=50", args.requests)})
+                rows.append({"variant": "page suivante (curseur)", **await measure(
+                    client, lambda i: f"/users?limit=50&cursor={(i * 397) % args.users}", args.requests)})
+                rows.append({"variant": "rôle patient", **await measure(
+                    client, lambda i: "/users?limit=50&role=patient", args.requests)})
+                for use_fts in (True, False):
+                    if use_fts and not has_fts:
+                        continue
+                    user_search._fts_available = use_fts
+                    rows.append({"variant": f"recherche q ({'FTS5' if use_fts else 'préfixe'})", **await measure(
+                        client, lambda i: f"/users?limit=50&q={SEARCHES[i % len(SEARCHES)]}", args.requests)})
+                user_search._fts_available = None
+            return rows
+
+        print_report(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
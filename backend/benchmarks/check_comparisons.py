@@ -0,0 +1,63 @@
+"""Vérifie que la table de comparaisons précalculée reproduit l'ancien calcul pour toutes les paires,
+puis compare le coût par requête (top-3) des deux approches.
+
+Usage (depuis backend/) : python benchmarks/check_comparisons.py
+"""
+import itertools
+import json
+import time
+
+from common import BACKEND_DIR
+
+from comparisons import ComparisonIndex, get_simple_name
+from labels import class_names, clean_disease_name
+
+
+def legacy_comparisons(top_names):
+    """Ancien calcul de /predict : relecture du fichier et recherche linéaire par sous-chaîne."""
+    with open(BACKEND_DIR / "disease_profiles.json", "r", encoding="utf-8") as f:
+        comparisons_data = json.load(f)
+    comparison_pairs = []
+    for i in range(len(top_names)):
+        for j in range(i + 1, len(top_names)):
+            d1, d2 = top_names[i], top_names[j]
+            s1, s2 = get_simple_name(d1), get_simple_name(d2)
+            found_key = None
+            for k in comparisons_data.keys():
+                if s1 in k.lower() and s2 in k.lower():
+                    found_key = k
+                    break
+            if found_key:
+                crits = []
+                profile = comparisons_data[found_key]
+                if isinstance(profile, dict):
+                    for key in set(profile.keys()):
+                        crits.append({"nom": key, d1: profile.get(key, "-"), d2: profile.get(key, "-")})
+                comparison_pairs.append({"diseases": [d1, d2], "criteria": crits})
+    return comparison_pairs
+
+
+def normalized(pairs):
+    # L'ancien code parcourait un set : l'ordre des critères n'était pas défini
+    return [{**p, "criteria": sorted(p["criteria"], key=lambda c: c["nom"])} for p in pairs]
+
+
+def main():
+    index = ComparisonIndex(class_names)
+    names = [clean_disease_name(c) for c in class_names]
+    checked = 0
+    for d1, d2 in itertools.permutations(names, 2):
+        assert normalized(index.compare([d1, d2])) == normalized(legacy_comparisons([d1, d2])), (d1, d2)
+        checked += 1
+    print(f"{checked} paires ordonnées identiques à l'ancien calcul")
+
+    triples = list(itertools.permutations(names, 3))
+    for label, fn in (("ancien", legacy_comparisons), ("index", index.compare)):
+        t0 = time.perf_counter()
+        for top in triples:
+            fn(list(top))
+        print(f"{label} : {(time.perf_counter() - t0) / len(triples) * 1e6:.1f} µs par requête")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Utilitaires partagés par les scripts de benchmark (à lancer depuis backend/)."""
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+IMG_SHAPE = (256, 256, 3)
+NUM_CLASSES = 11
+
+
+def load_model(path=None):
+    """Charge le modèle Keras demandé, ou un petit modèle de substitution (même entrée/sortie que DenseNet)."""
+    import tensorflow as tf
+    if path:
+        return tf.keras.models.load_model(path)
+    tf.keras.utils.set_random_seed(0)
+    return tf.keras.Sequential([
+        tf.keras.Input(shape=IMG_SHAPE),
+        tf.keras.layers.Conv2D(8, 3, strides=2, activation="relu"),
+        tf.keras.layers.Conv2D(16, 3, strides=2, activation="relu"),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(NUM_CLASSES, activation="softmax"),
+    ])
+
+
+def random_inputs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-1.0, 1.0, size=(n,) + IMG_SHAPE).astype(np.float32)
+
+
+def percentiles(samples, qs=(50, 99)):
+    """Renvoie les percentiles demandés (p50/p99 par défaut) en millisecondes pour une liste de durées en secondes."""
+    if not samples:
+        return {f"p{q}_ms": None for q in qs}
+    arr = np.asarray(samples) * 1000.0
+    return {f"p{q}_ms": round(float(np.percentile(arr, q)), 3) for q in qs}
+
+
+def synthetic_lesion(width, height, seed=0, fmt="JPEG"):
+    """Image synthétique de lésion : fond couleur peau bruité et tache sombre irrégulière. Renvoie les octets encodés."""
+    import io
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    skin = np.array([224, 172, 140], dtype=np.float32) + rng.normal(0, 12, 3)
+    img = np.empty((height, width, 3), dtype=np.float32)
+    img[:] = skin
+    img += rng.normal(0, 6, (height, width, 1))
+    cx, cy = width * rng.uniform(0.35, 0.65), height * rng.uniform(0.35, 0.65)
+    rx, ry = width * rng.uniform(0.1, 0.25), height * rng.uniform(0.1, 0.25)
+    angle = np.arctan2(yy - cy, xx - cx)
+    # Bord irrégulier : rayon modulé par quelques harmoniques
+    border = 1 + 0.15 * np.sin(3 * angle + rng.uniform(0, 6.3)) + 0.08 * np.sin(7 * angle + rng.uniform(0, 6.3))
+    dist = np.sqrt(((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2) / border
+    lesion = np.clip(1.2 - dist, 0, 1)[..., None]
+    img = img * (1 - 0.75 * lesion) + np.array([70, 40, 30], dtype=np.float32) * 0.75 * lesion
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(img, 0, 255).astype(np.uint8)).save(buf, fmt, quality=90)
+    return buf.getvalue()
+
+
+def seed_database(users, predictions_per_user, password="motdepasse", seed=0, role="medecin"):
+    """Remplit la base (déjà créée par l'import de auth) de façon déterministe.
+
+    Tous les utilisateurs partagent le même mot de passe, haché une seule fois. Renvoie les e-mails créés.
+    """
+    from datetime import datetime, timedelta
+    from auth import Prediction, SessionLocal, User, get_password_hash
+    from labels import class_names, clean_disease_name
+
+    rng = np.random.default_rng(seed)
+    hashed = get_password_hash(password)
+    emails = [f"user{i:05d}@bench.local" for i in range(users)]
+    start = datetime(2025, 1, 1)
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(User, [
+            {"email": email, "hashed_password": hashed, "role": role, "nom": f"Nom{i}", "prenom": f"Prenom{i}"}
+            for i, email in enumerate(emails)
+        ])
+        # Par tranches : SQLite limite le nombre de paramètres d'une requête
+        user_ids = sorted(uid for k in range(0, len(emails), 500)
+                          for (uid,) in db.query(User.id).filter(User.email.in_(emails[k:k + 500])))
+        rows = []
+        for user_id in user_ids:
+            for j in range(predictions_per_user):
+                rows.append({
+                    "user_id": user_id,
+                    "image_name": None,
+                    "predicted_class": clean_disease_name(class_names[int(rng.integers(len(class_names)))]),
+                    "confidence": float(rng.uniform(0.3, 1.0)),
+                    "date": start + timedelta(minutes=int(rng.integers(0, 500_000))),
+                    "top_predictions": "[]",
+                    "patient_nom": f"Patient{j % 50}",
+                    "patient_prenom": "Test",
+                })
+                if len(rows) >= 10_000:
+                    db.bulk_insert_mappings(Prediction, rows)
+                    rows = []
+        if rows:
+            db.bulk_insert_mappings(Prediction, rows)
+        db.commit()
+    finally:
+        db.close()
+    return emails
+
+
+def print_report(rows):
+    print(json.dumps(rows, indent=2, ensure_ascii=False))
+
+
+def load_app(workdir, model_path=None):
+    """Importe main.py dans un répertoire de travail isolé (base SQLite, uploads et modèle de substitution)."""
+    workdir = Path(workdir)
+    for name in ("disease_advice.json", "disease_profiles.json"):
+        shutil.copy(BACKEND_DIR / name, workdir / name)
+    if model_path is None:
+        model_path = workdir / "standin.keras"
+        load_model().save(model_path)
+    os.environ["DERMASCAN_MODEL_PATH"] = str(model_path)
+    os.chdir(workdir)
+    import main
+    return main
+
+
+def auth_headers(email, role="patient"):
+    from auth import create_access_token
+    token = create_access_token(data={"sub": email, "role": role, "nom": "Bench", "prenom": "Bench"})
+    return {"Authorization": f"Bearer {token}"}
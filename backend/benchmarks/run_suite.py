@@ -0,0 +1,223 @@
+"""Suite de charge reproductible du backend, hors ligne et sur CPU.
+
+Modèle de substitution (même entrée 256x256x3, 11 classes), images de lésions synthétiques à plusieurs
+résolutions, base SQLite remplie de façon déterministe, puis scénarios /predict, /history_full, /login
+et notes lancés avec N clients concurrents. Les débits et percentiles de latence sont écrits en JSON ;
+--compare affiche l'écart avec un résultat précédent.
+
+Usage :
+    python benchmarks/run_suite.py --output resultats.json
+    python benchmarks/run_suite.py --scenarios predict,history --users 200 --predictions 500 \\
+        --compare resultats.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from common import BACKEND_DIR, auth_headers, load_app, percentiles, print_report, seed_database, synthetic_lesion
+
+SCENARIOS = ("predict", "history", "login", "notes")
+PASSWORD = "motdepasse"
+
+
+def parse_resolutions(spec):
+    return [tuple(int(v) for v in item.lower().split("x")) for item in spec.split(",") if item]
+
+
+async def run_scenario(name, make_request, requests, concurrency):
+    """Lance requests appels de make_request(i) répartis sur concurrency clients ; make_request renvoie True si OK."""
+    latencies, errors = [], 0
+    indices = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        for i in indices:
+            t0 = time.perf_counter()
+            ok = await make_request(i)
+            latencies.append(time.perf_counter() - t0)
+            if not ok:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2),
+        "mean_ms": round(float(np.mean(latencies)) * 1000, 3),
+        **percentiles(latencies, (50, 90, 99)),
+    }
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    import tensorflow as tf
+    return {
+        "date": datetime.utcnow().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "tensorflow": tf.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": vars(args),
+    }
+
+
+def compare(previous_path, results):
+    """Écart (%) de débit et de latence par scénario par rapport à un fichier de résultats précédent."""
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {r["scenario"]: r for r in json.load(f)["results"]}
+    rows = []
+    for r in results:
+        old = previous.get(r["scenario"])
+        if not old:
+            continue
+        row = {"scenario": r["scenario"]}
+        for key in ("throughput_rps", "p50_ms", "p99_ms"):
+            if old.get(key):
+                row[f"{key}_delta_pct"] = round((r[key] - old[key]) / old[key] * 100, 1)
+        rows.append(row)
+    return rows
+
+
+async def run(main_module, args, emails):
+    import httpx
+    from auth import Prediction, SessionLocal
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    headers = {email: auth_headers(email, "medecin") for email in emails}
+    rng = np.random.default_rng(args.seed)
+    results = []
+
+    await main_module.start_inference_engine()
+    transport = httpx.ASGITransport(app=main_module.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            if "predict" in scenarios:
+                # Préchauffage : compilation du graphe et démarrage des pools
+                await client.post("/predict", headers=headers[emails[0]],
+                                  files={"file": ("w.jpg", synthetic_lesion(256, 256, seed=10 ** 6), "image/jpeg")})
+                for width, height in parse_resolutions(args.resolutions):
+                    # Images toutes différentes : le cache des prédictions n'intervient pas
+                    images = [synthetic_lesion(width, height, seed=args.seed + i) for i in range(args.predict_requests)]
+
+                    async def predict(i, images=images):
+                        email = emails[i % len(emails)]
+                        res = await client.post("/predict", files={"file": (f"{i}.jpg", images[i], "image/jpeg")},
+                                                headers={**headers[email], "patient_nom": "Bench", "patient_prenom": "Bench"})
+                        return res.status_code == 200
+
+                    results.append(await run_scenario(f"predict_{width}x{height}", predict,
+                                                      args.predict_requests, args.concurrency))
+
+            if "history" in scenarios:
+                picks = rng.integers(0, len(emails), args.requests)
+
+                async def history_first_page(i):
+                    email = emails[picks[i]]
+                    res = await client.get(f"/history_full/{email}?limit={args.page_size}", headers=headers[email])
+                    return res.status_code == 200
+
+                async def history_all_pages(i):
+                    email = emails[picks[i]]
+                    url = f"/history_full/{email}?limit={args.page_size}"
+                    res = await client.get(url, headers=headers[email])
+                    while res.status_code == 200 and res.headers.get("X-Next-Cursor"):
+                        res = await client.get(f"{url}&cursor={res.headers['X-Next-Cursor']}", headers=headers[email])
+                    return res.status_code == 200
+
+                results.append(await run_scenario("history_first_page", history_first_page, args.requests, args.concurrency))
+                results.append(await run_scenario("history_all_pages", history_all_pages,
+                                                  max(1, args.requests // 10), args.concurrency))
+
+            if "login" in scenarios:
+                async def login(i):
+                    res = await client.post("/login", json={"email": emails[i % len(emails)], "password": PASSWORD})
+                    return res.status_code == 200
+
+                results.append(await run_scenario("login", login, args.login_requests, args.concurrency))
+
+            if "notes" in scenarios:
+                db = SessionLocal()
+                owned = [(email, pid) for email in emails[: min(len(emails), 100)]
+                         for (pid,) in db.query(Prediction.id).join(Prediction.user)
+                                         .filter_by(email=email).limit(5)]
+                db.close()
+                if owned:
+                    async def note_put(i):
+                        email, pid = owned[i % len(owned)]
+                        res = await client.put(f"/prediction/{pid}/note", json={"note": f"Note {i}"}, headers=headers[email])
+                        return res.status_code == 200
+
+                    async def notes_get(i):
+                        email, pid = owned[i % len(owned)]
+                        res = await client.get(f"/prediction/{pid}/notes", headers=headers[email])
+                        return res.status_code == 200
+
+                    results.append(await run_scenario("note_put", note_put, args.requests, args.concurrency))
+                    results.append(await run_scenario("notes_get", notes_get, args.requests, args.concurrency))
+    finally:
+        await main_module.stop_inference_engine()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--predictions", type=int, default=200, help="prédictions par utilisateur dans la base")
+    parser.add_argument("--resolutions", default="256x256,1024x768,3024x4032")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="requêtes par scénario d'historique / notes")
+    parser.add_argument("--predict-requests", type=int, default=50, help="requêtes par résolution")
+    parser.add_argument("--login-requests", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="coût bcrypt (défaut : celui de settings.py)")
+    parser.add_argument("--model", default=None, help="modèle Keras réel (défaut : modèle de substitution)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="fichier JSON de résultats")
+    parser.add_argument("--compare", default=None, help="fichier JSON d'un run précédent")
+    args = parser.parse_args()
+
+    if args.bcrypt_rounds:
+        os.environ["DERMASCAN_BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    # Pas de journalisation par requête pendant la mesure
+    os.environ.setdefault("DERMASCAN_LOG_LEVEL", "WARNING")
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        main_module = load_app(tmp, args.model)
+        t0 = time.perf_counter()
+        emails = seed_database(args.users, args.predictions, password=PASSWORD, seed=args.seed)
+        print(f"Base : {args.users} utilisateurs, {args.users * args.predictions} prédictions "
+              f"({time.perf_counter() - t0:.1f} s)", file=sys.stderr)
+        results = asyncio.run(run(main_module, args, emails))
+
+    report = {"meta": metadata(args), "results": results}
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    print_report(report)
+    if compare_path:
+        print_report(compare(compare_path, results))
+
+
+if __name__ == "__main__":
+    main()
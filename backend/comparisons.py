@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from labels import clean_disease_name
+from settings import COMPARISON_RELOAD_SECONDS
+
+PROFILES_PATH = Path("disease_profiles.json")
+
+
+def get_simple_name(d):
+    if not isinstance(d, str):
+        return ""
+    parts = d.split(".")
+    if len(parts) > 1:
+        rest = parts[1].strip()
+        main = rest.split(" ")[0]
+        return main.lower()
+    return d.lower()
+
+
+def build_comparison(d1, d2, profiles):
+    """Fiche de comparaison d'une paire de maladies, ou None si aucun profil ne correspond."""
+    s1 = get_simple_name(d1)
+    s2 = get_simple_name(d2)
+    found_key = None
+    for k in profiles.keys():
+        if s1 in k.lower() and s2 in k.lower():
+            found_key = k
+            break
+    if not found_key:
+        return None
+    crits = []
+    profile1 = profiles[found_key]
+    profile2 = profiles[found_key]
+    if isinstance(profile1, dict) and isinstance(profile2, dict):
+        # Ordre des critères = ordre du fichier de profils (stable d'un appel à l'autre)
+        for key in profile1.keys():
+            if key in profile2:
+                crits.append({
+                    "nom": key,
+                    d1: profile1.get(key, "-"),
+                    d2: profile2.get(key, "-")
+                })
+    return {
+        "diseases": [d1, d2],
+        "criteria": crits
+    }
+
+
+class ComparisonIndex:
+    """Table des comparaisons pour toutes les paires de classes, précalculée une fois (load() au démarrage).
+
+    La date de modification du fichier de profils est vérifiée au plus une fois toutes les
+    reload_seconds ; la table est recalculée si elle a changé.
+    """
+
+    def __init__(self, class_names, normalize=clean_disease_name, path=PROFILES_PATH,
+                 reload_seconds=COMPARISON_RELOAD_SECONDS):
+        self.class_names = class_names
+        self.normalize = normalize
+        self.path = Path(path)
+        self.reload_seconds = reload_seconds
+        self._table = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _build(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            profiles = json.load(f)
+        names = [self.normalize(c) for c in self.class_names]
+        table = {}
+        for d1 in names:
+            for d2 in names:
+                if d1 != d2:
+                    table[(d1, d2)] = build_comparison(d1, d2, profiles)
+        return table
+
+    def load(self, force=False):
+        """(Re)calcule la table si elle manque, si force, ou si le fichier de profils a changé."""
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            self._checked_at = time.monotonic()
+            if force or self._table is None or mtime != self._mtime:
+                self._table = self._build()
+                self._mtime = mtime
+            return self._table
+
+    def _current_table(self):
+        table = self._table
+        if table is None:
+            return self.load()
+        if self.reload_seconds > 0 and time.monotonic() - self._checked_at >= self.reload_seconds:
+            return self.load()
+        return table
+
+    def get(self, d1, d2, table=None):
+        table = table if table is not None else self._current_table()
+        if (d1, d2) not in table:
+            # Nom hors des classes connues : calcul direct
+            with open(self.path, "r", encoding="utf-8") as f:
+                return build_comparison(d1, d2, json.load(f))
+        return table[(d1, d2)]
+
+    def compare(self, disease_names):
+        """Comparaisons pour chaque paire (i < j) de la liste, dans l'ordre des prédictions."""
+        table = self._current_table()
+        pairs = []
+        for i in range(len(disease_names)):
+            for j in range(i + 1, len(disease_names)):
+                comparison = self.get(disease_names[i], disease_names[j], table)
+                if comparison:
+                    pairs.append(comparison)
+        return pairs
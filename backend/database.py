@@ -1,8 +1,138 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Index, and_, create_engine, event, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./users.db"
+from metrics import instrument_engine
+from settings import (ASYNC_DATABASE_URL, DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE,
+                      SQLITE_BUSY_TIMEOUT_MS, SQLITE_JOURNAL_MODE, SQLITE_MMAP_SIZE, SQLITE_SYNCHRONOUS)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
+
+# Profil SQLite : WAL (lectures concurrentes pendant une écriture), fsync allégé, attente sur verrou
+SQLITE_PRAGMAS = {
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "mmap_size": SQLITE_MMAP_SIZE,
+}
+
+
+# Seules bases supportées : les upserts (insert_ignore, image_store) et les migrations sont écrits pour elles
+SUPPORTED_DIALECTS = ("sqlite", "postgresql")
+
+
+def check_database_url(url):
+    """Refuse au démarrage une URL de base non supportée plutôt qu'une erreur SQL à la première écriture."""
+    backend = make_url(url).get_backend_name()
+    if backend not in SUPPORTED_DIALECTS:
+        raise ValueError(f"Base de données non supportée : {backend} (SQLite ou PostgreSQL uniquement)")
+
+
+def _apply_sqlite_pragmas(engine, sqlite_pragmas):
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in sqlite_pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_db_engine(url=SQLALCHEMY_DATABASE_URL, sqlite_pragmas=SQLITE_PRAGMAS):
+    """Moteur SQLAlchemy configuré selon le type de base (pragmas SQLite ou pool de connexions PostgreSQL)."""
+    check_database_url(url)
+    if url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False}
+        if sqlite_pragmas and "busy_timeout" in sqlite_pragmas:
+            connect_args["timeout"] = sqlite_pragmas["busy_timeout"] / 1000.0
+        engine = create_engine(url, connect_args=connect_args)
+        if sqlite_pragmas:
+            _apply_sqlite_pragmas(engine, sqlite_pragmas)
+        return engine
+    return create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
+
+engine = create_db_engine()
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def insert_ignore(model, dialect_name):
+    """INSERT ... ON CONFLICT DO NOTHING : les lignes en conflit sont ignorées (bases de SUPPORTED_DIALECTS)."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model).on_conflict_do_nothing()
+
+
+def _not_sqlite(ddl, target, bind, tables=None, state=None, *, dialect, **kw):
+    return dialect.name != "sqlite"
+
+
+def case_insensitive_indexes(name, column):
+    """Index de recherche par préfixe insensible à la casse : collation NOCASE sous SQLite, lower(colonne)
+    sur les bases serveur (qui refusent COLLATE "NOCASE"). Requêtes correspondantes : prefix_condition."""
+    return (
+        Index(name, column.collate("NOCASE")).ddl_if(dialect="sqlite"),
+        Index(f"{name}_lower", func.lower(column)).ddl_if(callable_=_not_sqlite),
+    )
+
+
+def prefix_condition(column, q, dialect_name):
+    """« column commence par q », sans tenir compte de la casse, sous la forme servie par case_insensitive_indexes.
+
+    Comparaison par intervalle [q, q + U+FFFF) : utilisable par un index, contrairement à LIKE.
+    """
+    if dialect_name == "sqlite":
+        column = column.collate("NOCASE")
+    else:
+        column, q = func.lower(column), q.lower()
+    return and_(column >= q, column < q + "\uffff")
+
+
+def to_async_url(url: str) -> str:
+    """sqlite:// -> sqlite+aiosqlite://, postgresql:// -> postgresql+asyncpg://."""
+    scheme, sep, rest = url.partition("://")
+    if "+" in scheme:
+        scheme = scheme.split("+", 1)[0]
+    driver = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}.get(scheme)
+    return f"{scheme}+{driver}{sep}{rest}" if driver else url
+
+
+def create_async_db_engine(url=None, sqlite_pragmas=SQLITE_PRAGMAS):
+    """Équivalent asynchrone de create_db_engine (mêmes pragmas SQLite, même pool côté serveur)."""
+    url = url or ASYNC_DATABASE_URL or to_async_url(SQLALCHEMY_DATABASE_URL)
+    check_database_url(url)
+    if url.startswith("sqlite"):
+        engine = create_async_engine(url)
+        if sqlite_pragmas:
+            _apply_sqlite_pragmas(engine.sync_engine, sqlite_pragmas)
+        return engine
+    return create_async_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
+
+async_engine = create_async_db_engine()
+instrument_engine(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,31 @@
+"""Pools d'exécution bornés pour sortir le travail bloquant de la boucle asyncio."""
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from settings import DECODE_POOL, DECODE_WORKERS, INFERENCE_THREADS, IO_THREADS, PASSWORD_HASH_THREADS
+
+# TensorFlow parallélise déjà chaque passage : un seul thread suffit en général
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="inference")
+# Écritures disque et commits SQLAlchemy
+io_executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+# bcrypt (/login, /register) : borné pour qu'une vague de connexions ne sature pas le threadpool des routes
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_THREADS, thread_name_prefix="password")
+
+if DECODE_POOL == "process":
+    # "spawn" évite de dupliquer l'état TensorFlow du processus parent
+    decode_executor = ProcessPoolExecutor(max_workers=DECODE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+else:
+    decode_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+
+
+async def run_in(executor, fn, *args, **kwargs):
+    """Exécute fn dans l'exécuteur donné sans bloquer la boucle d'événements."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executors():
+    for executor in (inference_executor, io_executor, decode_executor, password_executor):
+        executor.shutdown(wait=False, cancel_futures=True)
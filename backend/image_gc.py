@@ -0,0 +1,326 @@
+"""Récupération de l'espace disque des images : suppressions différées et réconciliation périodique.
+
+Les routes de suppression déposent les images à libérer dans une file (enqueue) et répondent tout de
+suite ; la tâche de fond libère les références et supprime les fichiers devenus inutiles.
+
+Une passe de réconciliation, par lots bornés, recale les compteurs de stored_images sur les prédictions
+et les jobs en cours, puis supprime ce qui est orphelin depuis plus que le délai de grâce : images sans
+référence, fichiers sans ligne en base, fichiers temporaires abandonnés, miniatures sans original.
+En mode simulation (DERMASCAN_GC_DRY_RUN=1 ou dry_run=True), la passe compte sans rien supprimer.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import partial
+
+from sqlalchemy import bindparam, text
+
+from database import engine as default_engine
+from executors import io_executor, run_in
+from image_store import (OBJECTS_DIR, TMP_DIR, TOMBSTONE_SUFFIX, UPLOADS_DIR, image_path, is_image_key, locked_key,
+                         release_image)
+from metrics import GC_PASS_SECONDS, GC_RECLAIMED_BYTES, GC_REMOVED
+from settings import GC_BATCH_SIZE, GC_DRY_RUN, GC_GRACE_SECONDS, GC_INTERVAL_SECONDS
+from thumbnails import THUMBS_DIR, remove_thumbnails
+
+logger = logging.getLogger(__name__)
+
+_ROWS = text(
+    "SELECT name, refcount, COALESCE(last_acquired_at, created_at) FROM stored_images "
+    "WHERE name > :after ORDER BY name LIMIT :limit"
+)
+_NAMES_WITH_PREFIX = text("SELECT name FROM stored_images WHERE name >= :low AND name < :high")
+_PREDICTION_REFS = text(
+    "SELECT image_name, COUNT(*) FROM predictions WHERE image_name IN :names GROUP BY image_name"
+).bindparams(bindparam("names", expanding=True))
+_JOB_REFS = text(
+    "SELECT image_name, COUNT(*) FROM prediction_jobs WHERE status IN ('queued', 'running') "
+    "AND image_name IN :names GROUP BY image_name"
+).bindparams(bindparam("names", expanding=True))
+_REFERENCED_FLAT = text(
+    "SELECT DISTINCT image_name FROM predictions WHERE image_name IN :names"
+).bindparams(bindparam("names", expanding=True))
+# Conditions revérifiées sous le verrou de la clé : une référence prise entre-temps annule l'opération
+_DELETE_STALE = text(
+    "DELETE FROM stored_images WHERE name = :name AND COALESCE(last_acquired_at, created_at) < :cutoff"
+)
+_FIX_REFCOUNT = text(
+    "UPDATE stored_images SET refcount = :refcount "
+    "WHERE name = :name AND COALESCE(last_acquired_at, created_at) < :cutoff"
+)
+_ROW_EXISTS = text("SELECT 1 FROM stored_images WHERE name = :name")
+
+
+def _size(path):
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def _older_than(path, cutoff_ts):
+    try:
+        return path.stat().st_mtime < cutoff_ts
+    except OSError:
+        return False
+
+
+def reclaim_image(name) -> int:
+    """Libère une référence sur une image ; renvoie le nombre d'octets libérés (0 si elle reste utilisée)."""
+    size = _size(image_path(name))
+    if not release_image(name):
+        return 0
+    remove_thumbnails(name)
+    return size
+
+
+class ImageReclaimer:
+    """Tâche de fond : suppressions d'images en attente et passes de réconciliation périodiques."""
+
+    def __init__(self, interval=GC_INTERVAL_SECONDS, batch_size=GC_BATCH_SIZE, grace_seconds=GC_GRACE_SECONDS,
+                 dry_run=GC_DRY_RUN, engine=default_engine):
+        self.interval = interval
+        self.batch_size = max(1, int(batch_size))
+        self.grace = timedelta(seconds=grace_seconds)
+        self.dry_run = dry_run
+        self.engine = engine
+        # File thread-safe : les routes synchrones (threadpool) y déposent aussi
+        self._pending = queue.SimpleQueue()
+        self._pass_lock = threading.Lock()
+        self._task = None
+        self._loop = None
+        self._wakeup = None
+        self.last_report = None
+
+    def enqueue(self, *names):
+        """Programme la libération des images (appel non bloquant, depuis n'importe quel thread)."""
+        for name in names:
+            if name:
+                self._pending.put(name)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def pending(self):
+        return self._pending.qsize()
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._loop = None
+        # Suppressions encore en attente : traitées avant l'arrêt (sinon rattrapées par la prochaine passe)
+        self.drain()
+
+    def drain(self):
+        """Traite les suppressions en attente (appel bloquant) ; renvoie le nombre d'octets libérés."""
+        reclaimed = 0
+        while True:
+            try:
+                name = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                freed = reclaim_image(name)
+            except Exception as e:
+                # La référence reste comptée ; la passe de réconciliation la recalera
+                logger.warning("Erreur suppression image %s : %s", name, e)
+                continue
+            if freed:
+                GC_REMOVED.inc(kind="images")
+            reclaimed += freed
+        GC_RECLAIMED_BYTES.inc(reclaimed, source="delete")
+        return reclaimed
+
+    async def _run(self):
+        next_pass = self._loop.time() + self.interval if self.interval > 0 else None
+        while True:
+            timeout = None if next_pass is None else max(0.0, next_pass - self._loop.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                if not self._pending.empty():
+                    await run_in(io_executor, self.drain)
+                if next_pass is not None and self._loop.time() >= next_pass:
+                    await self.run_pass()
+                    next_pass = self._loop.time() + self.interval
+            except Exception:
+                logger.exception("Erreur de la récupération des images")
+
+    async def run_pass(self, dry_run=None):
+        """Passe de réconciliation complète, lot par lot dans io_executor ; renvoie le rapport."""
+        dry_run = self.dry_run if dry_run is None else dry_run
+        report = {"dry_run": dry_run, "rows_checked": 0, "refcounts_fixed": 0, "images": 0, "files": 0,
+                  "temp_files": 0, "thumbnails": 0, "reclaimed_bytes": 0}
+        cutoff = datetime.utcnow() - self.grace
+        start = time.perf_counter()
+        # Une seule passe à la fois (tâche de fond et /admin/gc)
+        if not self._pass_lock.acquire(blocking=False):
+            raise RuntimeError("Une passe de récupération est déjà en cours")
+        try:
+            after = ""
+            while after is not None:
+                after = await run_in(io_executor, self._reconcile_rows, after, cutoff, dry_run, report)
+            for step in await run_in(io_executor, self._sweep_steps):
+                await run_in(io_executor, step, cutoff, dry_run, report)
+        finally:
+            self._pass_lock.release()
+        report["seconds"] = round(time.perf_counter() - start, 3)
+        GC_PASS_SECONDS.observe(report["seconds"])
+        if not dry_run:
+            GC_RECLAIMED_BYTES.inc(report["reclaimed_bytes"], source="reconcile")
+        self.last_report = {**report, "finished_at": datetime.utcnow().isoformat(timespec="seconds")}
+        logger.info("Récupération des images terminée", extra=report)
+        return report
+
+    def _removed(self, report, kind, size, dry_run):
+        report[kind] += 1
+        report["reclaimed_bytes"] += size
+        if not dry_run:
+            GC_REMOVED.inc(kind=kind)
+
+    def _reconcile_rows(self, after, cutoff, dry_run, report):
+        """Un lot de stored_images : compteurs recalculés, images sans référence supprimées. Renvoie le curseur."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(_ROWS, {"after": after, "limit": self.batch_size}).all()
+            if not rows:
+                return None
+            names = [name for name, _, _ in rows]
+            actual = dict.fromkeys(names, 0)
+            for query in (_PREDICTION_REFS, _JOB_REFS):
+                for name, count in conn.execute(query, {"names": names}):
+                    actual[name] += count
+        report["rows_checked"] += len(rows)
+        for name, refcount, acquired_at in rows:
+            if isinstance(acquired_at, str):
+                acquired_at = datetime.fromisoformat(acquired_at)
+            if acquired_at is None or acquired_at >= cutoff or actual[name] == refcount:
+                continue
+            if actual[name]:
+                report["refcounts_fixed"] += 1
+                if not dry_run:
+                    with self.engine.begin() as conn:
+                        conn.execute(_FIX_REFCOUNT, {"name": name, "refcount": actual[name], "cutoff": cutoff})
+                continue
+            path = image_path(name)
+            size = _size(path)
+            if dry_run:
+                self._removed(report, "images", size, dry_run)
+                continue
+            with locked_key(name, self.engine) as (conn, discard):
+                deleted = conn.execute(_DELETE_STALE, {"name": name, "cutoff": cutoff}).rowcount
+                if deleted:
+                    discard(path)
+            if deleted:
+                remove_thumbnails(name)
+                self._removed(report, "images", size, dry_run)
+        return names[-1]
+
+    def _sweep_steps(self):
+        """Étapes bornées du balayage du disque : un répertoire de premier niveau à la fois."""
+        steps = [self._sweep_temp, self._sweep_flat]
+        if OBJECTS_DIR.is_dir():
+            steps += [partial(self._sweep_objects, top) for top in sorted(os.listdir(OBJECTS_DIR))]
+        if THUMBS_DIR.is_dir():
+            for size_dir in sorted(p for p in THUMBS_DIR.iterdir() if p.is_dir()):
+                steps.append(partial(self._sweep_flat_thumbnails, size_dir))
+                steps += [partial(self._sweep_thumbnails, top) for top in sorted(size_dir.iterdir()) if top.is_dir()]
+        return steps
+
+    def _names_with_prefix(self, prefix):
+        with self.engine.connect() as conn:
+            return {row[0] for row in conn.execute(_NAMES_WITH_PREFIX, {"low": prefix, "high": prefix + "\uffff"})}
+
+    def _sweep_objects(self, top, cutoff, dry_run, report):
+        """Fichiers de objects/<top>/ sans ligne dans stored_images (suppression interrompue, ligne perdue).
+
+        Un fichier écarté par une transaction interrompue (processus arrêté avant la validation) est remis
+        en place si sa ligne existe encore et que rien ne l'a remplacé.
+        """
+        known = self._names_with_prefix(top)
+        cutoff_ts = cutoff.timestamp()
+        for path in (OBJECTS_DIR / top).glob("*/*"):
+            tombstone = path.name.endswith(TOMBSTONE_SUFFIX)
+            if path.name in known or not path.is_file() or not _older_than(path, cutoff_ts):
+                continue
+            key = path.name.rsplit(".", 2)[0] if tombstone else path.name
+            size = _size(path)
+            if not dry_run:
+                with locked_key(key, self.engine) as (conn, _):
+                    if conn.execute(_ROW_EXISTS, {"name": key}).first():
+                        if not tombstone:
+                            continue
+                        if not image_path(key).exists():
+                            os.replace(path, image_path(key))
+                            continue
+                    path.unlink(missing_ok=True)
+            self._removed(report, "files", size, dry_run)
+
+    def _sweep_temp(self, cutoff, dry_run, report):
+        """Fichiers temporaires d'uploads interrompus (uploads/tmp/)."""
+        if not TMP_DIR.is_dir():
+            return
+        cutoff_ts = cutoff.timestamp()
+        for path in TMP_DIR.iterdir():
+            if path.is_file() and _older_than(path, cutoff_ts):
+                size = _size(path)
+                if not dry_run:
+                    path.unlink(missing_ok=True)
+                self._removed(report, "temp_files", size, dry_run)
+
+    def _sweep_flat(self, cutoff, dry_run, report):
+        """Anciennes images à plat dans uploads/ (base non migrée) que plus aucune prédiction ne référence."""
+        cutoff_ts = cutoff.timestamp()
+        candidates = [p for p in UPLOADS_DIR.iterdir() if p.is_file() and not p.name.startswith(".")] \
+            if UPLOADS_DIR.is_dir() else []
+        for start in range(0, len(candidates), self.batch_size):
+            batch = candidates[start:start + self.batch_size]
+            with self.engine.connect() as conn:
+                referenced = {row[0] for row in conn.execute(_REFERENCED_FLAT, {"names": [p.name for p in batch]})}
+            for path in batch:
+                if path.name not in referenced and _older_than(path, cutoff_ts):
+                    size = _size(path)
+                    if not dry_run:
+                        path.unlink(missing_ok=True)
+                        remove_thumbnails(path.name)
+                    self._removed(report, "files", size, dry_run)
+
+    def _sweep_thumbnails(self, top_dir, cutoff, dry_run, report):
+        """Miniatures thumbs/<taille>/<ab>/ dont l'image n'est plus dans stored_images."""
+        stems = {name.split(".", 1)[0] for name in self._names_with_prefix(top_dir.name)}
+        cutoff_ts = cutoff.timestamp()
+        for path in top_dir.glob("*/*"):
+            if path.stem not in stems and path.is_file() and _older_than(path, cutoff_ts):
+                size = _size(path)
+                if not dry_run:
+                    path.unlink(missing_ok=True)
+                self._removed(report, "thumbnails", size, dry_run)
+
+    def _sweep_flat_thumbnails(self, size_dir, cutoff, dry_run, report):
+        """Miniatures à plat (anciens noms) dont l'original n'existe plus dans uploads/."""
+        originals = {p.stem for p in UPLOADS_DIR.iterdir() if p.is_file()} if UPLOADS_DIR.is_dir() else set()
+        cutoff_ts = cutoff.timestamp()
+        for path in size_dir.iterdir():
+            if path.is_file() and not is_image_key(path.stem) and path.stem not in originals \
+                    and _older_than(path, cutoff_ts):
+                size = _size(path)
+                if not dry_run:
+                    path.unlink(missing_ok=True)
+                self._removed(report, "thumbnails", size, dry_run)
+
+
+image_reclaimer = ImageReclaimer()
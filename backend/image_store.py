@@ -0,0 +1,166 @@
+"""Stockage des images par contenu : uploads/objects/<ab>/<cd>/<sha256><ext>.
+
+Une image identique n'est écrite qu'une fois ; la table stored_images compte les références
+(prédictions, jobs en attente) et le fichier n'est supprimé qu'à la libération de la dernière.
+Les anciens noms (horodatage + UUID, à plat dans uploads/) restent lisibles jusqu'à la migration 0006.
+"""
+import hashlib
+import os
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import text
+
+from database import engine
+from executors import io_executor, run_in
+from settings import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE
+from uploads import IMAGE_EXTENSIONS, save_upload
+
+UPLOADS_DIR = Path("uploads")
+OBJECTS_DIR = UPLOADS_DIR / "objects"
+TMP_DIR = UPLOADS_DIR / "tmp"
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]+)?$")
+# Fichier écarté par une transaction pas encore validée : <clé>.<hex>.deleted
+TOMBSTONE_SUFFIX = ".deleted"
+
+# Verrou d'une clé, tenu jusqu'à la fin de la transaction et partagé par tous les processus : verrou
+# consultatif sous PostgreSQL ; sous SQLite, une écriture (même sans effet) prend le verrou d'écriture de la base
+_LOCK_KEY = {
+    "postgresql": text("SELECT pg_advisory_xact_lock(hashtext(:name))"),
+    "sqlite": text("UPDATE stored_images SET refcount = refcount WHERE name = :name"),
+}
+
+_ACQUIRE = text(
+    "INSERT INTO stored_images (name, refcount, size, created_at, last_acquired_at) VALUES (:name, 1, :size, :now, :now) "
+    "ON CONFLICT (name) DO UPDATE SET refcount = stored_images.refcount + 1, last_acquired_at = :now"
+)
+_DECREMENT = text("UPDATE stored_images SET refcount = refcount - 1 WHERE name = :name")
+_DELETE_UNREFERENCED = text("DELETE FROM stored_images WHERE name = :name AND refcount <= 0")
+
+
+def is_image_key(name: str) -> bool:
+    return bool(name) and _KEY_RE.match(name) is not None
+
+
+def image_key(content_hash: str, original_filename: str | None) -> str:
+    """Clé de stockage : hash SHA-256 + extension d'origine (si c'est une extension d'image connue)."""
+    ext = os.path.splitext(original_filename or "")[1].lower()
+    return content_hash + (ext if ext in IMAGE_EXTENSIONS else "")
+
+
+def shard(root: Path, key: str) -> Path:
+    """Répertoire à deux niveaux (256 x 256) : quelques centaines de fichiers par répertoire au plus."""
+    return root / key[:2] / key[2:4]
+
+
+def image_path(name: str) -> Path:
+    """Emplacement d'une image à partir de Prediction.image_name (clé de contenu ou ancien nom à plat)."""
+    if is_image_key(name):
+        return shard(OBJECTS_DIR, name) / name
+    return UPLOADS_DIR / name
+
+
+def temp_path() -> Path:
+    """Fichier temporaire sur le même système de fichiers que le stockage (déplacement atomique)."""
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    return TMP_DIR / f"{uuid.uuid4().hex}.part"
+
+
+def file_sha256(path: Path, chunk_size=UPLOAD_CHUNK_SIZE) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+@contextmanager
+def locked_key(key, bind=engine):
+    """Transaction tenant le verrou de la clé, pour tous les processus, jusqu'à sa validation : à utiliser
+    pour toute opération combinant le compteur d'une clé et son fichier. Renvoie (conn, discard).
+
+    discard(path) écarte un fichier tout de suite (renommage) ; il est supprimé après la validation,
+    ou remis en place si la transaction échoue.
+    """
+    discarded = []
+
+    def discard(path):
+        tombstone = path.with_name(f"{path.name}.{uuid.uuid4().hex}{TOMBSTONE_SUFFIX}")
+        try:
+            os.replace(path, tombstone)
+        except FileNotFoundError:
+            return
+        discarded.append((path, tombstone))
+
+    try:
+        with bind.begin() as conn:
+            conn.execute(_LOCK_KEY[conn.dialect.name], {"name": key})
+            yield conn, discard
+    except BaseException:
+        for path, tombstone in discarded:
+            os.replace(tombstone, path)
+        raise
+    for _, tombstone in discarded:
+        tombstone.unlink(missing_ok=True)
+
+
+def store_file(tmp: Path, key: str) -> str:
+    """Range un fichier temporaire sous sa clé et prend une référence ; le fichier est écarté s'il existe déjà.
+
+    Appel bloquant (base + disque) : à lancer dans io_executor.
+    """
+    with locked_key(key) as (conn, _):
+        conn.execute(_ACQUIRE, {"name": key, "size": tmp.stat().st_size, "now": datetime.utcnow()})
+        dest = image_path(key)
+        if dest.exists():
+            tmp.unlink(missing_ok=True)
+        else:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, dest)
+    return key
+
+
+def release_image(name: str) -> bool:
+    """Libère une référence ; supprime le fichier à la dernière. Renvoie True si le fichier a été supprimé.
+
+    Un ancien nom à plat (non migré) n'est pas compté : son fichier est supprimé directement.
+    """
+    if not name:
+        return False
+    if not is_image_key(name):
+        path = image_path(name)
+        if not path.exists():
+            return False
+        path.unlink(missing_ok=True)
+        return True
+    with locked_key(name) as (conn, discard):
+        conn.execute(_DECREMENT, {"name": name})
+        deleted = conn.execute(_DELETE_UNREFERENCED, {"name": name}).rowcount
+        if deleted:
+            discard(image_path(name))
+    return bool(deleted)
+
+
+async def store_upload(file, max_bytes=MAX_UPLOAD_BYTES):
+    """Enregistre un UploadFile (par blocs, via un fichier temporaire) ; renvoie (clé, hash du contenu)."""
+    tmp = temp_path()
+    try:
+        _, content_hash = await save_upload(file, tmp, max_bytes=max_bytes)
+        key = await run_in(io_executor, store_file, tmp, image_key(content_hash, file.filename))
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return key, content_hash
+
+
+async def read_image(name: str) -> bytes | None:
+    """Contenu d'une image lu hors de la boucle d'événements ; None si le fichier est absent."""
+    path = image_path(name)
+    try:
+        return await run_in(io_executor, path.read_bytes)
+    except FileNotFoundError:
+        return None
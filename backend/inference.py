@@ -0,0 +1,94 @@
+import asyncio
+
+import numpy as np
+
+from metrics import MODEL_BATCH_SIZE, MODEL_FORWARD_SECONDS
+from settings import MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS
+
+
+class BatchInferenceEngine:
+    """Regroupe les requêtes /predict concurrentes en lots et lance un seul passage du modèle par lot."""
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS, executor=None):
+        # predict_fn reçoit un tableau (N, H, W, 3) et renvoie les probabilités (N, nb_classes)
+        self.predict_fn = predict_fn
+        # None = exécuteur par défaut de la boucle
+        self.executor = executor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = None
+        self._worker = None
+        # Lot en cours de constitution ou de calcul : hors de la file, il doit être soldé à l'arrêt
+        self._batch = []
+
+    async def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        # Les requêtes du lot interrompu et celles encore en attente ne seront jamais traitées
+        pending = self._batch
+        self._batch = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Moteur d'inférence arrêté"))
+
+    async def predict(self, img_array):
+        """Soumet une image prétraitée (H, W, 3) et attend son vecteur de probabilités."""
+        if self._worker is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((img_array, future))
+        return await future
+
+    async def _collect_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = self._batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            # Ignore les requêtes dont le client a abandonné
+            batch = self._batch = [(x, fut) for x, fut in batch if not fut.done()]
+            if not batch:
+                continue
+            inputs = np.stack([x for x, _ in batch])
+            MODEL_BATCH_SIZE.observe(len(batch))
+            try:
+                with MODEL_FORWARD_SECONDS.time():
+                    preds = await loop.run_in_executor(self.executor, self.predict_fn, inputs)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                self._batch = []
+                continue
+            for (_, fut), probs in zip(batch, preds):
+                if not fut.done():
+                    fut.set_result(np.asarray(probs))
+            self._batch = []
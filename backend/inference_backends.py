@@ -0,0 +1,122 @@
+"""Backends d'inférence interchangeables pour le modèle DenseNet (sélection via DERMASCAN_INFERENCE_BACKEND)."""
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+from preprocessing import IMG_SIZE
+from settings import MODEL_VERSION
+
+INPUT_SHAPE = (None, IMG_SIZE[1], IMG_SIZE[0], 3)
+
+
+class KerasBackend:
+    """Chemin générique model.predict (référence, le plus lent pour un petit lot)."""
+
+    name = "keras"
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class CompiledBackend:
+    """Appel du modèle tracé une seule fois via tf.function avec une signature fixe."""
+
+    name = "compiled"
+
+    def __init__(self, model):
+        self.model = model
+        self._fn = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(INPUT_SHAPE, tf.float32)],
+        )
+        # Trace dès le chargement plutôt qu'à la première requête
+        self._fn.get_concrete_function()
+
+    def predict(self, batch):
+        return self._fn(tf.convert_to_tensor(batch, dtype=tf.float32)).numpy()
+
+
+class TFLiteBackend:
+    """Modèle converti en TFLite, quantifié en float16 ou en int8 (plage dynamique)."""
+
+    def __init__(self, model, quantization="float16", cache_path=None):
+        self.name = f"tflite-{quantization}"
+        if cache_path and Path(cache_path).exists():
+            content = Path(cache_path).read_bytes()
+        else:
+            content = convert_to_tflite(model, quantization)
+            if cache_path:
+                # Écriture atomique : un autre worker ne lit jamais un fichier à moitié écrit
+                tmp = Path(f"{cache_path}.{os.getpid()}.part")
+                tmp.write_bytes(content)
+                os.replace(tmp, cache_path)
+        self._interpreter = tf.lite.Interpreter(model_content=content)
+        self._input = self._interpreter.get_input_details()[0]["index"]
+        self._output = self._interpreter.get_output_details()[0]["index"]
+        self._batch_size = None
+        # L'interpréteur TFLite n'est pas thread-safe
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input, batch.shape)
+                self._interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self._interpreter.set_tensor(self._input, batch)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output).copy()
+
+
+def convert_to_tflite(model, quantization="float16"):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization != "int8":
+        raise ValueError(f"Quantification inconnue : {quantization}")
+    # "int8" sans jeu de calibration = quantification dynamique des poids
+    return converter.convert()
+
+
+def tflite_cache_path(model_path, quantization):
+    """Fichier TFLite converti, nommé d'après la taille et la date du modèle source : un modèle remplacé
+    est reconverti au lieu de servir une ancienne conversion."""
+    source = Path(model_path)
+    stat = source.stat()
+    return source.with_name(f"{source.stem}.{stat.st_size}-{stat.st_mtime_ns}.{quantization}.tflite")
+
+
+def remove_stale_tflite(model_path, quantization, keep):
+    """Supprime les conversions d'anciennes versions du modèle (et l'ancien nom sans version)."""
+    source = Path(model_path)
+    for path in source.parent.glob(f"{source.stem}.*{quantization}.tflite"):
+        if path != keep:
+            path.unlink(missing_ok=True)
+
+
+def create_backend(name, model_path):
+    """Charge le modèle et construit le backend demandé."""
+    model = tf.keras.models.load_model(model_path)
+    if name == "keras":
+        backend = KerasBackend(model)
+    elif name == "compiled":
+        backend = CompiledBackend(model)
+    elif name in ("tflite-float16", "tflite-int8"):
+        quantization = name.split("-", 1)[1]
+        cache_path = tflite_cache_path(model_path, quantization)
+        backend = TFLiteBackend(model, quantization, cache_path=cache_path)
+        remove_stale_tflite(model_path, quantization, keep=cache_path)
+    else:
+        raise ValueError(f"Backend d'inférence inconnu : {name}")
+    # Les sorties dépendent du fichier du modèle et de la quantification
+    stat = Path(model_path).stat()
+    backend.version = MODEL_VERSION or f"{backend.name}:{stat.st_size}:{stat.st_mtime_ns}"
+    return backend
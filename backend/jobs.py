@@ -0,0 +1,265 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import and_, func, or_, select, update
+
+from auth import PredictionJob
+from database import AsyncSessionLocal
+from metrics import JOB_PROCESSING_SECONDS, JOB_WAIT_SECONDS
+from settings import JOB_LEASE_SECONDS, JOB_POLL_SECONDS, JOB_WORKERS
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("done", "error")
+
+
+def _percentiles(samples):
+    if not samples:
+        return {"p50": None, "p99": None}
+    arr = np.asarray(samples)
+    return {"p50": round(float(np.percentile(arr, 50)), 3), "p99": round(float(np.percentile(arr, 99)), 3)}
+
+
+def job_to_dict(job):
+    """Représentation JSON d'un job pour l'API."""
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "prediction_id": job.prediction_id,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+    }
+
+
+class JobQueue:
+    """File de jobs de prédiction persistée dans la table prediction_jobs, sans broker externe.
+
+    Les workers (tâches asyncio) réclament les jobs "queued" par ordre d'arrivée avec une mise à jour
+    conditionnelle, ce qui reste sûr si plusieurs processus partagent la base. Un job "running" porte
+    l'identifiant du processus qui l'exécute, lequel renouvelle son bail (heartbeat_at) ; seuls les jobs
+    dont le bail a expiré (processus arrêté en cours de traitement) repassent "queued", jamais ceux
+    qu'un autre processus vivant est en train de traiter.
+    """
+
+    def __init__(self, handler, workers=JOB_WORKERS, poll_seconds=JOB_POLL_SECONDS, session_factory=AsyncSessionLocal,
+                 lease_seconds=JOB_LEASE_SECONDS):
+        # handler(job, db) exécute le job dans la session db, sans commit, et renvoie un résultat JSON (dict) ;
+        # le résultat et les écritures du handler sont validés dans la même transaction
+        self.handler = handler
+        self.worker_count = max(1, int(workers))
+        self.poll_seconds = poll_seconds
+        self.session_factory = session_factory
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._workers = []
+        self._heartbeat = None
+        self._wakeup = None
+        self._listeners = {}
+        # Dernières durées observées (ms) : attente en file et traitement
+        self._wait_ms = deque(maxlen=1000)
+        self._processing_ms = deque(maxlen=1000)
+        self.completed = 0
+        self.failed = 0
+
+    async def start(self):
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        await self._requeue_expired()
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.worker_count)]
+        self._heartbeat = asyncio.create_task(self._renew_leases())
+
+    async def stop(self):
+        for task in [*self._workers, self._heartbeat]:
+            task.cancel()
+        await asyncio.gather(*self._workers, self._heartbeat, return_exceptions=True)
+        self._workers = []
+        self._heartbeat = None
+        # Jobs interrompus par cet arrêt : rendus à la file tout de suite, sans attendre l'expiration du bail
+        await self._requeue(PredictionJob.worker_id == self.worker_id)
+
+    async def submit(self, **fields):
+        """Enregistre un nouveau job "queued" et réveille un worker."""
+        job = PredictionJob(id=uuid.uuid4().hex, status="queued", created_at=datetime.utcnow(), **fields)
+        async with self.session_factory() as db:
+            db.add(job)
+            await db.commit()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id):
+        async with self.session_factory() as db:
+            return await db.get(PredictionJob, job_id)
+
+    def listen(self, job_id) -> asyncio.Event:
+        """Événement déclenché au prochain changement de statut du job (à obtenir avant de relire le job,
+        et à rendre avec unlisten une fois l'attente terminée)."""
+        event = asyncio.Event()
+        self._listeners.setdefault(job_id, set()).add(event)
+        return event
+
+    def unlisten(self, job_id, event):
+        listeners = self._listeners.get(job_id)
+        if listeners is not None:
+            listeners.discard(event)
+            if not listeners:
+                del self._listeners[job_id]
+
+    async def stats(self):
+        async with self.session_factory() as db:
+            counts = dict((await db.execute(
+                select(PredictionJob.status, func.count()).group_by(PredictionJob.status)
+            )).all())
+            oldest = (await db.execute(
+                select(func.min(PredictionJob.created_at)).where(PredictionJob.status == "queued")
+            )).scalar()
+        return {
+            "queue_depth": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "error": counts.get("error", 0),
+            "workers": self.worker_count,
+            "oldest_queued_age_ms": round((datetime.utcnow() - oldest).total_seconds() * 1000, 3) if oldest else None,
+            "wait_ms": _percentiles(self._wait_ms),
+            "processing_ms": _percentiles(self._processing_ms),
+        }
+
+    def _notify(self, job_id):
+        for event in self._listeners.pop(job_id, ()):
+            event.set()
+
+    async def _requeue(self, condition):
+        async with self.session_factory() as db:
+            requeued = await db.execute(
+                update(PredictionJob)
+                .where(PredictionJob.status == "running", condition)
+                .values(status="queued", started_at=None, worker_id=None, heartbeat_at=None)
+            )
+            await db.commit()
+        if requeued.rowcount:
+            logger.info("%s jobs interrompus remis en file", requeued.rowcount)
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def _requeue_expired(self):
+        """Remet en file les jobs dont le processus ne renouvelle plus le bail (arrêté ou planté)."""
+        expired = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        await self._requeue(or_(
+            PredictionJob.heartbeat_at < expired,
+            # Jobs lancés avant l'introduction du bail
+            and_(PredictionJob.heartbeat_at.is_(None), PredictionJob.started_at < expired),
+        ))
+
+    async def _renew_leases(self):
+        """Renouvelle le bail des jobs de ce processus et reprend ceux des processus disparus."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(PredictionJob)
+                        .where(PredictionJob.status == "running", PredictionJob.worker_id == self.worker_id)
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    await db.commit()
+                await self._requeue_expired()
+            except Exception:
+                logger.exception("Erreur lors du renouvellement des baux de jobs")
+
+    async def _claim(self):
+        """Passe le plus ancien job "queued" en "running" ; renvoie son id, None si la file est vide."""
+        async with self.session_factory() as db:
+            while True:
+                job_id = (await db.execute(
+                    select(PredictionJob.id)
+                    .where(PredictionJob.status == "queued")
+                    .order_by(PredictionJob.created_at)
+                    .limit(1)
+                )).scalar()
+                if job_id is None:
+                    return None
+                now = datetime.utcnow()
+                claimed = await db.execute(
+                    update(PredictionJob)
+                    .where(PredictionJob.id == job_id, PredictionJob.status == "queued")
+                    .values(status="running", started_at=now, worker_id=self.worker_id, heartbeat_at=now)
+                )
+                await db.commit()
+                # Sinon un autre worker l'a réclamé entre-temps : on passe au suivant
+                if claimed.rowcount == 1:
+                    return job_id
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            job_id = await self._claim()
+            if job_id is None:
+                # Scrutation périodique en plus du réveil : jobs soumis par un autre processus
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._notify(job_id)
+            try:
+                await self._execute(job_id)
+            except Exception:
+                # Ne pas perdre le worker ; le job ne doit pas rester "running" sous un bail renouvelé
+                logger.exception("Erreur worker sur le job %s", job_id)
+                await self._fail(job_id, "Erreur interne du worker")
+            finally:
+                self._notify(job_id)
+
+    async def _fail(self, job_id, message):
+        """Passe en erreur, dans une session neuve, un job de ce processus resté "running"."""
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(PredictionJob)
+                    .where(PredictionJob.id == job_id, PredictionJob.status == "running",
+                           PredictionJob.worker_id == self.worker_id)
+                    .values(status="error", error=message, finished_at=datetime.utcnow(),
+                            worker_id=None, heartbeat_at=None)
+                )
+                await db.commit()
+            self.failed += 1
+        except Exception:
+            logger.exception("Impossible de passer le job %s en erreur", job_id)
+
+    async def _execute(self, job_id):
+        async with self.session_factory() as db:
+            job = await db.get(PredictionJob, job_id)
+            try:
+                result = await self.handler(job, db)
+                job.result = json.dumps(result, ensure_ascii=False)
+                job.prediction_id = result.get("prediction_id")
+                job.status = "done"
+                job.finished_at = datetime.utcnow()
+                await db.commit()
+                self.completed += 1
+            except Exception as e:
+                logger.warning("Erreur job %s : %s", job_id, e)
+                await db.rollback()
+                job = await db.get(PredictionJob, job_id)
+                job.error = str(getattr(e, "detail", None) or e)
+                job.status = "error"
+                job.finished_at = datetime.utcnow()
+                await db.commit()
+                self.failed += 1
+            wait = (job.started_at - job.created_at).total_seconds()
+            processing = (job.finished_at - job.started_at).total_seconds()
+            self._wait_ms.append(wait * 1000)
+            self._processing_ms.append(processing * 1000)
+            JOB_WAIT_SECONDS.observe(wait)
+            JOB_PROCESSING_SECONDS.observe(processing)
@@ -0,0 +1,8 @@
+import re
+
+# Classes de sortie du modèle, dans l'ordre de ses probabilités
+class_names = ['1. Eczema 1677', '10. Warts Molluscum and other Viral Infections - 2103', '2. Melanoma 15.75k', '3. Atopic Dermatitis - 1.25k', '4. Basal Cell Carcinoma (BCC) 3323', '5. Melanocytic Nevi (NV) - 7970', '6. Benign Keratosis-like Lesions (BKL) 2624', '7. Psoriasis pictures Lichen Planus and related diseases - 2k', '8. Seborrheic Keratoses and other Benign Tumors - 1.8k', '9. Tinea Ringworm Candidiasis and other Fungal Infections - 1.7k', 'acne']
+
+
+def clean_disease_name(raw):
+    return re.sub(r'^\d+\.\s*', '', re.sub(r'\s*-?\s*\d+[a-zA-Z\. ]*$', '', raw)).strip()
@@ -1,41 +1,63 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import JSONResponse, FileResponse
+# Avant les autres imports : auth.py journalise dès son import
+from logging_config import setup_logging
+setup_logging()
+
+import logging
+from fastapi import FastAPI, UploadFile, File, Form
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from auth import router as auth_router, User, Prediction, get_db
-from sqlalchemy.orm import Session
-from sqlalchemy.ext.declarative import declarative_base
-from jose import jwt
-from fastapi import Header, Depends, HTTPException
+from auth import router as auth_router, User, Prediction, PredictionNote, Patient, CurrentUser, get_current_user, get_current_user_allow_expired
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, AsyncSessionLocal, engine, insert_ignore
+from fastapi import Header, Depends, HTTPException, Query, Response
 from datetime import datetime
 from PIL import Image
 import numpy as np
-import io
+import asyncio
 import tensorflow as tf
 from fastapi import status
-from sqlalchemy import Text, or_
+from sqlalchemy import Text, or_, and_, delete, select, func
 from pydantic import BaseModel
 from fastapi import Path
 from sqlalchemy import Column, Integer, String
 import base64
 from pathlib import Path
-import os
-import uuid
 from tensorflow.keras.applications.densenet import preprocess_input
 import re
 from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
-
-Base = declarative_base()
+from inference import BatchInferenceEngine
+from executors import inference_executor, io_executor, decode_executor, run_in, shutdown_executors
+from preprocessing import EmptyImage, ImageTooLarge, decode_and_resize
+from uploads import save_upload, is_zip_upload, extract_zip_images
+from image_store import TMP_DIR, image_path, read_image, store_file, store_upload, image_key, temp_path
+from image_gc import image_reclaimer
+from inference_backends import create_backend
+from settings import MODEL_PATH, INFERENCE_BACKEND, MAX_BATCH_FILES, MAX_BATCH_UPLOAD_BYTES, JOB_SSE_KEEPALIVE_SECONDS
+from jobs import JobQueue, TERMINAL_STATUSES, job_to_dict
+import metrics
+from metrics import Gauge, MetricsMiddleware, JOBS, PREDICT_STAGE_SECONDS, PREDICTION_CACHE_REQUESTS
+from prediction_cache import PredictionCache
+from settings import NOTES_DEFAULT_LIMIT, NOTES_MAX_LIMIT, PATIENT_SEARCH_MAX_LIMIT
+from patients import clean_patient, import_patients_csv, prefix_filter
+from settings import HISTORY_DEFAULT_LIMIT, HISTORY_MAX_LIMIT, THUMBNAIL_SIZES, THUMBNAILS_AT_UPLOAD
+from comparisons import ComparisonIndex
+from labels import class_names, clean_disease_name
+from thumbnails import ensure_thumbnail, generate_thumbnails, thumbnail_media_type
+from reports import get_report, report_key
+from settings import REPORT_MAX_PREDICTIONS
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
-    print("=== ERREUR DE VALIDATION ===")
-    print("Erreur complète:", exc)
-    print("Erreurs détaillées:", exc.errors())
-    print("Body reçu:", exc.body)
-    print("=== FIN ERREUR ===")
+    # Champs et types d'erreur seulement : les valeurs reçues peuvent contenir des données patient
+    logger.warning("Erreur de validation", extra={
+        "path": request.url.path,
+        "errors": [{"loc": e.get("loc"), "type": e.get("type")} for e in exc.errors()],
+    })
     return JSONResponse(
         status_code=422,
         content={"detail": exc.errors(), "body": exc.body}
@@ -43,10 +65,10 @@ async def validation_exception_handler(request, exc):
 
 @app.exception_handler(ValidationError)
 async def pydantic_validation_exception_handler(request, exc):
-    print("=== ERREUR PYDANTIC ===")
-    print("Erreur complète:", exc)
-    print("Erreurs détaillées:", exc.errors())
-    print("=== FIN ERREUR ===")
+    logger.warning("Erreur pydantic", extra={
+        "path": request.url.path,
+        "errors": [{"loc": e.get("loc"), "type": e.get("type")} for e in exc.errors()],
+    })
     return JSONResponse(
         status_code=422,
         content={"detail": exc.errors()}
@@ -62,20 +84,116 @@ app.add_middleware(
     allow_origins=["http://localhost:5173"],
     allow_methods=["*"],
     allow_headers=["*", "patient_nom", "patient_prenom"],  # <-- Ajoute explicitement ici si besoin
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Content-Disposition", "ETag"],
 )
+app.add_middleware(MetricsMiddleware)
 app.include_router(auth_router, tags=["auth"])
-# Charge ton modèle ici (déjà fait)
-model = tf.keras.models.load_model(r'D:\S2\projet\skin-app\backend\models\denseNet.keras')
-
-# Dimensions attendues par le modèle (exemple 224x224, adapte si nécessaire)
-IMG_SIZE = (256, 256)
-class_names = ['1. Eczema 1677', '10. Warts Molluscum and other Viral Infections - 2103', '2. Melanoma 15.75k', '3. Atopic Dermatitis - 1.25k', '4. Basal Cell Carcinoma (BCC) 3323', '5. Melanocytic Nevi (NV) - 7970', '6. Benign Keratosis-like Lesions (BKL) 2624', '7. Psoriasis pictures Lichen Planus and related diseases - 2k', '8. Seborrheic Keratoses and other Benign Tumors - 1.8k', '9. Tinea Ringworm Candidiasis and other Fungal Infections - 1.7k', 'acne']
+# Charge ton modèle ici (chemin et backend configurables dans settings.py)
+inference_backend = create_backend(INFERENCE_BACKEND, MODEL_PATH)
+
+# Les requêtes /predict concurrentes sont regroupées en lots (voir inference.py)
+inference_engine = BatchInferenceEngine(inference_backend.predict, executor=inference_executor)
+# Une image déjà analysée (même contenu, même modèle) ne repasse pas dans le modèle
+prediction_cache = PredictionCache(model_version=inference_backend.version)
+Gauge("dermascan_prediction_cache_hit_ratio", "Part des consultations du cache servies sans passer par le modèle",
+      fn=lambda: prediction_cache.hits / max(1, prediction_cache.hits + prediction_cache.misses))
+
+@app.on_event("startup")
+async def start_inference_engine():
+    await inference_engine.start()
+    # Table des comparaisons calculée avant la première requête (quelques ms, avant d'accepter du trafic)
+    comparison_index.load()
+    if prediction_cache.persistent:
+        # Entrées laissées par les versions précédentes du modèle
+        await run_in(io_executor, prediction_cache.prune)
+    await job_queue.start()
+    await image_reclaimer.start()
+
+@app.on_event("shutdown")
+async def stop_inference_engine():
+    await job_queue.stop()
+    await inference_engine.stop()
+    await image_reclaimer.stop()
+    shutdown_executors()
+
+# Comparaisons entre classes, précalculées depuis disease_profiles.json
+comparison_index = ComparisonIndex(class_names)
+
+
+async def classify_image(image_path: Path, content_hash: str):
+    """Probabilités du modèle pour une image enregistrée : cache par contenu, sinon décodage puis inférence par lots."""
+    cache_key = PredictionCache.make_key(content_hash, inference_backend.version)
+    with PREDICT_STAGE_SECONDS.time(stage="cache_lookup"):
+        probs = await run_in(io_executor, prediction_cache.get, cache_key)
+    PREDICTION_CACHE_REQUESTS.inc(result="miss" if probs is None else "hit")
+    if probs is None:
+        try:
+            # Décodage et redimensionnement dans la même étape (éventuellement dans un autre processus)
+            with PREDICT_STAGE_SECONDS.time(stage="decode_resize"):
+                img_array = await run_in(decode_executor, decode_and_resize, str(image_path))
+        except (ImageTooLarge, Image.DecompressionBombError) as e:
+            # Pas de suppression ici : l'appelant libère sa référence (release_image, sous verrou)
+            raise HTTPException(status_code=413, detail=str(e))
+        except EmptyImage as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        with PREDICT_STAGE_SECONDS.time(stage="preprocess"):
+            img_array = await run_in(inference_executor, preprocess_input, img_array)
+        # Attente du lot comprise ; le passage du modèle seul est dans dermascan_model_forward_seconds
+        with PREDICT_STAGE_SECONDS.time(stage="inference"):
+            probs = await inference_engine.predict(img_array)
+        asyncio.ensure_future(run_in(io_executor, prediction_cache.put, cache_key, probs))
+    return probs
+
+def summarize_probs(probs):
+    """Classe prédite, confiance, 3 classes les plus probables et fiche de comparaison."""
+    with PREDICT_STAGE_SECONDS.time(stage="comparison"):
+        return _summarize_probs(probs)
+
+def _summarize_probs(probs):
+    pred_class_index = int(np.argmax(probs))
+    # Obtenir les 3 classes les plus probables
+    top_indices = probs.argsort()[-3:][::-1]
+    top_predictions = [
+        {
+            "class_name": clean_disease_name(class_names[i]),
+            "confidence": float(probs[i])
+        } for i in top_indices
+    ]
+    return {
+        "predicted_class_index": pred_class_index,
+        "predicted_class_name": clean_disease_name(class_names[pred_class_index]),
+        "confidence": float(np.max(probs)),
+        "top_predictions": top_predictions,
+        # Simples lectures dans la table précalculée
+        "comparison": comparison_index.compare([p["class_name"] for p in top_predictions]),
+    }
 
-# !!! IMPORTANT !!!
-# Utilise exactement la même clé secrète et le même algorithme que dans auth.py
-SECRET_KEY = "TON_SECRET_KEY_SUPER_SECRET"  # Doit être identique à auth.py
-ALGORITHM = "HS256"  # Doit être identique à auth.py
+def build_prediction(user_id, image_name, result, patient):
+    """Ligne Prediction à partir du résultat de summarize_probs et des champs patient."""
+    return Prediction(
+        user_id=user_id,
+        image_name=image_name,
+        predicted_class=result["predicted_class_name"],
+        confidence=result["confidence"],
+        date=datetime.utcnow(),
+        notes=None,
+        top_predictions=json.dumps(result["top_predictions"]),
+        comparison=json.dumps(result["comparison"]) if result["comparison"] else None,
+        patient_nom=patient.get("nom"),
+        patient_prenom=patient.get("prenom"),
+        telephone=patient.get("telephone"),
+        sexe=patient.get("sexe"),
+        age=patient.get("age"),
+    )
 
+def advice_for(pred_class_name):
+    try:
+        simple_name = pred_class_name.split(".")[1].strip().split(" ")[0]
+        logger.debug("Clé de conseil %s pour %s", simple_name, pred_class_name)
+        return disease_advice.get(simple_name)
+    except Exception as e:
+        logger.warning("Erreur extraction conseil : %s", e)
+        return None
 
 # 1. Ajoute les colonnes patient_nom et patient_prenom à Prediction (dans auth.py aussi)
 # Dans auth.py, ajoute :
@@ -86,247 +204,390 @@ ALGORITHM = "HS256"  # Doit être identique à auth.py
 @app.post("/predict")
 async def predict(
     file: UploadFile = File(...),
-    authorization: str = Header(None),
-    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user_allow_expired),
+    db: AsyncSession = Depends(get_async_db),
     patient_nom: str = Header(None, alias="patient_nom"),
     patient_prenom: str = Header(None, alias="patient_prenom"),
     patient_telephone: str = Header(None, alias="patient_telephone"),
     patient_sexe: str = Header(None, alias="patient_sexe"),
     patient_age: str = Header(None, alias="patient_age"),
 ):
-    # Correction : accepte aussi "authorization" minuscule (certains navigateurs l'envoient ainsi)
-    if not authorization:
-        from fastapi import Request
-        import inspect
-        frame = inspect.currentframe()
-        request = None
-        while frame:
-            if "request" in frame.f_locals:
-                request = frame.f_locals["request"]
-                break
-            frame = frame.f_back
-        if request:
-            authorization = request.headers.get("authorization")
-    if not authorization or not authorization.startswith("Bearer "):
-        print("Authorization header reçu:", authorization)
-        raise HTTPException(status_code=401, detail="Token manquant")
-    token = authorization.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
-        email = payload.get("sub")
-        role = payload.get("role")
-        user_nom = payload.get("nom")
-        user_prenom = payload.get("prenom")
-    except Exception as e:
-        print("Erreur décodage JWT:", str(e))
-        raise HTTPException(status_code=401, detail="Token invalide")
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        print("Utilisateur non trouvé pour email:", email)
-        raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
-
-    # Ajoute ce print pour vérifier la réception des headers
-    print("DEBUG patient_nom:", patient_nom, "| patient_prenom:", patient_prenom, "| role:", role)
+    # Pas de données patient dans les journaux
+    logger.debug("Requête /predict", extra={"user_id": current_user.id, "role": current_user.role})
+    # Image enregistrée par contenu (par blocs, hash calculé au passage) ; une image déjà connue n'est pas réécrite
+    unique_filename, content_hash = await store_upload(file)
     try:
-        image_data = await file.read()
-        
-        # Générer un nom unique pour l'image
-        unique_filename = generate_unique_filename(file.filename)
-        
-        # S'assurer que le dossier uploads existe
-        uploads_dir = ensure_uploads_dir()
-        
-        # Sauvegarder l'image dans le dossier uploads
-        image_path = uploads_dir / unique_filename
-        with open(image_path, "wb") as f:
-            f.write(image_data)
-        
-        # Vérifier que l'image a bien été sauvegardée
-        if not image_path.exists():
-            raise HTTPException(status_code=500, detail="Erreur lors de la sauvegarde de l'image")
-        
-        image_pil = Image.open(io.BytesIO(image_data)).convert('RGB')
-        image_resized = image_pil.resize(IMG_SIZE)
-        img_array = np.array(image_resized)
-        img_array = preprocess_input(img_array)
-        input_tensor = np.expand_dims(img_array, axis=0)
-        preds = model.predict(input_tensor)
-        pred_class_index = int(np.argmax(preds))
-        pred_class_name = clean_disease_name(class_names[pred_class_index])
-        confidence = float(np.max(preds))
-
-        # Obtenir les 3 classes les plus probables
-        top_indices = preds[0].argsort()[-3:][::-1]
-        top_predictions = [
-            {
-                "class_name": clean_disease_name(class_names[i]),
-                "confidence": float(preds[0][i])
-            } for i in top_indices
-        ]
-
-        # Générer la fiche de comparaison (pour l'historique)
-        with open("disease_profiles.json", "r", encoding="utf-8") as f:
-            comparisons_data = json.load(f)
-        def get_simple_name(d):
-            if not isinstance(d, str):
-                return ""
-            parts = d.split(".")
-            if len(parts) > 1:
-                rest = parts[1].strip()
-                main = rest.split(" ")[0]
-                return main.lower()
-            return d.lower()
-        comparison_pairs = []
-        for i in range(len(top_predictions)):
-            for j in range(i + 1, len(top_predictions)):
-                d1 = top_predictions[i]["class_name"]
-                d2 = top_predictions[j]["class_name"]
-                s1 = get_simple_name(d1)
-                s2 = get_simple_name(d2)
-                found_key = None
-                for k in comparisons_data.keys():
-                    if s1 in k.lower() and s2 in k.lower():
-                        found_key = k
-                        break
-                if found_key:
-                    crits = []
-                    profile1 = comparisons_data[found_key]
-                    profile2 = comparisons_data[found_key]
-                    if isinstance(profile1, dict) and isinstance(profile2, dict):
-                        common_keys = set(profile1.keys()) & set(profile2.keys())
-                        for key in common_keys:
-                            crits.append({
-                                "nom": key,
-                                d1: profile1.get(key, "-"),
-                                d2: profile2.get(key, "-")
-                            })
-                    comparison = {
-                        "diseases": [d1, d2],
-                        "criteria": crits
-                    }
-                    comparison_pairs.append(comparison)
+        if THUMBNAILS_AT_UPLOAD:
+            asyncio.ensure_future(run_in(io_executor, generate_thumbnails, unique_filename))
+
+        probs = await classify_image(image_path(unique_filename), content_hash)
+        result = summarize_probs(probs)
+    except HTTPException:
+        image_reclaimer.enqueue(unique_filename)
+        raise
     except Exception as e:
-        print("Erreur prédiction :", str(e))
+        logger.exception("Erreur prédiction")
+        image_reclaimer.enqueue(unique_filename)
         raise HTTPException(status_code=500, detail=f"Erreur prédiction : {str(e)}")
 
+    # Médecin : patient saisi dans le formulaire ; patient : lui-même
+    if current_user.role != "medecin":
+        patient_nom = current_user.claims.get("nom")
+        patient_prenom = current_user.claims.get("prenom")
+    patient = {"nom": patient_nom, "prenom": patient_prenom, "telephone": patient_telephone,
+               "sexe": patient_sexe, "age": patient_age}
     try:
-        # ...existing code...
-        if role == "medecin":
-            pred_patient_nom = patient_nom
-            pred_patient_prenom = patient_prenom
-        else:
-            pred_patient_nom = user_nom
-            pred_patient_prenom = user_prenom
-
-        print("DEBUG pred_patient_nom:", pred_patient_nom, "| pred_patient_prenom:", pred_patient_prenom)
-
-        # Assure que top_predictions et comparison_pairs existent ici
-        new_pred = Prediction(
-            user_id=user.id,
-            image_name=unique_filename,
-            predicted_class=pred_class_name,
-            confidence=str(confidence),
-            date=datetime.utcnow().isoformat(),
-            notes=None,
-            top_predictions=json.dumps(top_predictions),
-            comparison=json.dumps(comparison_pairs) if comparison_pairs else None,
-            patient_nom=pred_patient_nom,
-            patient_prenom=pred_patient_prenom,
-            telephone=patient_telephone,
-            sexe=patient_sexe,
-            age=patient_age
-        )
+        new_pred = build_prediction(current_user.id, unique_filename, result, patient)
         db.add(new_pred)
-        db.commit()
-        db.refresh(new_pred)
+        with PREDICT_STAGE_SECONDS.time(stage="db_commit"):
+            await db.commit()
+            await db.refresh(new_pred)
     except Exception as e:
-        print("Erreur sauvegarde historique :", str(e))
+        logger.exception("Erreur sauvegarde historique")
+        image_reclaimer.enqueue(unique_filename)
         raise HTTPException(status_code=500, detail=f"Erreur sauvegarde historique : {str(e)}")
 
-    advice = None
-    try:
-        simple_name = pred_class_name.split(".")[1].strip().split(" ")[0]
-        print("Maladie prédite:", pred_class_name, "| Clef utilisée pour advice:", simple_name)
-        advice = disease_advice.get(simple_name)
-    except Exception as e:
-        print("Erreur extraction conseil :", str(e))
-        advice = None
-
-    # Ajoute ce print pour vérifier la réponse
-    print("DEBUG API RESPONSE:", {
-        "predicted_class_index": int(pred_class_index),
-        "predicted_class_name": pred_class_name,
-        "confidence": confidence,
-        "top_predictions": top_predictions,
-        "advice": advice,
-        "prediction_id": new_pred.id,
-        "comparison": comparison_pairs
-    })
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Réponse /predict", extra={
+            "prediction_id": new_pred.id,
+            "predicted_class": result["predicted_class_name"],
+            "confidence": result["confidence"],
+        })
 
     return JSONResponse(content={
-        "predicted_class_index": int(pred_class_index),
-        "predicted_class_name": pred_class_name,
-        "confidence": confidence,
-        "top_predictions": top_predictions,
-        "advice": advice,
+        **result,
+        "advice": advice_for(result["predicted_class_name"]),
         "prediction_id": new_pred.id,
-        "comparison": comparison_pairs
     })
 
-@app.get("/history_full/{email}")
-def get_history_full(
-    email: str,
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
+PATIENT_FIELDS = ("nom", "prenom", "telephone", "sexe", "age")
+
+def parse_batch_patients(patients: str | None):
+    """Décode le champ patients de /predict/batch : liste alignée sur les images ou objet indexé par nom de fichier."""
+    if not patients:
+        return None
+    try:
+        parsed = json.loads(patients)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Champ patients invalide (JSON attendu)")
+    if not isinstance(parsed, (list, dict)):
+        raise HTTPException(status_code=400, detail="Champ patients invalide (liste ou objet attendu)")
+    return parsed
+
+@app.post("/predict/batch")
+async def predict_batch(
+    files: list[UploadFile] = File(...),
+    patients: str | None = Form(None),
+    current_user: CurrentUser = Depends(get_current_user_allow_expired),
+    patient_nom: str = Header(None, alias="patient_nom"),
+    patient_prenom: str = Header(None, alias="patient_prenom"),
+    patient_telephone: str = Header(None, alias="patient_telephone"),
+    patient_sexe: str = Header(None, alias="patient_sexe"),
+    patient_age: str = Header(None, alias="patient_age"),
 ):
-    # Correction : accepte aussi "authorization" minuscule (certains navigateurs l'envoient ainsi)
-    if not authorization:
-        from fastapi import Request
-        import inspect
-        frame = inspect.currentframe()
-        request = None
-        while frame:
-            if "request" in frame.f_locals:
-                request = frame.f_locals["request"]
-                break
-            frame = frame.f_back
-        if request:
-            authorization = request.headers.get("authorization")
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Token manquant")
-    token = authorization.split(" ")[1]
+    """Analyse plusieurs images (ou une archive ZIP) en une seule requête.
+
+    Une ligne NDJSON est renvoyée par image dès qu'elle est analysée, puis une ligne de synthèse
+    avec les identifiants des prédictions, toutes enregistrées dans une seule transaction.
+    patients (JSON, optionnel) : liste alignée sur les images, ou objet indexé par nom de fichier,
+    de {nom, prenom, telephone, sexe, age} ; à défaut, les en-têtes patient_* valent pour toutes les images.
+    """
+    header_patient = {"nom": patient_nom, "prenom": patient_prenom, "telephone": patient_telephone,
+                      "sexe": patient_sexe, "age": patient_age}
+    per_image = parse_batch_patients(patients)
+
+    # Enregistrement de toutes les images (nom d'origine, clé de stockage, hash) avant l'analyse
+    items = []
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email_token = payload.get("sub")
-        role = payload.get("role")
+        for file in files:
+            if is_zip_upload(file):
+                zip_path = temp_path()
+                try:
+                    await save_upload(file, zip_path, max_bytes=MAX_BATCH_UPLOAD_BYTES)
+                    extracted = await run_in(io_executor, extract_zip_images, zip_path, TMP_DIR,
+                                             lambda original: temp_path().name, max_files=MAX_BATCH_FILES - len(items))
+                finally:
+                    zip_path.unlink(missing_ok=True)
+                for i, (original, tmp_name, content_hash) in enumerate(extracted):
+                    try:
+                        key = await run_in(io_executor, store_file, TMP_DIR / tmp_name, image_key(content_hash, original))
+                    except BaseException:
+                        for _, rest, _ in extracted[i:]:
+                            (TMP_DIR / rest).unlink(missing_ok=True)
+                        raise
+                    items.append((original, key, content_hash))
+            else:
+                if len(items) >= MAX_BATCH_FILES:
+                    raise HTTPException(status_code=413, detail=f"Trop d'images (maximum {MAX_BATCH_FILES})")
+                key, content_hash = await store_upload(file)
+                items.append((file.filename, key, content_hash))
+    except BaseException:
+        image_reclaimer.enqueue(*(stored for _, stored, _ in items))
+        raise
+    if not items:
+        raise HTTPException(status_code=400, detail="Aucune image reçue")
+
+    def patient_for(index, original):
+        patient = dict(header_patient)
+        if isinstance(per_image, list) and index < len(per_image) and isinstance(per_image[index], dict):
+            patient.update({k: per_image[index][k] for k in PATIENT_FIELDS if k in per_image[index]})
+        elif isinstance(per_image, dict) and isinstance(per_image.get(original), dict):
+            patient.update({k: per_image[original][k] for k in PATIENT_FIELDS if k in per_image[original]})
+        if current_user.role != "medecin":
+            patient["nom"] = current_user.claims.get("nom")
+            patient["prenom"] = current_user.claims.get("prenom")
+        return patient
+
+    async def analyse(index, stored, content_hash):
+        try:
+            return index, summarize_probs(await classify_image(image_path(stored), content_hash)), None
+        except HTTPException as e:
+            return index, None, e.detail
+        except Exception as e:
+            logger.exception("Erreur prédiction (lot)")
+            return index, None, f"Erreur prédiction : {str(e)}"
+
+    async def results():
+        # Toutes les images partent en même temps : décodage en parallèle, inférence regroupée en lots
+        tasks = [asyncio.ensure_future(analyse(i, stored, h)) for i, (_, stored, h) in enumerate(items)]
+        rows = {}
+        committed = False
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, result, error = await next_done
+                original, stored, _ = items[index]
+                if error is not None:
+                    image_reclaimer.enqueue(stored)
+                    items[index] = (original, None, None)
+                    yield json.dumps({"index": index, "filename": original, "error": error}, ensure_ascii=False) + "\n"
+                    continue
+                if THUMBNAILS_AT_UPLOAD:
+                    asyncio.ensure_future(run_in(io_executor, generate_thumbnails, stored))
+                rows[index] = build_prediction(current_user.id, stored, result, patient_for(index, original))
+                line = {"index": index, "filename": original, **result,
+                        "advice": advice_for(result["predicted_class_name"])}
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+
+            # Une seule transaction pour toutes les prédictions du lot
+            try:
+                async with AsyncSessionLocal() as db:
+                    db.add_all(rows.values())
+                    with PREDICT_STAGE_SECONDS.time(stage="db_commit"):
+                        await db.commit()
+                committed = True
+            except Exception as e:
+                logger.exception("Erreur sauvegarde historique (lot)")
+                yield json.dumps({"done": False, "error": f"Erreur sauvegarde historique : {str(e)}"},
+                                 ensure_ascii=False) + "\n"
+                return
+            yield json.dumps({
+                "done": True,
+                "count": len(rows),
+                "errors": len(items) - len(rows),
+                "prediction_ids": {str(i): rows[i].id for i in sorted(rows)},
+            }) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            if not committed:
+                # Lot interrompu ou non enregistré : pas d'images orphelines
+                image_reclaimer.enqueue(*(stored for _, stored, _ in items))
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+async def run_prediction_job(job, db):
+    """Exécute un job de /jobs/predict : même pipeline que /predict, prédiction ajoutée dans la session du job."""
+    try:
+        probs = await classify_image(image_path(job.image_name), job.content_hash)
     except Exception:
-        raise HTTPException(status_code=401, detail="Token invalide")
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        raise HTTPException(status_code=403, detail="Utilisateur non trouvé ou non autorisé")
-    if user.email != email_token:
+        # Le job passe en erreur : sa référence sur l'image est libérée
+        image_reclaimer.enqueue(job.image_name)
+        raise
+    result = summarize_probs(probs)
+    new_pred = build_prediction(job.user_id, job.image_name, result, json.loads(job.patient) if job.patient else {})
+    db.add(new_pred)
+    await db.flush()
+    return {**result, "advice": advice_for(result["predicted_class_name"]), "prediction_id": new_pred.id}
+
+# Jobs de prédiction persistés en base, traités par des workers en arrière-plan (voir jobs.py)
+job_queue = JobQueue(run_prediction_job)
+
+@app.post("/jobs/predict", status_code=202)
+async def submit_prediction_job(
+    file: UploadFile = File(...),
+    current_user: CurrentUser = Depends(get_current_user_allow_expired),
+    patient_nom: str = Header(None, alias="patient_nom"),
+    patient_prenom: str = Header(None, alias="patient_prenom"),
+    patient_telephone: str = Header(None, alias="patient_telephone"),
+    patient_sexe: str = Header(None, alias="patient_sexe"),
+    patient_age: str = Header(None, alias="patient_age"),
+):
+    """Comme /predict, mais répond immédiatement avec un identifiant de job.
+
+    Le résultat s'obtient via GET /jobs/{job_id} ou le flux SSE GET /jobs/{job_id}/events.
+    """
+    unique_filename, content_hash = await store_upload(file)
+    if THUMBNAILS_AT_UPLOAD:
+        asyncio.ensure_future(run_in(io_executor, generate_thumbnails, unique_filename))
+
+    if current_user.role != "medecin":
+        patient_nom = current_user.claims.get("nom")
+        patient_prenom = current_user.claims.get("prenom")
+    patient = {"nom": patient_nom, "prenom": patient_prenom, "telephone": patient_telephone,
+               "sexe": patient_sexe, "age": patient_age}
+    try:
+        job = await job_queue.submit(
+            user_id=current_user.id,
+            image_name=unique_filename,
+            content_hash=content_hash,
+            patient=json.dumps(patient, ensure_ascii=False),
+        )
+    except Exception as e:
+        image_reclaimer.enqueue(unique_filename)
+        logger.exception("Erreur création job")
+        raise HTTPException(status_code=500, detail=f"Erreur création job : {str(e)}")
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+    }
+
+@app.get("/admin/gc")
+async def image_gc_status(current_user: CurrentUser = Depends(get_current_user)):
+    """Suppressions d'images en attente et rapport de la dernière passe de récupération."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Accès interdit")
+    return {"pending": image_reclaimer.pending(), "last_report": image_reclaimer.last_report}
+
+@app.post("/admin/gc")
+async def run_image_gc(dry_run: bool = True, current_user: CurrentUser = Depends(get_current_user)):
+    """Lance une passe de récupération des images orphelines (simulation par défaut) et renvoie son rapport."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Accès interdit")
+    try:
+        return await image_reclaimer.run_pass(dry_run=dry_run)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métriques au format texte Prometheus : étapes de /predict, lots du modèle, cache, HTTP, SQL et jobs."""
+    try:
+        stats = await job_queue.stats()
+        for job_status in ("queued", "running", "done", "error"):
+            JOBS.set(stats["queue_depth"] if job_status == "queued" else stats[job_status], status=job_status)
+    except Exception as e:
+        logger.warning("Erreur lecture des statistiques de jobs : %s", e)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/jobs/stats")
+async def get_job_stats(current_user: CurrentUser = Depends(get_current_user)):
+    """Profondeur de la file, jobs en cours et durées d'attente / de traitement (p50, p99)."""
+    return await job_queue.stats()
+
+async def get_own_job(job_id: str, current_user: CurrentUser):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job non trouvé")
+    if job.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Accès interdit")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: CurrentUser = Depends(get_current_user)):
+    return job_to_dict(await get_own_job(job_id, current_user))
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, current_user: CurrentUser = Depends(get_current_user)):
+    """Flux SSE : un événement "status" à chaque changement de statut, jusqu'à "done" ou "error"."""
+    await get_own_job(job_id, current_user)
+
+    async def events():
+        last_status = None
+        while True:
+            # S'abonner avant de relire le job pour ne manquer aucun changement ; l'abonnement est rendu
+            # à chaque tour, y compris en fin de flux ou si le client se déconnecte
+            changed = job_queue.listen(job_id)
+            try:
+                job = await job_queue.get(job_id)
+                if job.status != last_status:
+                    last_status = job.status
+                    yield f"event: status\ndata: {json.dumps(job_to_dict(job), ensure_ascii=False)}\n\n"
+                if job.status in TERMINAL_STATUSES:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), JOB_SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+            finally:
+                job_queue.unlisten(job_id, changed)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/history_full/{email}")
+async def get_history_full(
+    email: str,
+    response: Response,
+    limit: int = Query(HISTORY_DEFAULT_LIMIT, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: str | None = None,
+    inline_images: bool = False,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Historique paginé (plus récent d'abord) ; la page suivante s'obtient via l'en-tête X-Next-Cursor.
+
+    Les images sont référencées par image_url ; inline_images=true rétablit l'ancien mode base64.
+    """
+    if current_user.email != email:
         raise HTTPException(status_code=403, detail="Non autorisé")
-    import json
+    query = select(Prediction).where(Prediction.user_id == current_user.id)
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Prediction.date < cursor_date,
+            and_(Prediction.date == cursor_date, Prediction.id < cursor_id),
+        ))
+    # Une ligne de plus pour savoir s'il reste une page
+    query = query.order_by(Prediction.date.desc(), Prediction.id.desc()).limit(limit + 1)
+    page = (await db.execute(query)).scalars().all()
+    if len(page) > limit:
+        page = page[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(page[-1].date, page[-1].id)
+
+    # Nombre de notes par ligne en une requête groupée ; le contenu s'obtient via /prediction/{id}/notes
+    notes_counts = {}
+    if page:
+        notes_counts = dict((await db.execute(
+            select(PredictionNote.prediction_id, func.count())
+            .where(PredictionNote.prediction_id.in_([pred.id for pred in page]))
+            .group_by(PredictionNote.prediction_id)
+        )).all())
+
     results = []
-    for pred in sorted(user.predictions, key=lambda p: p.date, reverse=True):
-        # Récupérer l'image
-        image_path = Path(f"uploads/{pred.image_name}")
+    for pred in page:
         image_data = None
-        if image_path.exists():
-            try:
-                with open(image_path, "rb") as img_file:
-                    image_data = base64.b64encode(img_file.read()).decode('utf-8')
-            except Exception as e:
-                print(f"Erreur lecture image {pred.image_name}: {str(e)}")
-        
+        if inline_images:
+            # Mode historique : image complète encodée en base64 dans la réponse
+            if pred.image_name:
+                try:
+                    raw = await read_image(pred.image_name)
+                    if raw is not None:
+                        image_data = base64.b64encode(raw).decode('utf-8')
+                except Exception as e:
+                    logger.warning("Erreur lecture image %s : %s", pred.image_name, e)
+
         results.append({
             "id": pred.id,
             "image_name": pred.image_name,
+            "image_url": f"/prediction/{pred.id}/image",
+            "thumbnail_url": f"/prediction/{pred.id}/thumbnail?size={min(THUMBNAIL_SIZES)}",
             "image_data": image_data,  # Ajout des données de l'image en base64
             "predicted_class": pred.predicted_class,
             "confidence": pred.confidence,
             "date": pred.date,
-            "notes": pred.notes,
+            "notes_count": notes_counts.get(pred.id, 0),
             "top_predictions": json.loads(pred.top_predictions) if pred.top_predictions else [],
             "comparison": json.loads(pred.comparison) if pred.comparison else None,
             "patient_nom": pred.patient_nom,
@@ -338,97 +599,66 @@ def get_history_full(
     return results
 
 @app.put("/prediction/{prediction_id}/note")
-def update_prediction_note(
+async def update_prediction_note(
     prediction_id: int,
     note_update: dict,  # <-- Change BaseModel to dict for direct JSON parsing
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Token manquant")
-    token = authorization.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        role = payload.get("role")
-    except Exception as e:
-        print("Erreur décodage JWT:", str(e))
-        raise HTTPException(status_code=401, detail="Token invalide")
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
+    prediction = await db.get(Prediction, prediction_id)
     if not prediction:
         raise HTTPException(status_code=404, detail="Prédiction non trouvée")
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
-    if prediction.user_id != user.id:
+    if prediction.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Accès interdit")
 
-    # Vérifie le rôle ici si nécessaire
-    if role != "admin":
-        # Si ce n'est pas un admin, on peut imaginer d'autres vérifications
-        pass
-
-    # Traitement de la note
+    # Traitement de la note : simple insertion, les notes existantes ne sont ni relues ni réécrites
     note_text = note_update.get("note") if note_update else None
     if not note_text or not note_text.strip():
         raise HTTPException(status_code=400, detail="Le commentaire ne peut pas être vide.")
-    notes = []
-    try:
-        if getattr(prediction, "notes", None):
-            notes = json.loads(prediction.notes)
-        else:
-            notes = []
-    except Exception:
-        notes = []
-    if not isinstance(notes, list):
-        notes = []
-    notes.insert(0, {
-        "note": note_text,
-        "date": datetime.utcnow().isoformat()
-    })
-    prediction.notes = json.dumps(notes, ensure_ascii=False)
-    db.commit()
-    db.refresh(prediction)
-    return {"msg": "Note enregistrée", "notes": notes}
+    note = PredictionNote(prediction_id=prediction_id, note=note_text, date=datetime.utcnow())
+    db.add(note)
+    await db.commit()
+    return {"msg": "Note enregistrée", "note": note_to_dict(note)}
 
 
 @app.get("/prediction/{prediction_id}/notes")
-def get_prediction_notes(
+async def get_prediction_notes(
     prediction_id: int,
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(NOTES_DEFAULT_LIMIT, ge=1, le=NOTES_MAX_LIMIT),
+    cursor: str | None = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Token manquant")
-    token = authorization.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-    except Exception:
-        raise HTTPException(status_code=401, detail="Token invalide")
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
+    """Notes paginées (plus récentes d'abord) ; la page suivante s'obtient via l'en-tête X-Next-Cursor,
+    X-Total-Count (première page seulement) donne le nombre total de notes."""
+    prediction = await db.get(Prediction, prediction_id)
     if not prediction:
-        # Correction : retourne une liste vide au lieu d'une erreur 404
+        # Correction : retourne une liste vide au lieu d'une erreur 404
         return {"notes": []}
-    user = db.query(User).filter(User.email == email).first()
-    if not user or prediction.user_id != user.id:
+    if prediction.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Non autorisé")
-    import json
-    notes = []
-    try:
-        notes = json.loads(prediction.notes) if getattr(prediction, "notes", None) else []
-    except Exception:
-        notes = []
-    return {"notes": notes}
-
-class Patient(Base):
-    __tablename__ = "patients"
-    id = Column(Integer, primary_key=True, index=True)
-    nom = Column(String, nullable=False)
-    prenom = Column(String, nullable=False)
-    telephone = Column(String, nullable=True)
-    sexe = Column(String, nullable=True)
-    age = Column(String, nullable=True)
+    query = select(PredictionNote).where(PredictionNote.prediction_id == prediction_id)
+    if cursor is None:
+        total = (await db.execute(
+            select(func.count()).select_from(PredictionNote).where(PredictionNote.prediction_id == prediction_id)
+        )).scalar_one()
+        response.headers["X-Total-Count"] = str(total)
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.where(or_(
+            PredictionNote.date < cursor_date,
+            and_(PredictionNote.date == cursor_date, PredictionNote.id < cursor_id),
+        ))
+    query = query.order_by(PredictionNote.date.desc(), PredictionNote.id.desc()).limit(limit + 1)
+    page = (await db.execute(query)).scalars().all()
+    if len(page) > limit:
+        page = page[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(page[-1].date, page[-1].id)
+    return {"notes": [note_to_dict(note) for note in page]}
+
+def note_to_dict(note):
+    return {"id": note.id, "note": note.note, "date": note.date.isoformat()}
 
 class PatientForm(BaseModel):
     nom: str
@@ -438,28 +668,66 @@ class PatientForm(BaseModel):
     age: str | None = None
 
 @app.post("/patients/create_or_get")
-def create_or_get_patient(form: PatientForm, db: Session = Depends(get_db)):
-    # Recherche un patient existant par téléphone si fourni, sinon par nom+prenom+age
+async def create_or_get_patient(form: PatientForm, db: AsyncSession = Depends(get_async_db)):
+    """Recherche un patient par téléphone si fourni, sinon par nom + prénom + âge ; le crée s'il n'existe pas.
+
+    La création est un INSERT ... ON CONFLICT DO NOTHING sur les index uniques de patients : deux
+    créations concurrentes du même patient renvoient la même ligne.
+    """
+    try:
+        # Même nettoyage que l'import CSV : espaces retirés, champs vides -> NULL
+        values = clean_patient(form.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    by_phone = select(Patient).where(Patient.telephone == values["telephone"]).limit(1)
+    by_identity = select(Patient).where(
+        Patient.nom == values["nom"],
+        Patient.prenom == values["prenom"],
+        Patient.age == values["age"]
+    ).limit(1)
     patient = None
-    if form.telephone:
-        patient = db.query(Patient).filter(Patient.telephone == form.telephone).first()
+    if values["telephone"]:
+        patient = (await db.execute(by_phone)).scalars().first()
     if not patient:
-        patient = db.query(Patient).filter(
-            Patient.nom == form.nom,
-            Patient.prenom == form.prenom,
-            Patient.age == form.age
-        ).first()
+        patient = (await db.execute(by_identity)).scalars().first()
     if not patient:
-        patient = Patient(
-            nom=form.nom,
-            prenom=form.prenom,
-            telephone=form.telephone,
-            sexe=form.sexe,
-            age=form.age
-        )
-        db.add(patient)
-        db.commit()
-        db.refresh(patient)
+        await db.execute(insert_ignore(Patient, db.bind.dialect.name).values(**values))
+        await db.commit()
+        # Ligne créée ici ou, en cas de conflit, par la requête concurrente
+        patient = (await db.execute(by_phone if values["telephone"] else by_identity)).scalars().first()
+        if patient is None:
+            # Conflit sur l'autre index unique (ex. téléphone déjà attribué à un autre patient)
+            raise HTTPException(status_code=409, detail="Patient en conflit avec un patient existant")
+    return patient_to_dict(patient)
+
+@app.get("/patients/search")
+async def search_patients(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=PATIENT_SEARCH_MAX_LIMIT),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Patients dont le nom, le prénom ou le téléphone commence par q (insensible à la casse)."""
+    rows = (await db.execute(
+        select(Patient).where(prefix_filter(q.strip(), db.bind.dialect.name))
+        .order_by(Patient.nom, Patient.prenom).limit(limit)
+    )).scalars().all()
+    return [patient_to_dict(patient) for patient in rows]
+
+@app.post("/patients/import")
+async def import_patients(
+    file: UploadFile = File(...),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """Import CSV en masse (colonnes nom, prenom, telephone, sexe, age) par lots transactionnels."""
+    if current_user.role not in ("medecin", "admin"):
+        raise HTTPException(status_code=403, detail="Accès interdit")
+    try:
+        return await run_in(io_executor, import_patients_csv, file.file, engine)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def patient_to_dict(patient):
     return {
         "id": patient.id,
         "nom": patient.nom,
@@ -469,106 +737,205 @@ def create_or_get_patient(form: PatientForm, db: Session = Depends(get_db)):
         "age": patient.age
     }
 
-def generate_unique_filename(original_filename: str) -> str:
-    """Génère un nom de fichier unique en ajoutant un UUID et la date."""
-    ext = os.path.splitext(original_filename)[1]
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_id = str(uuid.uuid4())[:8]
-    return f"{timestamp}_{unique_id}{ext}"
+def encode_cursor(date: datetime, prediction_id) -> str:
+    """Curseur opaque de pagination sur (date, id)."""
+    raw = json.dumps([date.isoformat(), prediction_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
 
-def ensure_uploads_dir():
-    """S'assure que le dossier uploads existe."""
-    uploads_dir = Path("uploads")
-    if not uploads_dir.exists():
-        uploads_dir.mkdir(parents=True, exist_ok=True)
-    return uploads_dir
+def decode_cursor(cursor: str):
+    try:
+        date, prediction_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(date), int(prediction_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
 
 @app.delete("/delete_prediction/{prediction_id}")
-def delete_prediction(
+async def delete_prediction(
     prediction_id: int,
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Token manquant")
-    token = authorization.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-    except Exception:
-        raise HTTPException(status_code=401, detail="Token invalide")
-
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
+    prediction = await db.get(Prediction, prediction_id)
     if not prediction:
         raise HTTPException(status_code=404, detail="Prédiction non trouvée")
 
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
-
-    if prediction.user_id != user.id:
+    if prediction.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Accès interdit")
 
-    # Supprimer l'image associée si elle existe
-    if prediction.image_name:
-        image_path = Path(f"uploads/{prediction.image_name}")
-        if image_path.exists():
-            try:
-                image_path.unlink()
-            except Exception as e:
-                print(f"Erreur lors de la suppression de l'image {prediction.image_name}: {str(e)}")
+    # Supprimer la prédiction et ses notes de la base de données
+    image_name = prediction.image_name
+    await db.execute(delete(PredictionNote).where(PredictionNote.prediction_id == prediction.id))
+    await db.delete(prediction)
+    await db.commit()
 
-    # Supprimer la prédiction de la base de données
-    db.delete(prediction)
-    db.commit()
+    # Image libérée en arrière-plan, supprimée seulement si aucune autre prédiction ne la référence
+    image_reclaimer.enqueue(image_name)
 
     return {"message": "Prédiction supprimée avec succès"}
 
 @app.get("/prediction/{prediction_id}/image")
 async def get_prediction_image(
     prediction_id: int,
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Récupère l'image associée à une prédiction."""
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Token manquant")
-    
-    token = authorization.split(" ")[1]
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-    except Exception:
-        raise HTTPException(status_code=401, detail="Token invalide")
-
-    prediction = db.query(Prediction).filter(Prediction.id == prediction_id).first()
+    prediction = await db.get(Prediction, prediction_id)
     if not prediction:
         raise HTTPException(status_code=404, detail="Prédiction non trouvée")
 
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
-
-    if prediction.user_id != user.id:
+    if prediction.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Accès interdit")
 
     if not prediction.image_name:
         raise HTTPException(status_code=404, detail="Aucune image associée à cette prédiction")
 
-    image_path = Path("uploads") / prediction.image_name
-    if not image_path.exists():
+    path = image_path(prediction.image_name)
+    if not await run_in(io_executor, path.exists):
         raise HTTPException(status_code=404, detail="Image non trouvée sur le serveur")
 
     try:
         return FileResponse(
-            path=image_path,
+            path=path,
             media_type="image/jpeg",
             filename=prediction.image_name
         )
-    except Exception as e:
-        print(f"Erreur lors de la récupération de l'image {prediction.image_name}: {str(e)}")
+    except Exception:
+        logger.exception("Erreur lors de la récupération de l'image %s", prediction.image_name)
         raise HTTPException(status_code=500, detail="Erreur lors de la récupération de l'image")
 
-def clean_disease_name(raw):
-    return re.sub(r'^\d+\.\s*', '', re.sub(r'\s*-?\s*\d+[a-zA-Z\. ]*$', '', raw)).strip()
 
+@app.get("/prediction/{prediction_id}/thumbnail")
+async def get_prediction_thumbnail(
+    prediction_id: int,
+    size: int = Query(min(THUMBNAIL_SIZES)),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Récupère la miniature d'une prédiction (générée à la première demande si besoin)."""
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"Taille non supportée, valeurs possibles : {list(THUMBNAIL_SIZES)}")
+
+    prediction = await db.get(Prediction, prediction_id)
+    if not prediction:
+        raise HTTPException(status_code=404, detail="Prédiction non trouvée")
+
+    if prediction.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Accès interdit")
+
+    if not prediction.image_name:
+        raise HTTPException(status_code=404, detail="Aucune image associée à cette prédiction")
+
+    try:
+        thumb_path = await run_in(io_executor, ensure_thumbnail, prediction.image_name, size)
+    except Exception:
+        logger.exception("Erreur génération miniature %s", prediction.image_name)
+        raise HTTPException(status_code=500, detail="Erreur lors de la génération de la miniature")
+    if thumb_path is None:
+        raise HTTPException(status_code=404, detail="Image non trouvée sur le serveur")
+
+    return FileResponse(
+        path=thumb_path,
+        media_type=thumbnail_media_type(),
+        headers={"Cache-Control": "private, max-age=86400"},
+    )
+
+
+def report_entry(pred):
+    return {
+        "id": pred.id,
+        "image_name": pred.image_name,
+        "predicted_class": pred.predicted_class,
+        "confidence": pred.confidence,
+        "date": pred.date,
+        "top_predictions": json.loads(pred.top_predictions) if pred.top_predictions else [],
+        "comparison": json.loads(pred.comparison) if pred.comparison else None,
+    }
+
+async def report_identity(db, current_user, prediction):
+    """Patient du rapport : celui saisi par le médecin sur la prédiction, sinon le profil de l'utilisateur."""
+    if prediction.patient_nom or prediction.patient_prenom:
+        return {"nom": prediction.patient_nom, "prenom": prediction.patient_prenom,
+                "telephone": prediction.telephone, "sexe": prediction.sexe, "age": prediction.age}
+    user = await db.get(User, current_user.id)
+    return {"nom": user.nom, "prenom": user.prenom, "email": user.email,
+            "telephone": user.telephone, "sexe": user.sexe, "age": user.age}
+
+async def send_report(db, kind, title, filename, identity, entries, if_none_match):
+    """Rapport PDF servi depuis le cache disque (généré au premier appel) et envoyé par blocs."""
+    ids = [entry["id"] for entry in entries]
+    # Révision des notes (table en ajout seul) : une note ajoutée ou supprimée change la clé du cache
+    revision = (await db.execute(
+        select(func.count(), func.max(PredictionNote.id)).where(PredictionNote.prediction_id.in_(ids))
+    )).one()
+    key = report_key(kind, identity, entries, revision)
+    etag = f'"{key}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    async def load():
+        # Session propre : la génération peut survivre à la requête qui l'a lancée
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(PredictionNote).where(PredictionNote.prediction_id.in_(ids))
+                .order_by(PredictionNote.date.desc(), PredictionNote.id.desc())
+            )).scalars().all()
+        notes = {}
+        for note in rows:
+            notes.setdefault(note.prediction_id, []).append({"note": note.note, "date": note.date})
+        for entry in entries:
+            entry["notes_count"] = len(notes.get(entry["id"], []))
+        return {"title": title, "identity": identity, "entries": entries, "notes": notes, "advice": disease_advice}
+
+    try:
+        path = await get_report(key, kind, load)
+    except Exception:
+        logger.exception("Erreur génération du rapport %s", kind)
+        raise HTTPException(status_code=500, detail="Erreur lors de la génération du rapport")
+    return FileResponse(path, media_type="application/pdf", filename=filename,
+                        headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+@app.get("/prediction/{prediction_id}/report")
+async def get_prediction_report(
+    prediction_id: int,
+    if_none_match: str | None = Header(None),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Rapport PDF d'une prédiction (image, résultat, top 3, comparaison, conseils, notes)."""
+    prediction = await db.get(Prediction, prediction_id)
+    if not prediction:
+        raise HTTPException(status_code=404, detail="Prédiction non trouvée")
+    if prediction.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Accès interdit")
+    identity = await report_identity(db, current_user, prediction)
+    filename = f"rapport_{identity.get('nom') or 'patient'}_{prediction.id}.pdf"
+    return await send_report(db, "prediction", "Rapport d'analyse DermaScan AI", filename, identity,
+                             [report_entry(prediction)], if_none_match)
+
+@app.get("/reports/history")
+async def get_history_report(
+    patient_nom: str | None = None,
+    patient_prenom: str | None = None,
+    telephone: str | None = None,
+    if_none_match: str | None = Header(None),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Rapport PDF de l'historique : analyses de l'utilisateur, ou d'un de ses patients (nom + prénom,
+    téléphone facultatif), les REPORT_MAX_PREDICTIONS plus récentes."""
+    query = select(Prediction).where(Prediction.user_id == current_user.id)
+    if patient_nom or patient_prenom:
+        for column, value in ((Prediction.patient_nom, patient_nom), (Prediction.patient_prenom, patient_prenom)):
+            # Champ vide : enregistré NULL ou chaîne vide selon l'origine de la prédiction
+            query = query.where(column == value if value else or_(column.is_(None), column == ""))
+        if telephone:
+            query = query.where(Prediction.telephone == telephone)
+    query = query.order_by(Prediction.date.desc(), Prediction.id.desc()).limit(REPORT_MAX_PREDICTIONS)
+    predictions = (await db.execute(query)).scalars().all()
+    if not predictions:
+        raise HTTPException(status_code=404, detail="Aucune analyse pour ce rapport")
+    identity = await report_identity(db, current_user, predictions[0])
+    filename = f"rapport_historique_{identity.get('nom') or 'patient'}.pdf"
+    return await send_report(db, "history", "Historique des analyses DermaScan AI", filename, identity,
+                             [report_entry(pred) for pred in predictions], if_none_match)
@@ -0,0 +1,239 @@
+"""Métriques en mémoire (compteurs, jauges, histogrammes) exposées au format texte Prometheus sur /metrics.
+
+Implémentation minimale sans dépendance : un verrou par métrique, car les observations viennent aussi
+des threads des exécuteurs. DERMASCAN_METRICS_ENABLED=0 rend toutes les observations inopérantes.
+"""
+import threading
+import time
+
+from settings import METRICS_ENABLED
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_labels_text(self.labelnames, key)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        # fn : valeur lue au moment du rendu (jauge sans étiquettes)
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        if self.fn is not None:
+            with self._lock:
+                self._values[()] = self.fn()
+        return super().render()
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [compteurs par bucket..., somme, nombre]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def time(self, **labels):
+        """Context manager qui observe la durée du bloc (en secondes)."""
+        return _Timer(self, labels)
+
+    def _samples(self, key, state):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, state):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, [('le', _number(float(bound)))])} {cumulative}")
+        lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, [('le', '+Inf')])} {state[-1]}")
+        lines.append(f"{self.name}_sum{_labels_text(self.labelnames, key)} {_number(state[-2])}")
+        lines.append(f"{self.name}_count{_labels_text(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def render():
+    """Toutes les métriques au format texte Prometheus (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Pipeline de prédiction
+PREDICT_STAGE_SECONDS = Histogram(
+    "dermascan_predict_stage_seconds", "Durée de chaque étape du pipeline de prédiction", ["stage"])
+MODEL_BATCH_SIZE = Histogram(
+    "dermascan_model_batch_size", "Nombre d'images par passage du modèle", buckets=BATCH_SIZE_BUCKETS)
+MODEL_FORWARD_SECONDS = Histogram(
+    "dermascan_model_forward_seconds", "Durée d'un passage du modèle (lot complet)")
+PREDICTION_CACHE_REQUESTS = Counter(
+    "dermascan_prediction_cache_requests_total", "Consultations du cache des prédictions", ["result"])
+
+# HTTP et base de données
+HTTP_IN_FLIGHT = Gauge("dermascan_http_requests_in_flight", "Requêtes HTTP en cours")
+HTTP_REQUESTS = Counter("dermascan_http_requests_total", "Requêtes HTTP terminées", ["method", "route", "status"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "dermascan_http_request_duration_seconds", "Durée des requêtes HTTP", ["method", "route"])
+DB_QUERY_SECONDS = Histogram(
+    "dermascan_db_query_seconds", "Durée des requêtes SQL", ["operation"])
+
+# File de jobs
+JOBS = Gauge("dermascan_jobs", "Jobs de prédiction par statut", ["status"])
+JOB_WAIT_SECONDS = Histogram("dermascan_job_wait_seconds", "Attente d'un job dans la file avant traitement")
+JOB_PROCESSING_SECONDS = Histogram("dermascan_job_processing_seconds", "Durée de traitement d'un job")
+
+# Récupération des images orphelines
+GC_RECLAIMED_BYTES = Counter(
+    "dermascan_gc_reclaimed_bytes_total", "Octets libérés sur le disque", ["source"])
+GC_REMOVED = Counter("dermascan_gc_removed_total", "Éléments supprimés par la récupération", ["kind"])
+GC_PASS_SECONDS = Histogram("dermascan_gc_pass_seconds", "Durée d'une passe de réconciliation",
+                            buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+
+
+# Rapports PDF
+REPORT_CACHE_REQUESTS = Counter(
+    "dermascan_report_cache_requests_total", "Consultations du cache des rapports PDF", ["result"])
+REPORT_RENDER_SECONDS = Histogram(
+    "dermascan_report_render_seconds", "Durée de génération d'un rapport PDF", ["kind"])
+
+class MetricsMiddleware:
+    """Middleware ASGI : requêtes en cours, nombre et durée des requêtes par route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Gabarit de la route ("/prediction/{prediction_id}/image") pour borner le nombre de séries
+            route = getattr(scope.get("route"), "path", "non_routee")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=route)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status[0])
+
+
+def instrument_engine(engine):
+    """Mesure la durée de chaque requête SQL d'un moteur SQLAlchemy synchrone (ou .sync_engine d'un moteur async)."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context._dermascan_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_dermascan_start", None)
+        if start is not None:
+            operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, operation=operation)
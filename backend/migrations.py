@@ -0,0 +1,592 @@
+"""Migrations de schéma versionnées (remplacent migrate.py et migrate_add_patient_columns.py).
+
+Chaque migration est appliquée une seule fois et enregistrée dans la table schema_migrations.
+Les recopies de données se font par lots, chacun dans sa propre transaction courte, pour ne pas
+bloquer la table pendant toute la durée de la migration.
+
+Un seul processus à la fois crée le schéma et migre (prepare_database) : les autres workers lancés en même
+temps attendent le verrou puis trouvent une base à jour. Avec DERMASCAN_AUTO_MIGRATE=0, les migrations ne se
+font plus au démarrage mais par la commande ci-dessous, à lancer une fois par déploiement.
+
+Usage manuel : python migrations.py [--patient-conflicts]
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import DateTime, inspect, text
+from sqlalchemy.exc import OperationalError
+
+from settings import MIGRATION_BATCH_SIZE, MIGRATION_LOCK_TIMEOUT_SECONDS, MIGRATION_PAUSE_MS
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn, table):
+    return {c["name"]: c for c in inspect(conn).get_columns(table)}
+
+
+def _has_table(conn, table):
+    return inspect(conn).has_table(table)
+
+
+def _datetime_type(engine):
+    # DATETIME sous SQLite, TIMESTAMP sous PostgreSQL
+    return DateTime().compile(dialect=engine.dialect)
+
+
+def add_prediction_patient_columns(engine, batch_size):
+    """Colonnes patient ajoutées au fil du projet (anciens scripts migrate*.py)."""
+    with engine.begin() as conn:
+        if not _has_table(conn, "predictions"):
+            return
+        existing = _columns(conn, "predictions")
+        for name in ("patient_nom", "patient_prenom", "telephone", "sexe", "age"):
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE predictions ADD COLUMN {name} VARCHAR"))
+
+
+# Schéma typé de predictions : date en DATETIME, confiance en FLOAT.
+# predicted_class et date restent nullables ici : d'anciennes lignes peuvent être incomplètes.
+TYPED_PREDICTIONS_DDL = """
+CREATE TABLE predictions_new (
+    id INTEGER NOT NULL PRIMARY KEY,
+    user_id INTEGER REFERENCES users (id),
+    image_name VARCHAR,
+    predicted_class VARCHAR,
+    confidence FLOAT,
+    date DATETIME,
+    notes TEXT,
+    top_predictions TEXT,
+    comparison TEXT,
+    patient_nom VARCHAR,
+    patient_prenom VARCHAR,
+    telephone VARCHAR,
+    sexe VARCHAR,
+    age VARCHAR
+)
+"""
+TYPED_PREDICTIONS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_predictions_id ON predictions (id)",
+    "CREATE INDEX IF NOT EXISTS ix_predictions_user_date ON predictions (user_id, date)",
+    "CREATE INDEX IF NOT EXISTS ix_predictions_patient ON predictions (patient_nom, patient_prenom)",
+    "CREATE INDEX IF NOT EXISTS ix_predictions_telephone ON predictions (telephone)",
+]
+_COPY_COLUMNS = ["id", "user_id", "image_name", "predicted_class", "confidence", "date", "notes",
+                 "top_predictions", "comparison", "patient_nom", "patient_prenom", "telephone", "sexe", "age"]
+
+
+def _typed_values(prefix=""):
+    # Les dates ISO ("2025-05-28T08:15:52") passent au format DATETIME de SQLAlchemy ("2025-05-28 08:15:52")
+    exprs = []
+    for col in _COPY_COLUMNS:
+        ref = f"{prefix}{col}"
+        if col == "date":
+            exprs.append(f"REPLACE({ref}, 'T', ' ')")
+        elif col == "confidence":
+            exprs.append(f"CAST({ref} AS REAL)")
+        else:
+            exprs.append(ref)
+    return ", ".join(exprs)
+
+
+def typed_predictions(engine, batch_size):
+    """Reconstruit predictions avec des colonnes typées et des index, sans verrou long.
+
+    Des triggers répercutent sur la nouvelle table les écritures faites pendant la recopie par lots ;
+    la bascule finale (renommage + index) se fait dans une seule transaction courte.
+    """
+    with engine.begin() as conn:
+        if not _has_table(conn, "predictions"):
+            return
+        date_type = str(_columns(conn, "predictions")["date"]["type"]).upper()
+        if "DATE" in date_type or "TIMESTAMP" in date_type:
+            # Base créée directement avec le schéma typé : seuls les index peuvent manquer
+            for statement in TYPED_PREDICTIONS_INDEXES:
+                conn.execute(text(statement))
+            return
+        if engine.dialect.name != "sqlite":
+            raise RuntimeError("Migration typed_predictions : seul SQLite est supporté pour un schéma historique")
+
+        # Reprise après interruption : on repart de zéro
+        for trigger in ("predictions_mig_ins", "predictions_mig_upd", "predictions_mig_del"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        conn.execute(text("DROP TABLE IF EXISTS predictions_new"))
+
+        conn.execute(text(TYPED_PREDICTIONS_DDL))
+        columns = ", ".join(_COPY_COLUMNS)
+        mirror = f"INSERT OR REPLACE INTO predictions_new ({columns}) VALUES ({_typed_values('NEW.')});"
+        conn.execute(text(f"CREATE TRIGGER predictions_mig_ins AFTER INSERT ON predictions BEGIN {mirror} END"))
+        conn.execute(text(f"CREATE TRIGGER predictions_mig_upd AFTER UPDATE ON predictions BEGIN {mirror} END"))
+        conn.execute(text(
+            "CREATE TRIGGER predictions_mig_del AFTER DELETE ON predictions "
+            "BEGIN DELETE FROM predictions_new WHERE id = OLD.id; END"
+        ))
+
+    last_id = -1
+    copied = 0
+    while True:
+        with engine.begin() as conn:
+            ids = [row[0] for row in conn.execute(
+                text("SELECT id FROM predictions WHERE id > :last ORDER BY id LIMIT :n"),
+                {"last": last_id, "n": batch_size},
+            )]
+            if not ids:
+                break
+            # Les lignes déjà recopiées par les triggers sont à jour : on les saute
+            conn.execute(text(
+                f"INSERT INTO predictions_new ({columns}) "
+                f"SELECT {_typed_values()} FROM predictions WHERE id BETWEEN :first AND :last "
+                f"AND id NOT IN (SELECT id FROM predictions_new WHERE id BETWEEN :first AND :last)"
+            ), {"first": ids[0], "last": ids[-1]})
+        last_id = ids[-1]
+        copied += len(ids)
+        if MIGRATION_PAUSE_MS:
+            # Laisse passer les écritures de l'application entre deux lots
+            time.sleep(MIGRATION_PAUSE_MS / 1000.0)
+
+    with engine.begin() as conn:
+        for trigger in ("predictions_mig_ins", "predictions_mig_upd", "predictions_mig_del"):
+            conn.execute(text(f"DROP TRIGGER {trigger}"))
+        conn.execute(text("DROP TABLE predictions"))
+        conn.execute(text("ALTER TABLE predictions_new RENAME TO predictions"))
+        for statement in TYPED_PREDICTIONS_INDEXES:
+            conn.execute(text(statement))
+    logger.info("typed_predictions : %s lignes recopiées", copied)
+
+
+# Table de l'ancien schéma SQLite ; ailleurs, create_all l'a déjà créée avec le modèle PredictionNote
+PREDICTION_NOTES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS prediction_notes (
+        id INTEGER NOT NULL PRIMARY KEY,
+        prediction_id INTEGER NOT NULL REFERENCES predictions (id),
+        note TEXT NOT NULL,
+        date DATETIME NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_prediction_notes_prediction_date ON prediction_notes (prediction_id, date)",
+]
+
+
+def _parse_notes(blob, fallback_date):
+    """Notes d'un ancien blob JSON (liste, plus récente d'abord), renvoyées dans l'ordre chronologique."""
+    try:
+        entries = json.loads(blob)
+    except ValueError:
+        # Texte libre d'avant le format JSON : une seule note
+        entries = [{"note": blob}]
+    if not isinstance(entries, list):
+        entries = [{"note": str(entries)}]
+    notes = []
+    for entry in reversed(entries):
+        if not isinstance(entry, dict):
+            entry = {"note": str(entry)}
+        text_value = str(entry.get("note") or "")
+        if not text_value.strip():
+            continue
+        try:
+            date = datetime.fromisoformat(str(entry.get("date")))
+        except ValueError:
+            date = fallback_date
+        notes.append((text_value, date))
+    return notes
+
+
+def split_prediction_notes(engine, batch_size):
+    """Éclate les blobs JSON de predictions.notes en lignes de prediction_notes, par lots.
+
+    Chaque lot insère les notes et vide les blobs correspondants dans la même transaction :
+    une migration interrompue reprend sans doublon.
+    """
+    with engine.begin() as conn:
+        if not _has_table(conn, "predictions") or "notes" not in _columns(conn, "predictions"):
+            return
+        if engine.dialect.name == "sqlite" or not _has_table(conn, "prediction_notes"):
+            for statement in PREDICTION_NOTES_DDL:
+                conn.execute(text(statement.replace("DATETIME", _datetime_type(engine))))
+
+    last_id = -1
+    moved = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text("SELECT id, notes, date FROM predictions WHERE id > :last AND notes IS NOT NULL "
+                     "ORDER BY id LIMIT :n"),
+                {"last": last_id, "n": batch_size},
+            ).all()
+            if not rows:
+                break
+            for prediction_id, blob, prediction_date in rows:
+                try:
+                    fallback = datetime.fromisoformat(str(prediction_date))
+                except ValueError:
+                    fallback = datetime.utcnow()
+                notes = _parse_notes(blob, fallback)
+                if notes:
+                    conn.execute(
+                        text("INSERT INTO prediction_notes (prediction_id, note, date) VALUES (:p, :note, :date)"),
+                        [{"p": prediction_id, "note": note, "date": date.strftime("%Y-%m-%d %H:%M:%S.%f")}
+                         for note, date in notes],
+                    )
+                    moved += len(notes)
+            conn.execute(text("UPDATE predictions SET notes = NULL WHERE id BETWEEN :first AND :last"),
+                         {"first": rows[0][0], "last": rows[-1][0]})
+        last_id = rows[-1][0]
+        if MIGRATION_PAUSE_MS:
+            time.sleep(MIGRATION_PAUSE_MS / 1000.0)
+    logger.info("split_prediction_notes : %s notes déplacées", moved)
+
+
+class MigrationBlocked(RuntimeError):
+    """Migration impossible sans correction manuelle des données ; non enregistrée, elle est rejouée au
+    prochain lancement des migrations."""
+
+
+def search_index(dialect_name, name, table, column):
+    """DDL de l'index de recherche insensible à la casse (même forme que database.case_insensitive_indexes)."""
+    if dialect_name == "sqlite":
+        return f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column} COLLATE NOCASE)"
+    return f"CREATE INDEX IF NOT EXISTS {name}_lower ON {table} (lower({column}))"
+
+
+PATIENT_UNIQUE_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_patients_telephone ON patients (telephone)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_patients_identity ON patients (nom, prenom, coalesce(age, '')) "
+    "WHERE telephone IS NULL",
+]
+
+# Patients qui empêchent les index uniques : même téléphone, ou mêmes nom + prénom + âge sans téléphone
+_PATIENT_CONFLICTS = {
+    "telephone": text(
+        "SELECT id, telephone FROM patients WHERE telephone IN "
+        "(SELECT telephone FROM patients WHERE telephone IS NOT NULL GROUP BY telephone HAVING COUNT(*) > 1) "
+        "ORDER BY telephone, id"
+    ),
+    "identité": text(
+        "SELECT p.id, p.nom || '|' || p.prenom || '|' || coalesce(p.age, '') FROM patients p "
+        "WHERE p.telephone IS NULL AND EXISTS (SELECT 1 FROM patients q WHERE q.telephone IS NULL "
+        "AND q.nom = p.nom AND q.prenom = p.prenom AND coalesce(q.age, '') = coalesce(p.age, '') AND q.id <> p.id) "
+        "ORDER BY p.nom, p.prenom, coalesce(p.age, ''), p.id"
+    ),
+}
+
+
+def patient_conflicts(conn):
+    """Groupes d'ids de patients en conflit, par règle d'unicité (aucune donnée patient n'est renvoyée)."""
+    conflicts = {}
+    for rule, query in _PATIENT_CONFLICTS.items():
+        groups = {}
+        for patient_id, key in conn.execute(query):
+            groups.setdefault(key, []).append(patient_id)
+        if groups:
+            conflicts[rule] = list(groups.values())
+    return conflicts
+
+
+def patient_indexes(engine, batch_size):
+    """Index du registre des patients. Une table créée hors de l'application peut contenir des patients
+    partageant un téléphone (membres d'une même famille) ou des homonymes : rien n'est supprimé, les
+    conflits sont signalés et les index uniques ne sont créés qu'une fois les conflits corrigés à la main
+    (liste : python migrations.py --patient-conflicts)."""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if not _has_table(conn, "patients"):
+            return
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_patients_nom_prenom_age ON patients (nom, prenom, age)"))
+        conn.execute(text(search_index(dialect, "ix_patients_nom_search", "patients", "nom")))
+        conn.execute(text(search_index(dialect, "ix_patients_prenom_search", "patients", "prenom")))
+    with engine.begin() as conn:
+        conflicts = patient_conflicts(conn)
+        if conflicts:
+            summary = ", ".join(f"{len(groups)} groupes par {rule}" for rule, groups in conflicts.items())
+            raise MigrationBlocked(
+                f"patient_indexes : patients en conflit ({summary}) ; index uniques non créés. Fusionnez ou "
+                "corrigez ces patients (python migrations.py --patient-conflicts) puis relancez les migrations."
+            )
+        for statement in PATIENT_UNIQUE_INDEXES:
+            conn.execute(text(statement))
+
+
+# Table FTS5 à contenu externe (les textes restent dans users) tenue à jour par triggers
+USERS_FTS_STATEMENTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+    "email, nom, prenom, content='users', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO users_fts (rowid, email, nom, prenom) VALUES (new.id, new.email, new.nom, new.prenom); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+    "INSERT INTO users_fts (users_fts, rowid, email, nom, prenom) "
+    "VALUES ('delete', old.id, old.email, old.nom, old.prenom); END",
+    "CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF email, nom, prenom ON users BEGIN "
+    "INSERT INTO users_fts (users_fts, rowid, email, nom, prenom) "
+    "VALUES ('delete', old.id, old.email, old.nom, old.prenom); "
+    "INSERT INTO users_fts (rowid, email, nom, prenom) VALUES (new.id, new.email, new.nom, new.prenom); END",
+    "INSERT INTO users_fts (users_fts) VALUES ('rebuild')",
+]
+
+def users_search(engine, batch_size):
+    """Index de la liste /users (filtre par rôle, préfixes) et, si SQLite dispose de FTS5, table users_fts."""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if not _has_table(conn, "users"):
+            return
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_role_id ON users (role, id)"))
+        conn.execute(text(search_index(dialect, "ix_users_nom_search", "users", "nom")))
+        conn.execute(text(search_index(dialect, "ix_users_prenom_search", "users", "prenom")))
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.begin() as conn:
+            for statement in USERS_FTS_STATEMENTS:
+                conn.execute(text(statement))
+    except OperationalError as e:
+        # SQLite compilé sans FTS5 : la recherche se rabat sur les index de préfixe
+        logger.warning("users_search : FTS5 indisponible (%s), recherche par préfixe seulement", e)
+
+
+def content_addressed_images(engine, batch_size):
+    """Range les images à plat de uploads/ dans le stockage par contenu (image_store.py).
+
+    Par lot : copie (lien physique si possible) sous la clé <sha256><ext>, mise à jour de image_name,
+    puis suppression des originaux une fois la transaction validée ; une reprise après interruption
+    retrouve donc toujours les fichiers d'origine. Les compteurs de références sont recalculés à la fin,
+    et les images que plus rien ne référence sont rangées avec un compteur à zéro.
+    """
+    import shutil
+
+    from image_store import (IMAGE_EXTENSIONS, UPLOADS_DIR, file_sha256, image_key, image_path, is_image_key,
+                             temp_path)
+
+    def store(src):
+        key = image_key(file_sha256(src), src.name)
+        dest = image_path(key)
+        if not dest.exists():
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            tmp = temp_path()
+            try:
+                os.link(src, tmp)
+            except OSError:
+                shutil.copyfile(src, tmp)
+            os.replace(tmp, dest)
+        return key
+
+    with engine.begin() as conn:
+        if not _has_table(conn, "predictions"):
+            return
+        has_jobs = _has_table(conn, "prediction_jobs")
+        names = {row[0] for row in conn.execute(text(
+            "SELECT DISTINCT image_name FROM predictions WHERE image_name IS NOT NULL"))}
+        if has_jobs:
+            names |= {row[0] for row in conn.execute(text("SELECT DISTINCT image_name FROM prediction_jobs"))}
+    names = sorted(n for n in names if not is_image_key(n) and (UPLOADS_DIR / n).is_file())
+
+    moved = 0
+    for start in range(0, len(names), batch_size):
+        batch = [{"old": name, "new": store(UPLOADS_DIR / name)} for name in names[start:start + batch_size]]
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE predictions SET image_name = :new WHERE image_name = :old"), batch)
+            if has_jobs:
+                conn.execute(text("UPDATE prediction_jobs SET image_name = :new WHERE image_name = :old"), batch)
+        for row in batch:
+            (UPLOADS_DIR / row["old"]).unlink(missing_ok=True)
+        moved += len(batch)
+        if MIGRATION_PAUSE_MS:
+            time.sleep(MIGRATION_PAUSE_MS / 1000.0)
+
+    # Références : une par prédiction, plus une par job pas encore terminé (la prédiction la reprendra)
+    counts = {}
+    with engine.begin() as conn:
+        queries = ["SELECT image_name, COUNT(*) FROM predictions WHERE image_name IS NOT NULL GROUP BY image_name"]
+        if has_jobs:
+            queries.append("SELECT image_name, COUNT(*) FROM prediction_jobs "
+                           "WHERE status IN ('queued', 'running') GROUP BY image_name")
+        for query in queries:
+            for name, count in conn.execute(text(query)):
+                if is_image_key(name):
+                    counts[name] = counts.get(name, 0) + count
+    # Images à plat que rien ne référence : rangées elles aussi, sans référence
+    orphans = 0
+    for path in sorted(UPLOADS_DIR.iterdir()) if UPLOADS_DIR.is_dir() else []:
+        if path.is_file() and not path.name.startswith(".") and path.suffix.lower() in IMAGE_EXTENSIONS:
+            counts.setdefault(store(path), 0)
+            path.unlink()
+            orphans += 1
+
+    now = datetime.utcnow()
+    rows = [{"name": name, "refcount": count, "size": image_path(name).stat().st_size, "now": now}
+            for name, count in counts.items() if image_path(name).exists()]
+    upsert = text(
+        "INSERT INTO stored_images (name, refcount, size, created_at) VALUES (:name, :refcount, :size, :now) "
+        "ON CONFLICT (name) DO UPDATE SET refcount = excluded.refcount"
+    )
+    for start in range(0, len(rows), batch_size):
+        with engine.begin() as conn:
+            conn.execute(upsert, rows[start:start + batch_size])
+
+    # Anciennes miniatures à plat : régénérées à la demande dans la nouvelle arborescence
+    thumbs = UPLOADS_DIR / "thumbs"
+    for path in thumbs.glob("*/*") if thumbs.is_dir() else []:
+        if path.is_file() and not is_image_key(path.stem):
+            path.unlink(missing_ok=True)
+    logger.info("content_addressed_images : %s images migrées, %s non référencées, %s objets",
+                moved, orphans, len(rows))
+
+
+def image_gc_indexes(engine, batch_size):
+    """Date de dernière référence des images et index de comptage des références (image_gc.py)."""
+    with engine.begin() as conn:
+        if _has_table(conn, "stored_images") and "last_acquired_at" not in _columns(conn, "stored_images"):
+            conn.execute(text(f"ALTER TABLE stored_images ADD COLUMN last_acquired_at {_datetime_type(engine)}"))
+        if _has_table(conn, "predictions"):
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_predictions_image_name ON predictions (image_name)"))
+        if _has_table(conn, "prediction_jobs"):
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_prediction_jobs_image_name ON prediction_jobs (image_name)"))
+
+
+def job_leases(engine, batch_size):
+    """Processus propriétaire et bail des jobs "running" (jobs.py)."""
+    with engine.begin() as conn:
+        if not _has_table(conn, "prediction_jobs"):
+            return
+        existing = _columns(conn, "prediction_jobs")
+        if "worker_id" not in existing:
+            conn.execute(text("ALTER TABLE prediction_jobs ADD COLUMN worker_id VARCHAR"))
+        if "heartbeat_at" not in existing:
+            conn.execute(text(f"ALTER TABLE prediction_jobs ADD COLUMN heartbeat_at {_datetime_type(engine)}"))
+
+
+def prediction_cache_index(engine, batch_size):
+    """Index d'élagage du cache persistant des prédictions (prediction_cache.py)."""
+    with engine.begin() as conn:
+        if _has_table(conn, "prediction_cache"):
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_prediction_cache_created_at ON prediction_cache (created_at)"))
+
+
+# Ordre d'application ; ne jamais renommer ni réordonner une migration déjà publiée
+MIGRATIONS = [
+    ("0001_prediction_patient_columns", add_prediction_patient_columns),
+    ("0002_typed_predictions", typed_predictions),
+    ("0003_split_prediction_notes", split_prediction_notes),
+    ("0004_patient_indexes", patient_indexes),
+    ("0005_users_search", users_search),
+    ("0006_content_addressed_images", content_addressed_images),
+    ("0007_image_gc_indexes", image_gc_indexes),
+    ("0008_job_leases", job_leases),
+    ("0009_prediction_cache_index", prediction_cache_index),
+]
+
+
+def run_migrations(engine, batch_size=MIGRATION_BATCH_SIZE):
+    """Applique les migrations manquantes, dans l'ordre."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (version VARCHAR PRIMARY KEY, applied_at VARCHAR NOT NULL)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+    for version, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info("Migration %s...", version)
+        migrate(engine, batch_size)
+        with engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, applied_at) VALUES (:v, :at)"),
+                {"v": version, "at": datetime.utcnow().isoformat()},
+            )
+
+
+# Verrou consultatif PostgreSQL (clé arbitraire propre à l'application)
+PG_MIGRATION_LOCK_KEY = 0x44534D47
+MIGRATION_LOCK_DDL = (
+    "CREATE TABLE IF NOT EXISTS schema_migration_lock "
+    "(id INTEGER NOT NULL PRIMARY KEY, owner VARCHAR NOT NULL, heartbeat_at FLOAT NOT NULL)"
+)
+
+
+@contextmanager
+def migration_lock(engine, timeout=MIGRATION_LOCK_TIMEOUT_SECONDS):
+    """Verrou exclusif entre processus (et machines) pour la création du schéma et les migrations.
+
+    PostgreSQL : pg_advisory_lock, libéré par le serveur si la connexion tombe. SQLite : une ligne dans
+    schema_migration_lock, rafraîchie par le détenteur et reprise si elle n'a pas bougé depuis timeout.
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": PG_MIGRATION_LOCK_KEY})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": PG_MIGRATION_LOCK_KEY})
+                conn.commit()
+        return
+
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    with engine.begin() as conn:
+        conn.execute(text(MIGRATION_LOCK_DDL))
+    waited = False
+    while True:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM schema_migration_lock WHERE heartbeat_at < :stale"),
+                         {"stale": time.time() - timeout})
+            taken = conn.execute(text(
+                "INSERT INTO schema_migration_lock (id, owner, heartbeat_at) VALUES (1, :owner, :now) "
+                "ON CONFLICT (id) DO NOTHING"
+            ), {"owner": owner, "now": time.time()}).rowcount
+        if taken:
+            break
+        if not waited:
+            logger.info("Migrations en cours dans un autre processus, attente...")
+            waited = True
+        time.sleep(0.2)
+
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(timeout / 4):
+            with engine.begin() as conn:
+                conn.execute(text("UPDATE schema_migration_lock SET heartbeat_at = :now WHERE owner = :owner"),
+                             {"now": time.time(), "owner": owner})
+
+    thread = threading.Thread(target=heartbeat, name="migration-lock", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM schema_migration_lock WHERE owner = :owner"), {"owner": owner})
+
+
+def prepare_database(engine, metadata, migrate=True, batch_size=MIGRATION_BATCH_SIZE):
+    """Crée les tables manquantes puis, si migrate, applique les migrations ; un seul processus à la fois."""
+    with migration_lock(engine):
+        metadata.create_all(bind=engine)
+        if migrate:
+            run_migrations(engine, batch_size)
+
+
+if __name__ == "__main__":
+    import sys
+    from logging_config import setup_logging
+    setup_logging()
+    from auth import Base, engine
+    if "--patient-conflicts" in sys.argv:
+        # Ids des patients à fusionner ou corriger avant la création des index uniques (migration 0004)
+        with engine.connect() as conn:
+            for rule, groups in patient_conflicts(conn).items():
+                for ids in groups:
+                    print(f"{rule} : {', '.join(str(i) for i in ids)}")
+        sys.exit(0)
+    prepare_database(engine, Base.metadata)
+    logger.info("Migrations terminées.")
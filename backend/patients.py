@@ -0,0 +1,83 @@
+"""Registre des patients : recherche par préfixe et import CSV en masse."""
+import csv
+import io
+
+from sqlalchemy import and_, or_
+
+from auth import Patient
+from database import insert_ignore, prefix_condition
+from settings import PATIENT_IMPORT_BATCH_SIZE
+
+PATIENT_FIELDS = ("nom", "prenom", "telephone", "sexe", "age")
+# Erreurs de lignes renvoyées au client (les suivantes sont seulement comptées)
+MAX_REPORTED_ERRORS = 20
+
+
+def clean_patient(values):
+    """Champs patient nettoyés (espaces retirés, chaînes vides -> None) ; nom et prénom obligatoires."""
+    cleaned = {}
+    for field in PATIENT_FIELDS:
+        value = values.get(field)
+        value = str(value).strip() if value is not None else ""
+        cleaned[field] = value or None
+    if not cleaned["nom"] or not cleaned["prenom"]:
+        raise ValueError("nom et prénom obligatoires")
+    return cleaned
+
+
+def prefix_filter(q: str, dialect_name: str):
+    """Condition « nom, prénom ou téléphone commence par q », servie par les index de patients.
+
+    Nom et prénom sont comparés sans tenir compte de la casse (voir database.prefix_condition) ; chaque
+    branche du OR utilise son propre index.
+    """
+    return or_(
+        prefix_condition(Patient.nom, q, dialect_name),
+        prefix_condition(Patient.prenom, q, dialect_name),
+        and_(Patient.telephone >= q, Patient.telephone < q + "\uffff"),
+    )
+
+
+def import_patients_csv(raw, engine, batch_size=PATIENT_IMPORT_BATCH_SIZE):
+    """Importe un CSV (en-tête nom,prenom,telephone,sexe,age ; séparateur , ou ;) par lots transactionnels.
+
+    raw est un flux binaire. Les patients déjà connus (même téléphone, ou même nom/prénom/âge sans
+    téléphone) sont ignorés. Appel bloquant : à lancer dans un exécuteur.
+    """
+    stream = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+    sample = stream.read(4096)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(stream, dialect=dialect)
+    if not reader.fieldnames or not {"nom", "prenom"} <= {f.strip().lower() for f in reader.fieldnames}:
+        raise ValueError("En-tête CSV invalide : colonnes nom et prenom obligatoires")
+    reader.fieldnames = [f.strip().lower() for f in reader.fieldnames]
+
+    stmt = insert_ignore(Patient, engine.dialect.name)
+    stats = {"rows": 0, "inserted": 0, "invalid": 0, "errors": []}
+    batch = []
+
+    def flush():
+        with engine.begin() as conn:
+            stats["inserted"] += conn.execute(stmt, batch).rowcount
+        batch.clear()
+
+    for values in reader:
+        stats["rows"] += 1
+        try:
+            batch.append(clean_patient(values))
+        except ValueError as e:
+            stats["invalid"] += 1
+            if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                stats["errors"].append({"line": reader.line_num, "error": str(e)})
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    stats["skipped"] = stats["rows"] - stats["inserted"] - stats["invalid"]
+    stream.detach()
+    return stats
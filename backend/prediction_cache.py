@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import delete, select
+
+from auth import CachedPrediction, SessionLocal
+from settings import PREDICTION_CACHE_PERSISTENT, PREDICTION_CACHE_PERSISTENT_MAX_ENTRIES, PREDICTION_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """Cache LRU des vecteurs de probabilités, indexé par le hash du contenu de l'image.
+
+    Un second niveau optionnel en base (table prediction_cache) survit aux redémarrages. Il est élagué
+    (prune) au démarrage puis régulièrement : entrées des autres versions du modèle, que plus rien ne
+    relira, puis les plus anciennes au-delà de max_persistent_entries.
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, persistent=PREDICTION_CACHE_PERSISTENT,
+                 session_factory=SessionLocal, model_version=None,
+                 max_persistent_entries=PREDICTION_CACHE_PERSISTENT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self.session_factory = session_factory
+        self.model_version = model_version
+        self.max_persistent_entries = max_persistent_entries
+        # Élagage toutes les prune_every écritures (un dixième de la borne)
+        self.prune_every = max(1, max_persistent_entries // 10)
+        self._writes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content_hash: str, model_version: str) -> str:
+        return f"{content_hash}:{model_version}"
+
+    @staticmethod
+    def hash_bytes(image_data: bytes) -> str:
+        return hashlib.sha256(image_data).hexdigest()
+
+    def get(self, key):
+        """Renvoie les probabilités en cache ou None (appel bloquant si le niveau persistant est actif)."""
+        with self._lock:
+            probs = self._entries.get(key)
+            if probs is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return probs
+        if self.persistent:
+            db = self.session_factory()
+            try:
+                row = db.get(CachedPrediction, key)
+            finally:
+                db.close()
+            if row is not None:
+                probs = np.asarray(json.loads(row.probabilities), dtype=np.float32)
+                self._remember(key, probs)
+                with self._lock:
+                    self.hits += 1
+                return probs
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, probs):
+        probs = np.asarray(probs, dtype=np.float32)
+        self._remember(key, probs)
+        if self.persistent:
+            db = self.session_factory()
+            try:
+                db.merge(CachedPrediction(
+                    key=key,
+                    probabilities=json.dumps(probs.tolist()),
+                    created_at=datetime.utcnow().isoformat(),
+                ))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning("Erreur écriture cache prédiction : %s", e)
+            finally:
+                db.close()
+            with self._lock:
+                self._writes += 1
+                due = self._writes % self.prune_every == 0
+            if due:
+                self.prune()
+
+    def prune(self):
+        """Supprime du niveau persistant les autres versions du modèle et l'excédent le plus ancien.
+
+        Renvoie le nombre de lignes supprimées (appel bloquant).
+        """
+        if not self.persistent:
+            return 0
+        db = self.session_factory()
+        try:
+            removed = 0
+            if self.model_version:
+                # Clé = <sha256 (64 caractères)>:<version>
+                version = self.model_version.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                removed += db.execute(delete(CachedPrediction).where(
+                    CachedPrediction.key.not_like("_" * 64 + ":" + version, escape="\\")
+                )).rowcount
+            # Date de la plus récente des lignes à supprimer : tout ce qui est au-delà de la borne
+            cutoff = db.execute(
+                select(CachedPrediction.created_at).order_by(CachedPrediction.created_at.desc())
+                .offset(self.max_persistent_entries).limit(1)
+            ).scalar()
+            if cutoff is not None:
+                removed += db.execute(delete(CachedPrediction).where(CachedPrediction.created_at <= cutoff)).rowcount
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning("Erreur élagage cache prédiction : %s", e)
+            return 0
+        finally:
+            db.close()
+        if removed:
+            logger.info("Cache prédiction : %s entrées supprimées", removed)
+        return removed
+
+    def _remember(self, key, probs):
+        with self._lock:
+            self._entries[key] = probs
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,58 @@
+import io
+import mmap
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from settings import DECODE_REDUCING_GAP, DECODE_RESAMPLE, MAX_IMAGE_PIXELS
+
+# Dimensions attendues par le modèle
+IMG_SIZE = (256, 256)
+
+# Garde-fou PIL contre les bombes de décompression (au-delà de 2x la limite, PIL lève une erreur)
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+RESAMPLE = Image.Resampling[DECODE_RESAMPLE.upper()]
+
+
+class ImageTooLarge(ValueError):
+    """L'image dépasse le nombre de pixels autorisé."""
+
+
+class EmptyImage(ValueError):
+    """Fichier image vide (mmap refuse un fichier de taille nulle)."""
+
+
+def open_checked(fp, max_pixels=MAX_IMAGE_PIXELS):
+    """Ouvre l'image (lecture de l'en-tête seulement) et refuse les dimensions excessives avant décodage."""
+    image_pil = Image.open(fp)
+    width, height = image_pil.size
+    if width * height > max_pixels:
+        raise ImageTooLarge(f"Image trop grande : {width}x{height} pixels")
+    return image_pil
+
+
+def decode_and_resize(source, size=IMG_SIZE, resample=RESAMPLE, reducing_gap=DECODE_REDUCING_GAP):
+    """Décode l'image uploadée et la redimensionne à la taille du modèle (tableau uint8 H x W x 3).
+
+    source est soit le contenu brut, soit le chemin du fichier sauvegardé (lu via mmap, sans copie).
+    Avec reducing_gap, l'image est d'abord réduite au décodage (JPEG) ou par réduction entière
+    jusqu'à environ reducing_gap fois la taille finale, puis redimensionnée avec le filtre choisi.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        if not source:
+            raise EmptyImage("Fichier vide")
+        return _resize(open_checked(io.BytesIO(source)), size, resample, reducing_gap)
+    if Path(source).stat().st_size == 0:
+        raise EmptyImage("Fichier vide")
+    with open(Path(source), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _resize(open_checked(mm), size, resample, reducing_gap)
+
+
+def _resize(image_pil, size, resample, reducing_gap):
+    if reducing_gap and image_pil.format == "JPEG":
+        # Le décodeur JPEG sait réduire par 2, 4 ou 8 sans décoder la pleine résolution
+        image_pil.draft("RGB", (int(size[0] * reducing_gap), int(size[1] * reducing_gap)))
+    image_resized = image_pil.convert('RGB').resize(size, resample=resample, reducing_gap=reducing_gap or None)
+    return np.array(image_resized)
@@ -0,0 +1,332 @@
+"""Rapports PDF générés côté serveur (une prédiction ou l'historique d'un patient), mis en cache sur disque.
+
+La clé d'un rapport couvre tout ce qui y est imprimé : prédictions (id, image), révision des notes
+(nombre et dernier id), identité du patient et version de la mise en page. Une nouvelle note change la
+clé ; les rapports qui ne servent plus sortent du cache par ancienneté (taille totale et durée de vie bornées).
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from PIL import Image as PILImage
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import (
+    CondPageBreak, HRFlowable, Image, KeepTogether, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table,
+    TableStyle,
+)
+
+from executors import io_executor, run_in
+from image_store import UPLOADS_DIR
+from metrics import REPORT_CACHE_REQUESTS, REPORT_RENDER_SECONDS
+from settings import REPORT_CACHE_MAX_BYTES, REPORT_CACHE_TTL_SECONDS, THUMBNAIL_SIZES
+from thumbnails import ensure_thumbnail
+
+logger = logging.getLogger(__name__)
+
+REPORTS_DIR = UPLOADS_DIR / "reports"
+# À incrémenter à chaque changement de mise en page : les rapports déjà en cache ne sont plus servis
+LAYOUT_VERSION = 1
+# Les images du rapport viennent de la plus grande miniature, jamais de l'original
+IMAGE_SIZE = max(THUMBNAIL_SIZES)
+
+GREEN = colors.Color(34 / 255, 197 / 255, 94 / 255)
+BLUE = colors.Color(59 / 255, 130 / 255, 246 / 255)
+TEXT = colors.Color(33 / 255, 37 / 255, 41 / 255)
+GREY = colors.Color(100 / 255, 100 / 255, 100 / 255)
+LIGHT_BLUE = colors.Color(191 / 255, 219 / 255, 254 / 255)
+
+_styles = getSampleStyleSheet()
+TITLE = ParagraphStyle("titre", parent=_styles["Title"], textColor=GREEN, fontSize=20, leading=24)
+SECTION = ParagraphStyle("section", parent=_styles["Heading2"], textColor=GREEN, fontSize=14, spaceBefore=8,
+                         spaceAfter=2)
+SUBSECTION = ParagraphStyle("sous-section", parent=_styles["Heading3"], textColor=BLUE, fontSize=12)
+BODY = ParagraphStyle("texte", parent=_styles["BodyText"], textColor=TEXT, fontSize=10.5, leading=14)
+SMALL = ParagraphStyle("petit", parent=BODY, fontSize=8.5, leading=11)
+CAPTION = ParagraphStyle("legende", parent=SMALL, textColor=GREY, alignment=1, fontName="Helvetica-Oblique")
+
+# Génération en cours par clé : des demandes simultanées du même rapport attendent la même génération
+_rendering = {}
+
+
+def report_key(kind, identity, entries, notes_revision):
+    """Clé du cache : condensé de tout ce qui détermine le contenu du rapport."""
+    content = {
+        "layout": LAYOUT_VERSION,
+        "kind": kind,
+        "identity": identity,
+        "predictions": [[entry["id"], entry["image_name"]] for entry in entries],
+        "notes": list(notes_revision),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def report_path(key) -> Path:
+    return REPORTS_DIR / key[:2] / f"{key}.pdf"
+
+
+def cached_report(key) -> Path | None:
+    """Rapport en cache encore valide (appel bloquant) ; un accès le rajeunit pour l'éviction."""
+    path = report_path(key)
+    try:
+        if time.time() - path.stat().st_mtime > REPORT_CACHE_TTL_SECONDS:
+            return None
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+async def get_report(key, kind, load):
+    """Chemin du rapport : servi depuis le cache, sinon généré une seule fois pour toutes les demandes.
+
+    load : coroutine qui renvoie les arguments de render_report (appelée seulement en cas d'absence).
+    """
+    path = await run_in(io_executor, cached_report, key)
+    if path is not None:
+        REPORT_CACHE_REQUESTS.inc(result="hit")
+        return path
+    REPORT_CACHE_REQUESTS.inc(result="miss")
+    task = _rendering.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_render(key, kind, load))
+        _rendering[key] = task
+        task.add_done_callback(lambda _: _rendering.pop(key, None))
+    # Une demande abandonnée n'interrompt pas la génération attendue par les autres
+    return await asyncio.shield(task)
+
+
+async def _render(key, kind, load):
+    content = await load()
+    start = time.perf_counter()
+    path = await run_in(io_executor, render_report, key, **content)
+    REPORT_RENDER_SECONDS.observe(time.perf_counter() - start, kind=kind)
+    return path
+
+
+def render_report(key, title, identity, entries, notes, advice):
+    """Génère le PDF dans le cache (appel bloquant : à lancer dans io_executor) et renvoie son chemin.
+
+    entries : prédictions (plus récentes d'abord), notes : {prediction_id: [notes]}, advice : conseils par maladie.
+    """
+    path = report_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Écriture atomique : un rapport partiel n'est jamais servi depuis le cache
+    tmp = path.with_name(f".{uuid.uuid4().hex}.part")
+    try:
+        doc = SimpleDocTemplate(str(tmp), pagesize=A4, leftMargin=18 * mm, rightMargin=18 * mm,
+                                topMargin=16 * mm, bottomMargin=18 * mm, title=title, author="DermaScan AI")
+        story = [Paragraph("DermaScan AI - Rapport d'analyse", TITLE), _rule(GREEN, 1.2)]
+        story += _identity_section(identity)
+        if len(entries) > 1:
+            story += _summary_section(entries)
+        for i, entry in enumerate(entries):
+            if i and len(entries) > 1:
+                story.append(PageBreak())
+            story += _prediction_section(entry, notes.get(entry["id"], []), advice, numbered=len(entries) > 1)
+        story += [Spacer(1, 8 * mm), Paragraph("<i>Merci d'utiliser DermaScan AI.</i>", BODY)]
+        doc.build(story, onFirstPage=_footer, onLaterPages=_footer)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    try:
+        prune_cache()
+    except OSError as e:
+        logger.warning("Erreur nettoyage du cache des rapports : %s", e)
+    return path
+
+
+def prune_cache(max_bytes=REPORT_CACHE_MAX_BYTES, ttl=REPORT_CACHE_TTL_SECONDS):
+    """Supprime les rapports expirés puis les moins récemment servis au-delà de la taille maximale."""
+    if not REPORTS_DIR.is_dir():
+        return
+    now = time.time()
+    files = []
+    for path in REPORTS_DIR.glob("*/*.pdf"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        if now - st.st_mtime > ttl:
+            path.unlink(missing_ok=True)
+        else:
+            files.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def advice_for_class(advice, predicted_class):
+    """Conseils de disease_advice.json dont la clé apparaît dans le nom de la maladie prédite."""
+    for name, content in advice.items():
+        if name in (predicted_class or ""):
+            return content
+    return None
+
+
+def format_confidence(confidence):
+    if confidence is None:
+        return ""
+    value = float(confidence)
+    return f"{value * 100 if value <= 1 else value:.1f}%"
+
+
+def _text(value):
+    return escape(str(value)) if value not in (None, "") else ""
+
+
+def _rule(color=LIGHT_BLUE, width=0.7):
+    return HRFlowable(width="100%", thickness=width, color=color, spaceBefore=1, spaceAfter=4)
+
+
+def _section(title):
+    return [CondPageBreak(30 * mm), Paragraph(escape(title), SECTION), _rule()]
+
+
+def _footer(canvas, doc):
+    canvas.saveState()
+    canvas.setFont("Helvetica", 8)
+    canvas.setFillColor(colors.Color(0.6, 0.6, 0.6))
+    canvas.drawCentredString(A4[0] / 2, 10 * mm, f"Rapport généré automatiquement - DermaScan AI - page {doc.page}")
+    canvas.restoreState()
+
+
+def _identity_section(identity):
+    name = " ".join(part for part in (identity.get("prenom"), identity.get("nom")) if part)
+    lines = [("Nom", name), ("Email", identity.get("email")), ("Téléphone", identity.get("telephone")),
+             ("Sexe", identity.get("sexe")), ("Âge", identity.get("age"))]
+    return _section("Informations du patient") + [
+        Paragraph(f"{label} : {_text(value)}", BODY) for label, value in lines if value or label == "Nom"
+    ]
+
+
+def _summary_section(entries):
+    rows = [["Date", "Maladie prédite", "Confiance", "Notes"]]
+    for entry in entries:
+        rows.append([_format_date(entry["date"]), Paragraph(_text(entry["predicted_class"]), SMALL),
+                     format_confidence(entry["confidence"]), str(entry.get("notes_count", 0))])
+    table = Table(rows, colWidths=[32 * mm, 95 * mm, 24 * mm, 18 * mm], repeatRows=1)
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), GREEN),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 8.5),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.Color(0.96, 0.98, 1)]),
+        ("GRID", (0, 0), (-1, -1), 0.3, LIGHT_BLUE),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ]))
+    return _section(f"Historique des analyses ({len(entries)})") + [table]
+
+
+def _prediction_section(entry, notes, advice, numbered):
+    story = []
+    if numbered:
+        story.append(Paragraph(f"Analyse du {_format_date(entry['date'])}", SUBSECTION))
+    story += _section("Image analysée")
+    image = _report_image(entry["image_name"])
+    if image is not None:
+        story += [image, Paragraph("Image analysée par DermaScan AI", CAPTION)]
+    else:
+        story.append(Paragraph("Image non disponible", BODY))
+
+    story += _section("Résultat de l'analyse")
+    story += [
+        Paragraph(f"Date de l'analyse : {_format_date(entry['date'])}", BODY),
+        Paragraph(f"Maladie prédite : <b>{_text(entry['predicted_class'])}</b>", BODY),
+        Paragraph(f"Confiance : {format_confidence(entry['confidence'])}", BODY),
+    ]
+
+    top = entry.get("top_predictions") or []
+    if top:
+        story += _section("Top 3 maladies les plus probables")
+        story += [Paragraph(f"{i}. {_text(item.get('class_name'))} : {format_confidence(item.get('confidence'))}", BODY)
+                  for i, item in enumerate(top[:3], 1)]
+
+    for comparison in entry.get("comparison") or []:
+        story += _comparison_table(comparison)
+
+    story += _section("Conseils médicaux")
+    story += _advice_paragraphs(advice_for_class(advice, entry["predicted_class"]))
+
+    story += _section("Notes du médecin")
+    if notes:
+        story += [Paragraph(f"<b>{_format_date(note['date'])}</b> : {_text(note['note'])}", BODY) for note in notes]
+    else:
+        story.append(Paragraph("Aucune note enregistrée.", BODY))
+    return story
+
+
+def _comparison_table(comparison):
+    diseases = comparison.get("diseases") or []
+    criteria = comparison.get("criteria") or []
+    if len(diseases) < 2 or not criteria:
+        return []
+    rows = [["Critère"] + [Paragraph(f"<b>{_text(d)}</b>", SMALL) for d in diseases]]
+    for criterion in criteria:
+        rows.append([Paragraph(_text(criterion.get("nom")), SMALL)]
+                    + [Paragraph(_text(criterion.get(d)), SMALL) for d in diseases])
+    width = (174 * mm - 32 * mm) / len(diseases)
+    table = Table(rows, colWidths=[32 * mm] + [width] * len(diseases), repeatRows=1)
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.Color(0.93, 0.97, 1)),
+        ("FONTSIZE", (0, 0), (-1, -1), 8.5),
+        ("GRID", (0, 0), (-1, -1), 0.3, LIGHT_BLUE),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ]))
+    title = " / ".join(diseases)
+    return [CondPageBreak(40 * mm), Paragraph(f"Tableau de comparaison clinique : {_text(title)}", SUBSECTION), table]
+
+
+def _advice_paragraphs(advice):
+    if not advice:
+        return [Paragraph("Aucun conseil spécifique disponible pour cette maladie.", BODY)]
+    story = []
+    if advice.get("description"):
+        story.append(Paragraph(f"<b>Description :</b> {_text(advice['description'])}", BODY))
+    if isinstance(advice.get("conseils"), list):
+        story.append(Paragraph("<b>Conseils :</b>", BODY))
+        story += [Paragraph(f"• {_text(conseil)}", BODY) for conseil in advice["conseils"]]
+    if advice.get("gravite"):
+        story.append(Paragraph(f"<b>Gravité :</b> {_text(advice['gravite'])}", BODY))
+    if advice.get("recommandation"):
+        story.append(Paragraph(f"<b>Recommandation :</b> {_text(advice['recommandation'])}", BODY))
+    return [KeepTogether(story)]
+
+
+def _report_image(image_name, max_width=174 * mm, max_height=60 * mm):
+    """Miniature de l'image réencodée en JPEG (compacte dans le PDF) ; None si l'image est absente."""
+    if not image_name:
+        return None
+    try:
+        thumb = ensure_thumbnail(image_name, IMAGE_SIZE)
+        if thumb is None:
+            return None
+        with PILImage.open(thumb) as source:
+            width, height = source.size
+            buffer = io.BytesIO()
+            source.convert("RGB").save(buffer, format="JPEG", quality=85)
+    except Exception as e:
+        logger.warning("Erreur image du rapport %s : %s", image_name, e)
+        return None
+    buffer.seek(0)
+    scale = min(max_width / width, max_height / height)
+    return Image(buffer, width=width * scale, height=height * scale)
+
+
+def _format_date(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.strftime("%d/%m/%Y %H:%M") if value else ""
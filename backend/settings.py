@@ -0,0 +1,134 @@
+"""Paramètres du backend, surchargeables par variables d'environnement."""
+import os
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, str(default)))
+
+
+# Journalisation : niveau global, niveaux par logger ("jobs=DEBUG,sqlalchemy.engine=WARNING"),
+# format "json" ou "text" et fraction des messages DEBUG conservés (échantillonnage)
+LOG_LEVEL = os.getenv("DERMASCAN_LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("DERMASCAN_LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("DERMASCAN_LOG_FORMAT", "json")
+LOG_DEBUG_SAMPLE_RATE = _env_float("DERMASCAN_LOG_DEBUG_SAMPLE_RATE", 1.0)
+
+# Métriques Prometheus (/metrics) ; 0 = aucune mesure
+METRICS_ENABLED = os.getenv("DERMASCAN_METRICS_ENABLED", "1") == "1"
+
+# Micro-batching de l'inférence (/predict)
+MAX_BATCH_SIZE = _env_int("DERMASCAN_MAX_BATCH_SIZE", 8)
+MAX_BATCH_WAIT_MS = _env_float("DERMASCAN_MAX_BATCH_WAIT_MS", 10)
+
+# Exécuteurs dédiés (hors boucle asyncio)
+INFERENCE_THREADS = _env_int("DERMASCAN_INFERENCE_THREADS", 1)
+IO_THREADS = _env_int("DERMASCAN_IO_THREADS", 4)
+DECODE_WORKERS = _env_int("DERMASCAN_DECODE_WORKERS", 2)
+# "thread" ou "process" : un pool de processus contourne le GIL pour le décodage PIL
+DECODE_POOL = os.getenv("DERMASCAN_DECODE_POOL", "thread")
+
+# Modèle et backend d'inférence : "keras", "compiled", "tflite-float16" ou "tflite-int8"
+MODEL_PATH = os.getenv("DERMASCAN_MODEL_PATH", r'D:\S2\projet\skin-app\backend\models\denseNet.keras')
+INFERENCE_BACKEND = os.getenv("DERMASCAN_INFERENCE_BACKEND", "compiled")
+# Identifiant de version du modèle (clé du cache) ; déduit du fichier du modèle si vide
+MODEL_VERSION = os.getenv("DERMASCAN_MODEL_VERSION", "")
+
+# Cache des prédictions par contenu d'image
+PREDICTION_CACHE_SIZE = _env_int("DERMASCAN_PREDICTION_CACHE_SIZE", 2048)
+PREDICTION_CACHE_PERSISTENT = os.getenv("DERMASCAN_PREDICTION_CACHE_PERSISTENT", "0") == "1"
+# Niveau persistant : nombre maximal de lignes (les plus anciennes sont supprimées au-delà)
+PREDICTION_CACHE_PERSISTENT_MAX_ENTRIES = _env_int("DERMASCAN_PREDICTION_CACHE_PERSISTENT_MAX_ENTRIES", 100_000)
+
+# Upload /predict : taille maximale, nombre maximal de pixels et taille des blocs lus
+MAX_UPLOAD_BYTES = _env_int("DERMASCAN_MAX_UPLOAD_BYTES", 20 * 1024 * 1024)
+MAX_IMAGE_PIXELS = _env_int("DERMASCAN_MAX_IMAGE_PIXELS", 50_000_000)
+UPLOAD_CHUNK_SIZE = _env_int("DERMASCAN_UPLOAD_CHUNK_SIZE", 256 * 1024)
+
+# /predict/batch : nombre maximal d'images et taille maximale d'une archive ZIP
+MAX_BATCH_FILES = _env_int("DERMASCAN_MAX_BATCH_FILES", 200)
+MAX_BATCH_UPLOAD_BYTES = _env_int("DERMASCAN_MAX_BATCH_UPLOAD_BYTES", 500 * 1024 * 1024)
+
+# File de jobs de prédiction (/jobs) : nombre de workers, intervalle de scrutation de la file en base,
+# bail d'un job "running" (repris par un autre processus sans battement de cœur depuis ce délai)
+# et intervalle des messages de maintien de connexion SSE
+JOB_WORKERS = _env_int("DERMASCAN_JOB_WORKERS", 2)
+JOB_POLL_SECONDS = _env_float("DERMASCAN_JOB_POLL_SECONDS", 1.0)
+JOB_LEASE_SECONDS = _env_float("DERMASCAN_JOB_LEASE_SECONDS", 60)
+JOB_SSE_KEEPALIVE_SECONDS = _env_float("DERMASCAN_JOB_SSE_KEEPALIVE_SECONDS", 15)
+
+# Récupération des images orphelines (image_gc.py) : intervalle entre deux passes (0 = pas de passe
+# périodique), taille des lots, délai de grâce avant suppression et mode simulation (rien n'est supprimé)
+GC_INTERVAL_SECONDS = _env_float("DERMASCAN_GC_INTERVAL_SECONDS", 3600)
+GC_BATCH_SIZE = _env_int("DERMASCAN_GC_BATCH_SIZE", 500)
+GC_GRACE_SECONDS = _env_float("DERMASCAN_GC_GRACE_SECONDS", 24 * 3600)
+GC_DRY_RUN = os.getenv("DERMASCAN_GC_DRY_RUN", "0") == "1"
+
+# Décodage : filtre de redimensionnement et marge de réduction au décodage (0 = décodage pleine résolution)
+DECODE_RESAMPLE = os.getenv("DERMASCAN_DECODE_RESAMPLE", "bicubic")
+DECODE_REDUCING_GAP = _env_float("DERMASCAN_DECODE_REDUCING_GAP", 2.0)
+
+# Pagination de /history_full
+HISTORY_DEFAULT_LIMIT = _env_int("DERMASCAN_HISTORY_DEFAULT_LIMIT", 50)
+HISTORY_MAX_LIMIT = _env_int("DERMASCAN_HISTORY_MAX_LIMIT", 500)
+
+# Pagination de /prediction/{id}/notes
+NOTES_DEFAULT_LIMIT = _env_int("DERMASCAN_NOTES_DEFAULT_LIMIT", 50)
+NOTES_MAX_LIMIT = _env_int("DERMASCAN_NOTES_MAX_LIMIT", 500)
+
+# Pagination de /users
+USERS_DEFAULT_LIMIT = _env_int("DERMASCAN_USERS_DEFAULT_LIMIT", 50)
+USERS_MAX_LIMIT = _env_int("DERMASCAN_USERS_MAX_LIMIT", 500)
+
+# Registre des patients : taille des lots de l'import CSV et nombre maximal de résultats de recherche
+PATIENT_IMPORT_BATCH_SIZE = _env_int("DERMASCAN_PATIENT_IMPORT_BATCH_SIZE", 1000)
+PATIENT_SEARCH_MAX_LIMIT = _env_int("DERMASCAN_PATIENT_SEARCH_MAX_LIMIT", 100)
+
+# Miniatures des images uploadées
+THUMBNAIL_SIZES = tuple(int(s) for s in os.getenv("DERMASCAN_THUMBNAIL_SIZES", "128,512").split(","))
+THUMBNAIL_FORMAT = os.getenv("DERMASCAN_THUMBNAIL_FORMAT", "WEBP")
+THUMBNAIL_QUALITY = _env_int("DERMASCAN_THUMBNAIL_QUALITY", 80)
+# 1 = miniatures générées dès l'upload, 0 = à la première demande
+THUMBNAILS_AT_UPLOAD = os.getenv("DERMASCAN_THUMBNAILS_AT_UPLOAD", "1") == "1"
+
+# Rapports PDF (reports.py) : nombre maximal de prédictions d'un rapport d'historique, taille totale et
+# durée de vie du cache des rapports générés (uploads/reports/)
+REPORT_MAX_PREDICTIONS = _env_int("DERMASCAN_REPORT_MAX_PREDICTIONS", 200)
+REPORT_CACHE_MAX_BYTES = _env_int("DERMASCAN_REPORT_CACHE_MAX_BYTES", 500 * 1024 * 1024)
+REPORT_CACHE_TTL_SECONDS = _env_float("DERMASCAN_REPORT_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+
+# Comparaisons (comparisons.py) : intervalle minimal entre deux vérifications de la date de
+# modification de disease_profiles.json ; 0 = pas de rechargement automatique
+COMPARISON_RELOAD_SECONDS = _env_float("DERMASCAN_COMPARISON_RELOAD_SECONDS", 30)
+
+# Hachage bcrypt (/login, /register) : threads dédiés et facteur de coût ; un mot de passe haché avec
+# un autre coût est re-haché à la connexion suivante
+PASSWORD_HASH_THREADS = _env_int("DERMASCAN_PASSWORD_HASH_THREADS", 2)
+BCRYPT_ROUNDS = _env_int("DERMASCAN_BCRYPT_ROUNDS", 12)
+
+# Cache des utilisateurs authentifiés (par token)
+AUTH_CACHE_TTL_SECONDS = _env_float("DERMASCAN_AUTH_CACHE_TTL_SECONDS", 60)
+AUTH_CACHE_SIZE = _env_int("DERMASCAN_AUTH_CACHE_SIZE", 10000)
+
+# Migrations de schéma : exécution au démarrage, taille des lots de recopie et pause entre lots
+AUTO_MIGRATE = os.getenv("DERMASCAN_AUTO_MIGRATE", "1") == "1"
+MIGRATION_BATCH_SIZE = _env_int("DERMASCAN_MIGRATION_BATCH_SIZE", 1000)
+MIGRATION_PAUSE_MS = _env_float("DERMASCAN_MIGRATION_PAUSE_MS", 5)
+# Verrou de migration (SQLite) : repris à un processus qui n'a plus donné signe de vie depuis ce délai
+MIGRATION_LOCK_TIMEOUT_SECONDS = _env_float("DERMASCAN_MIGRATION_LOCK_TIMEOUT_SECONDS", 60)
+
+# Base de données : SQLite local par défaut, ou URL PostgreSQL avec pool (seules bases supportées)
+DATABASE_URL = os.getenv("DERMASCAN_DATABASE_URL", "sqlite:///./users.db")
+SQLITE_JOURNAL_MODE = os.getenv("DERMASCAN_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("DERMASCAN_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = _env_int("DERMASCAN_SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_MMAP_SIZE = _env_int("DERMASCAN_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+DB_POOL_SIZE = _env_int("DERMASCAN_DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = _env_int("DERMASCAN_DB_MAX_OVERFLOW", 20)
+DB_POOL_PRE_PING = os.getenv("DERMASCAN_DB_POOL_PRE_PING", "1") == "1"
+DB_POOL_RECYCLE = _env_int("DERMASCAN_DB_POOL_RECYCLE", 1800)
+# URL asynchrone (aiosqlite / asyncpg) ; déduite de DATABASE_URL si vide
+ASYNC_DATABASE_URL = os.getenv("DERMASCAN_ASYNC_DATABASE_URL", "")
@@ -0,0 +1,69 @@
+import logging
+import os
+import uuid
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from image_store import UPLOADS_DIR, image_path, is_image_key, shard
+from settings import THUMBNAIL_FORMAT, THUMBNAIL_QUALITY, THUMBNAIL_SIZES
+
+logger = logging.getLogger(__name__)
+
+THUMBS_DIR = UPLOADS_DIR / "thumbs"
+
+MEDIA_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg"}
+
+
+def thumbnail_media_type():
+    return MEDIA_TYPES[THUMBNAIL_FORMAT]
+
+
+def thumbnail_path(image_name: str, size: int) -> Path:
+    """Emplacement de la miniature : uploads/thumbs/<taille>/[<ab>/<cd>/]<nom sans extension>.<format>.
+
+    Les images stockées par contenu ont des miniatures réparties comme les originaux (et partagées
+    par toutes les prédictions de la même image).
+    """
+    stem = Path(image_name).stem
+    folder = THUMBS_DIR / str(size)
+    if is_image_key(image_name):
+        folder = shard(folder, stem)
+    return folder / (stem + EXTENSIONS[THUMBNAIL_FORMAT])
+
+
+def ensure_thumbnail(image_name: str, size: int) -> Path | None:
+    """Génère la miniature si elle n'existe pas encore ; renvoie None si l'original est absent."""
+    if size not in THUMBNAIL_SIZES:
+        raise ValueError(f"Taille de miniature non supportée : {size}")
+    path = thumbnail_path(image_name, size)
+    if path.exists():
+        return path
+    original = image_path(image_name)
+    if not original.exists():
+        return None
+    with Image.open(original) as image:
+        # Réduction au décodage pour les JPEG, puis redimensionnement en conservant les proportions
+        image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((size, size))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Écriture atomique : deux requêtes concurrentes ne voient jamais un fichier partiel
+        tmp = path.with_name(f".{uuid.uuid4().hex}{path.suffix}")
+        image.save(tmp, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+        os.replace(tmp, path)
+    return path
+
+
+def generate_thumbnails(image_name: str):
+    for size in THUMBNAIL_SIZES:
+        try:
+            ensure_thumbnail(image_name, size)
+        except Exception as e:
+            logger.warning("Erreur génération miniature %s (%spx) : %s", image_name, size, e)
+
+
+def remove_thumbnails(image_name: str):
+    for size in THUMBNAIL_SIZES:
+        thumbnail_path(image_name, size).unlink(missing_ok=True)
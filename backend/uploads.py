@@ -0,0 +1,109 @@
+import hashlib
+import os
+import time
+import zipfile
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile
+
+from executors import io_executor, run_in
+from metrics import PREDICT_STAGE_SECONDS
+from settings import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE, MAX_BATCH_FILES
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".jfif", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+
+async def save_upload(file: UploadFile, dest: Path, max_bytes=MAX_UPLOAD_BYTES, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Écrit l'upload sur disque par blocs en calculant son SHA-256, sans jamais le charger en entier.
+
+    Renvoie (taille en octets, hash hexadécimal). Lève une 413 si la taille dépasse max_bytes,
+    une 400 si le fichier est vide.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    # Temps cumulés de lecture de la requête et d'écriture disque (métriques)
+    read_seconds = write_seconds = 0.0
+    out = await run_in(io_executor, open, dest, "wb")
+    try:
+        while True:
+            start = time.perf_counter()
+            chunk = await file.read(chunk_size)
+            read_seconds += time.perf_counter() - start
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Image trop volumineuse (maximum {max_bytes // (1024 * 1024)} Mo)",
+                )
+            sha256.update(chunk)
+            start = time.perf_counter()
+            await run_in(io_executor, out.write, chunk)
+            write_seconds += time.perf_counter() - start
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Fichier vide")
+    except BaseException:
+        await run_in(io_executor, out.close)
+        dest.unlink(missing_ok=True)
+        raise
+    await run_in(io_executor, out.close)
+    PREDICT_STAGE_SECONDS.observe(read_seconds, stage="upload_read")
+    PREDICT_STAGE_SECONDS.observe(write_seconds, stage="disk_write")
+    return size, sha256.hexdigest()
+
+
+def is_zip_upload(file: UploadFile) -> bool:
+    """Vrai si l'upload est une archive ZIP (d'après son nom ou son type MIME)."""
+    return (file.filename or "").lower().endswith(".zip") or file.content_type in ("application/zip", "application/x-zip-compressed")
+
+
+def extract_zip_images(zip_path: Path, dest_dir: Path, name_for, max_bytes=MAX_UPLOAD_BYTES,
+                       max_files=MAX_BATCH_FILES, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Extrait les images d'une archive ZIP dans dest_dir, par blocs et en calculant leur SHA-256.
+
+    name_for(nom_original) donne le nom de fichier de destination. Renvoie une liste de
+    (nom_original, nom_enregistré, hash hexadécimal) dans l'ordre alphabétique de l'archive.
+    La taille réellement décompressée est contrôlée (protection contre les bombes ZIP).
+    """
+    try:
+        archive = zipfile.ZipFile(zip_path)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Archive ZIP invalide")
+    extracted = []
+    with archive:
+        members = sorted(
+            (m for m in archive.infolist()
+             if not m.is_dir() and os.path.splitext(m.filename)[1].lower() in IMAGE_EXTENSIONS
+             and not os.path.basename(m.filename).startswith(".")),
+            key=lambda m: m.filename,
+        )
+        if len(members) > max_files:
+            raise HTTPException(status_code=413, detail=f"Trop d'images dans l'archive (maximum {max_files})")
+        try:
+            for member in members:
+                original = os.path.basename(member.filename)
+                stored = name_for(original)
+                dest = dest_dir / stored
+                sha256 = hashlib.sha256()
+                size = 0
+                with archive.open(member) as src, open(dest, "wb") as out:
+                    extracted.append((original, stored, None))
+                    while True:
+                        chunk = src.read(chunk_size)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise HTTPException(
+                                status_code=413,
+                                detail=f"Image {original} trop volumineuse (maximum {max_bytes // (1024 * 1024)} Mo)",
+                            )
+                        sha256.update(chunk)
+                        out.write(chunk)
+                extracted[-1] = (original, stored, sha256.hexdigest())
+        except BaseException:
+            for _, stored, _ in extracted:
+                (dest_dir / stored).unlink(missing_ok=True)
+            raise
+    return extracted
@@ -0,0 +1,50 @@
+"""Recherche des utilisateurs (/users) : index plein texte FTS5 sous SQLite, préfixes indexés sinon."""
+import re
+
+from sqlalchemy import Integer, and_, column, or_, text
+
+from auth import User
+from database import prefix_condition
+
+# Créée par la migration 0005_users_search quand SQLite dispose de FTS5
+FTS_TABLE = "users_fts"
+
+_fts_available = None
+
+
+async def fts_available(db):
+    """True si la table users_fts existe (créée par la migration 0005 quand SQLite a FTS5) ; résultat mis en cache."""
+    global _fts_available
+    if _fts_available is None:
+        if db.bind.dialect.name != "sqlite":
+            _fts_available = False
+        else:
+            found = await db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE})
+            _fts_available = found.first() is not None
+    return _fts_available
+
+
+def fts_match_expression(q: str):
+    """Requête FTS5 : chaque mot de q doit préfixer un mot de l'e-mail, du nom ou du prénom."""
+    words = re.findall(r"\w+", q)
+    return " ".join(f'"{word}"*' for word in words) or None
+
+
+def search_filter(q: str, use_fts: bool, dialect_name: str):
+    """Condition de recherche sur email / nom / prénom, ou None si q ne contient aucun mot."""
+    q = q.strip()
+    if not q:
+        return None
+    if use_fts:
+        expression = fts_match_expression(q)
+        if expression is None:
+            return None
+        matches = text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match")
+        return User.id.in_(matches.bindparams(match=expression).columns(column("rowid", Integer)))
+    # Sans FTS5 : préfixe de l'e-mail, du nom ou du prénom (index ix_users_*_search)
+    return or_(
+        and_(User.email >= q, User.email < q + "\uffff"),
+        prefix_condition(User.nom, q, dialect_name),
+        prefix_condition(User.prenom, q, dialect_name),
+    )
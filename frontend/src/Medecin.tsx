@@ -1,15 +1,16 @@
 import React, { useState, useEffect } from "react";
 import { Loader2, ImagePlus, History, LogOut, User, Download, Menu, ArrowLeft, Trash2, Pencil, Check, X as Close } from "lucide-react";
-import jsPDF from "jspdf";
 import { useNavigate } from 'react-router-dom';
 import { jwtDecode } from 'jwt-decode';
+import { downloadReport } from './reports';
 
 const API_URL = 'http://localhost:8000';
 
 interface Prediction {
   id: number;
   image_name: string;
-  image_data: string;
+  image_url?: string;
+  thumbnail_url?: string;
   predicted_class: string;
   confidence: string;
   date: string;
@@ -40,6 +41,8 @@ const Medecin: React.FC<{ token: string }> = ({ token }) => {
   const [loadingHistory, setLoadingHistory] = useState(false);
   const [menuOpen, setMenuOpen] = useState(false);
   const [selectedHistory, setSelectedHistory] = useState<Prediction | null>(null);
+  const [historyCursor, setHistoryCursor] = useState<string | null>(null);
+  const [selectedImageUrl, setSelectedImageUrl] = useState<string | null>(null);
   const [patientInfo, setPatientInfo] = useState<{ nom?: string; prenom?: string; email?: string; sexe?: string; age?: string } | null>(null);
   // Ajoute un nouvel état pour les infos patient saisies par le médecin
   const [patientForm, setPatientForm] = useState({
@@ -123,24 +126,51 @@ const Medecin: React.FC<{ token: string }> = ({ token }) => {
     setLoading(false);
   };
 
-  const fetchHistory = async () => {
-    setLoadingHistory(true);
+  // Historique par pages de 50 (X-Next-Cursor) ; les images sont chargées à l'ouverture d'une prédiction
+  const fetchHistory = async (cursor: string | null = null) => {
+    if (!cursor) setLoadingHistory(true);
     setShowHistory(true);
     try {
       const payload = JSON.parse(atob(token.split(".")[1]));
       const email = payload.sub;
-      // Nouvelle route pour historique enrichi
-      const res = await fetch(`http://localhost:8000/history_full/${email}`, {
+      const params = new URLSearchParams({ limit: "50" });
+      if (cursor) params.set("cursor", cursor);
+      const res = await fetch(`http://localhost:8000/history_full/${email}?${params}`, {
         headers: { Authorization: `Bearer ${token}` }
       });
       const data = await res.json();
-      setHistory(data);
+      setHistory(prev => (cursor ? [...prev, ...data] : data));
+      setHistoryCursor(res.headers.get("X-Next-Cursor"));
     } catch {
-      setHistory([]);
+      if (!cursor) setHistory([]);
+      setHistoryCursor(null);
     }
     setLoadingHistory(false);
   };
 
+  // Image de la prédiction ouverte, récupérée avec le token (balise img sans en-tête d'authentification)
+  useEffect(() => {
+    if (!selectedHistory?.image_url) {
+      setSelectedImageUrl(null);
+      return;
+    }
+    let objectUrl: string | null = null;
+    let cancelled = false;
+    fetch(`${API_URL}${selectedHistory.image_url}`, { headers: { Authorization: `Bearer ${token}` } })
+      .then(res => (res.ok ? res.blob() : null))
+      .then(blob => {
+        if (cancelled || !blob) return;
+        objectUrl = URL.createObjectURL(blob);
+        setSelectedImageUrl(objectUrl);
+      })
+      .catch(() => setSelectedImageUrl(null));
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+      setSelectedImageUrl(null);
+    };
+  }, [selectedHistory, token]);
+
   const handleProfile = () => {
     setProfileOpen(true);
   };
@@ -151,519 +181,8 @@ const Medecin: React.FC<{ token: string }> = ({ token }) => {
       return;
     }
     try {
-      // Récupère les infos de la prédiction et les notes
-      const res = await fetch(`http://localhost:8000/history_full/${patientInfo?.email}`, {
-        headers: { 
-          Authorization: `Bearer ${token}`,
-          'Content-Type': 'application/json'
-        }
-      });
-      const history = await res.json();
-      const prediction = history.find((h: any) => h.id === result.prediction_id);
-      if (!prediction) {
-        alert("Impossible de générer le rapport.");
-        return;
-      }
-      // Récupère les notes du médecin
-      const notesRes = await fetch(`http://localhost:8000/prediction/${result.prediction_id}/notes`, {
-        headers: { 
-          Authorization: `Bearer ${token}`,
-          'Content-Type': 'application/json'
-        }
-      });
-      const notesData = await notesRes.json();
-
-      // Récupère les JSON nécessaires pour conseils, profils et comparaisons
-      const [adviceJson, profilesJson, comparisonsJson] = await Promise.all([
-        fetch("/disease_advice.json").then(r => r.json()).catch(() => ({})),
-        fetch("/disease_profiles.json").then(r => r.json()).catch(() => ({})),
-        fetch("/comparisons.json").then(r => r.json()).catch(() => ({}))
-      ]);
-
-      // Top 3 maladies
-      let top3 = [];
-      try {
-        top3 = Array.isArray(prediction.top_predictions)
-          ? prediction.top_predictions
-          : JSON.parse(prediction.top_predictions || "[]");
-      } catch {
-        top3 = [];
-      }
-
-      function getAllPairs(arr: string[]): [string, string][] {
-        const pairs: [string, string][] = [];
-        for (let i = 0; i < arr.length; i++) {
-          for (let j = i + 1; j < arr.length; j++) {
-            pairs.push([arr[i], arr[j]]);
-          }
-        }
-        return pairs;
-      }
-
-      // --- PDF PRO ---
-      const doc = new jsPDF();
-      let y = 20;
-      const pageWidth = doc.internal.pageSize.getWidth();
-      const margin = 18;
-      const sectionSpace = 12;
-
-      // Logo DermaScan AI (simple carré bleu/vert)
-      doc.setFillColor(34, 197, 94); // vert
-      doc.rect(margin, y - 12, 10, 10, 'F');
-      doc.setFillColor(59, 130, 246); // bleu
-      doc.rect(margin + 12, y - 12, 10, 10, 'F');
-      doc.setFontSize(22);
-      doc.setTextColor(34, 197, 94);
-      doc.setFont('helvetica', 'bold');
-      doc.text("DermaScan AI - Rapport d'analyse", pageWidth / 2, y, { align: "center" });
-      y += 10;
-      doc.setDrawColor(34, 197, 94);
-      doc.setLineWidth(1.2);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 6;
-
-      // --- Infos patient ---
-      doc.setFontSize(15);
-      doc.setTextColor(59, 130, 246);
-      doc.setFont('helvetica', 'bold');
-      doc.text("Informations du patient", margin, y);
-      y += 7;
-      doc.setDrawColor(200, 230, 201);
-      doc.setLineWidth(0.7);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 4;
-      doc.setFont('helvetica', 'normal');
-      doc.setFontSize(12);
-      doc.setTextColor(33, 37, 41);
-      doc.text(`Nom : ${prediction.patient_prenom || ""} ${prediction.patient_nom || ""}`, margin, y); y += 6;
-      doc.text(`Téléphone : ${prediction.telephone || ""}`, margin, y); y += 6;
-      doc.text(`Sexe : ${prediction.sexe || ""}`, margin, y); y += 6;
-      doc.text(`Âge : ${prediction.age || ""}`, margin, y); y += sectionSpace;
-
-      // --- Image analysée ---
-      doc.setFontSize(15);
-      doc.setTextColor(34, 197, 94);
-      doc.setFont('helvetica', 'bold');
-      doc.text("Image analysée", margin, y);
-      y += 7;
-      doc.setDrawColor(191, 219, 254);
-      doc.setLineWidth(0.7);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 4;
-
-      // Ajoute l'image si disponible
-      if (prediction.image_data) {
-        try {
-          const img = new Image();
-          img.src = `data:image/jpeg;base64,${prediction.image_data}`;
-          await new Promise((resolve) => {
-            img.onload = resolve;
-          });
-
-          // Calcule les dimensions pour que l'image tienne sur la page
-          const maxWidth = pageWidth - 2 * margin;
-          const maxHeight = 60;
-          let imgWidth = img.width;
-          let imgHeight = img.height;
-
-          if (imgWidth > maxWidth) {
-            const ratio = maxWidth / imgWidth;
-            imgWidth = maxWidth;
-            imgHeight = imgHeight * ratio;
-          }
-          if (imgHeight > maxHeight) {
-            const ratio = maxHeight / imgHeight;
-            imgHeight = maxHeight;
-            imgWidth = imgWidth * ratio;
-          }
-
-          const x = (pageWidth - imgWidth) / 2;
-          doc.addImage(img, 'JPEG', x, y, imgWidth, imgHeight);
-          y += imgHeight + 2;
-
-          doc.setFont('helvetica', 'italic');
-          doc.setFontSize(7);
-          doc.setTextColor(100, 100, 100);
-          doc.text("Image analysée par DermaScan AI", pageWidth / 2, y, { align: "center" });
-          y += 3;
-          y += 2;
-        } catch (error) {
-          console.error("Erreur lors de l'ajout de l'image au PDF:", error);
-          doc.setFont('helvetica', 'normal');
-          doc.setFontSize(12);
-          doc.setTextColor(33, 37, 41);
-          doc.text("Image non disponible", margin, y);
-          y += sectionSpace;
-        }
-      } else {
-        doc.setFont('helvetica', 'normal');
-        doc.setFontSize(12);
-        doc.setTextColor(33, 37, 41);
-        doc.text("Image non disponible", margin, y);
-        y += sectionSpace;
-      }
-
-      // --- Résultat principal ---
-      doc.setFontSize(15);
-      doc.setTextColor(34, 197, 94);
-      doc.setFont('helvetica', 'bold');
-      doc.text("Résultat de l'analyse", margin, y);
-        y += 7;
-      doc.setDrawColor(191, 219, 254);
-      doc.setLineWidth(0.7);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 4;
-      doc.setFont('helvetica', 'normal');
-      doc.setFontSize(12);
-      doc.setTextColor(33, 37, 41);
-      const dateStr = prediction.date ? new Date(prediction.date).toLocaleString('fr-FR', { dateStyle: 'short', timeStyle: 'short' }) : '';
-      doc.text(`Date de l'analyse : ${dateStr}`, margin, y); y += 6;
-      doc.text(`Maladie prédite : ${cleanDiseaseName(prediction.predicted_class)}`, margin, y); y += 6;
-      let confVal = '';
-      if (typeof prediction.confidence === 'number') {
-        confVal = (prediction.confidence <= 1 ? (prediction.confidence * 100).toFixed(1) : prediction.confidence.toFixed(1)) + '%';
-      } else if (typeof prediction.confidence === 'string') {
-        const numConf = parseFloat(prediction.confidence);
-        if (!isNaN(numConf)) {
-          confVal = (numConf <= 1 ? (numConf * 100).toFixed(1) : numConf.toFixed(1)) + '%';
-        } else {
-          confVal = prediction.confidence;
-        }
-      }
-      doc.text(`Confiance : ${confVal}`, margin, y); y += sectionSpace;
-
-      // --- Top 3 maladies ---
-      doc.setFontSize(13);
-      doc.setTextColor(59, 130, 246);
-      doc.setFont('helvetica', 'bold');
-      doc.text("Top 3 maladies les plus probables", margin, y);
-          y += 5;
-      doc.setDrawColor(191, 219, 254);
-      doc.setLineWidth(0.5);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 3;
-      doc.setFont('helvetica', 'normal');
-      doc.setFontSize(11);
-      doc.setTextColor(33, 37, 41);
-      if (top3 && top3.length > 0) {
-        const colors = [
-          { bg: [220, 252, 231], text: [22, 163, 74] },
-          { bg: [219, 234, 254], text: [37, 99, 235] },
-          { bg: [254, 243, 199], text: [202, 138, 4] }
-        ];
-        top3.forEach((item: any, idx: number) => {
-          const c = colors[idx] || { bg: [243, 244, 246], text: [55, 65, 81] };
-          const boxHeight = 18;
-          doc.setFillColor(c.bg[0], c.bg[1], c.bg[2]);
-          doc.roundedRect(margin, y, pageWidth - 2 * margin, boxHeight, 3, 3, 'F');
-          doc.setFont('helvetica', 'bold');
-          doc.setFontSize(11);
-          doc.setTextColor(c.text[0], c.text[1], c.text[2]);
-          doc.text(cleanDiseaseName(item.class_name), margin + 6, y + 11);
-          doc.setFont('helvetica', 'bold');
-          doc.setFontSize(10);
-          doc.setFillColor(255, 255, 255);
-          doc.setDrawColor(c.text[0], c.text[1], c.text[2]);
-          doc.roundedRect(pageWidth - margin - 28, y + 2, 24, 14, 4, 4, 'FD');
-          doc.setTextColor(c.text[0], c.text[1], c.text[2]);
-          const conf = (item.confidence <= 1 ? (item.confidence * 100).toFixed(1) : item.confidence.toFixed(1)) + '%';
-          doc.text(conf, pageWidth - margin - 16, y + 12, { align: 'center' });
-          const key = Object.keys(adviceJson).find((k: string) => item.class_name.includes(k));
-          if (key && adviceJson[key]?.description) {
-            doc.setFont('helvetica', 'italic');
-            doc.setFontSize(9);
-            doc.setTextColor(100, 100, 100);
-            const desc = doc.splitTextToSize(adviceJson[key].description, pageWidth - 2 * margin - 12);
-            doc.setFillColor(243, 244, 246);
-            doc.roundedRect(margin + 4, y + boxHeight + 1, pageWidth - 2 * margin - 8, desc.length * 5 + 4, 2, 2, 'F');
-            doc.text(desc, margin + 6, y + boxHeight + 6);
-            y += boxHeight + desc.length * 5 + 12;
-          } else {
-            y += boxHeight + 6;
-              }
-            });
-          } else {
-        doc.text("Non disponible.", margin + 3, y); y += 5;
-      }
-      y += 2;
-
-      // --- Tableau de profils cliniques ---
-      if (top3.length >= 2) {
-        function findProfileKey(disease: string) {
-          let mainName = disease
-            .replace(/^\d+\.\s*/, "")
-            .replace(/-\s*\d+(\.\d+)?[kK]?/, "")
-            .replace(/\([^)]+\)/g, "")
-            .replace(/[^a-zA-Z\s]/g, "")
-            .replace(/\s+/g, " ")
-            .trim()
-            .toLowerCase();
-          const diseaseWords = mainName.split(" ").filter((w: string) => w.length > 2);
-          let bestKey = Object.keys(profilesJson).find((key: string) => {
-            const keyLow = key.toLowerCase();
-            return diseaseWords.every((word: string) => keyLow.includes(word));
-          });
-          if (!bestKey && diseaseWords.length > 0) {
-            bestKey = Object.keys(profilesJson).find((key: string) => {
-              const keyLow = key.toLowerCase();
-              return diseaseWords.some((word: string) => keyLow.includes(word));
-            });
-          }
-          if (!bestKey) {
-            bestKey = Object.keys(profilesJson).find(key =>
-              key.toLowerCase().startsWith(mainName.split(" ")[0])
-            );
-          }
-          return bestKey;
-        }
-
-        const selectedProfiles = top3
-          .map((d: any) => {
-            const key = findProfileKey(d.class_name);
-            return key ? { name: key, data: profilesJson[key] } : null;
-          })
-          .filter(Boolean);
-
-        if (selectedProfiles.length >= 2) {
-          const allKeys = selectedProfiles.map((p: any) => p ? Object.keys(p.data) : []);
-          const commonKeys = allKeys.reduce((a: string[], b: string[]) => a.filter((k: string) => b.includes(k)), allKeys[0] || []);
-
-          if (commonKeys.length > 0) {
-            doc.addPage();
-            y = 20;
-
-            doc.setFontSize(15);
-            doc.setTextColor(34, 197, 94);
-            doc.setFont('helvetica', 'bold');
-            doc.text("Tableau de comparaison clinique", margin, y);
-            y += 7;
-            doc.setDrawColor(59, 130, 246);
-            doc.setLineWidth(0.7);
-            doc.line(margin, y, pageWidth - margin, y);
-            y += 4;
-            y += 10;
-
-            const totalCols = 1 + selectedProfiles.length;
-            const tableWidth = pageWidth - 2 * margin;
-            const colWidth = Math.floor(tableWidth / totalCols);
-            const colWidths = Array(totalCols).fill(colWidth);
-            colWidths[colWidths.length - 1] = tableWidth - colWidth * (totalCols - 1);
-            let rowY = y;
-
-            let x = margin;
-            doc.setFont('helvetica', 'bold');
-            doc.setFontSize(9);
-            
-            const headerColors = [
-              [220, 252, 231],
-              [219, 234, 254],
-              [254, 243, 199]
-            ];
-
-            const headerLines = [doc.splitTextToSize('CRITÈRE', colWidths[0] - 6)];
-            selectedProfiles.forEach((p: any, idx: number) => {
-              headerLines.push(doc.splitTextToSize(p.name.toUpperCase(), colWidths[idx + 1] - 6));
-        });
-            const headerHeight = Math.max(...headerLines.map(l => l.length)) * 4 + 6;
-
-            for (let c = 0; c < colWidths.length; c++) {
-              const color = c === 0 ? headerColors[0] : headerColors[(c - 1) % headerColors.length];
-              doc.setFillColor(color[0], color[1], color[2]);
-              doc.rect(x, rowY, colWidths[c], headerHeight, 'F');
-              
-              doc.setTextColor(44, 62, 80);
-              headerLines[c].forEach((line: string, lidx: number) => {
-                doc.text(line, x + 3, rowY + 8 + lidx * 4);
-              });
-              x += colWidths[c];
-            }
-            rowY += headerHeight + 1;
-
-            doc.setFont('helvetica', 'normal');
-            doc.setFontSize(7);
-            commonKeys.forEach((crit: string, idx: number) => {
-              x = margin;
-              const rowVals = [
-                crit.toLowerCase(), 
-                ...selectedProfiles.map((p: any) => (p.data[crit] || "-").toLowerCase())
-              ];
-              const cellHeights = rowVals.map((val, i) => {
-                const split = doc.splitTextToSize(val, colWidths[i] - 8);
-                return split.length * 3.2;
-              });
-              const rowHeight = Math.max(...cellHeights, 7) + 4;
-
-              for (let c = 0; c < colWidths.length; c++) {
-                if (idx % 2 === 0) {
-                  doc.setFillColor(236, 240, 241);
-      } else {
-                  doc.setFillColor(255, 255, 255);
-                }
-                doc.rect(x, rowY, colWidths[c], rowHeight, 'F');
-                
-                doc.setDrawColor(200, 200, 200);
-                doc.rect(x, rowY, colWidths[c], rowHeight);
-
-                if (c === 0) {
-                  doc.setTextColor(44, 62, 80);
-                } else {
-                  doc.setTextColor(41, 128, 185);
-                }
-                const split = doc.splitTextToSize(rowVals[c], colWidths[c] - 8);
-                for (let l = 0; l < split.length; l++) {
-                  doc.text(split[l], x + 4, rowY + 7 + l * 3.2);
-                }
-                x += colWidths[c];
-              }
-              rowY += rowHeight;
-
-              if (rowY > 260) {
-                doc.addPage();
-                rowY = 20;
-              }
-            });
-            y = rowY + 8;
-
-            const lastColWidth = Math.max(colWidths[colWidths.length - 1], 45);
-            if (lastColWidth > colWidths[colWidths.length - 1]) {
-              const totalWidth = tableWidth - lastColWidth;
-              const remainingCols = colWidths.length - 1;
-              const newColWidth = Math.floor(totalWidth / remainingCols);
-              colWidths.fill(newColWidth, 0, remainingCols);
-              colWidths[colWidths.length - 1] = lastColWidth;
-            }
-
-            y += 10;
-          }
-        }
-      }
-
-      // --- Tableaux de comparaison entre maladies proches ---
-      if (top3.length >= 2) {
-        const pairs = getAllPairs(top3.map((p: any) => p.class_name));
-        pairs.forEach(([d1, d2]) => {
-          function getSimpleName(d: string) {
-            const parts = d.split(/[ .-]/).filter(Boolean);
-            if (parts.length > 1) {
-              return parts[1].toLowerCase().replace(/[^a-z]/gi, "");
-            }
-            return d.toLowerCase().replace(/[^a-z]/gi, "");
-          }
-          const s1 = getSimpleName(d1);
-          const s2 = getSimpleName(d2);
-          const key = Object.keys(comparisonsJson).find(k => {
-            const keyNorm = k
-              .toLowerCase()
-              .replace(/[^a-z_]/g, "")
-              .split("_vs_")
-              .sort()
-              .join("_vs_");
-            const pairNorm = [s1, s2].sort().join("_vs_");
-            return keyNorm === pairNorm;
-          });
-          if (key) {
-            const criteres = comparisonsJson[key]?.["critères"];
-            if (criteres && criteres.length > 0) {
-              doc.setFont('helvetica', 'bold');
-              doc.setFontSize(13);
-              doc.setTextColor(34, 34, 34);
-              doc.text(`Comparaison : ${d1} / ${d2}`, margin, y);
-        y += 7;
-              doc.setDrawColor(180, 180, 180);
-              doc.setLineWidth(0.3);
-              doc.line(margin, y, pageWidth - margin, y);
-              y += 4;
-              const tableWidth = pageWidth - 2 * margin;
-              const colWidths = [Math.floor(tableWidth / 3), Math.floor(tableWidth / 3), tableWidth - 2 * Math.floor(tableWidth / 3)];
-              const d1Lines = doc.splitTextToSize(d1, colWidths[1] - 8);
-              const d2Lines = doc.splitTextToSize(d2, colWidths[2] - 8);
-              const headerHeight = Math.max(d1Lines.length, d2Lines.length, 1) * 6 + 6;
-              let rowY = y;
-              let x = margin;
-              doc.setFont('helvetica', 'bold');
-              doc.setFontSize(11);
-              doc.rect(x, rowY, colWidths[0], headerHeight);
-              doc.text('Critère', x + 4, rowY + 10);
-              x += colWidths[0];
-              doc.rect(x, rowY, colWidths[1], headerHeight);
-              d1Lines.forEach((line: string, lidx: number) => {
-                doc.text(line, x + 4, rowY + 10 + lidx * 6);
-              });
-              x += colWidths[1];
-              doc.rect(x, rowY, colWidths[2], headerHeight);
-              d2Lines.forEach((line: string, lidx: number) => {
-                doc.text(line, x + 4, rowY + 10 + lidx * 6);
-              });
-              rowY += headerHeight;
-              doc.setFont('helvetica', 'normal');
-              doc.setFontSize(10);
-              criteres.forEach((crit: any, idx: number) => {
-                x = margin;
-                const simple1 = getSimpleName(d1);
-                const simple2 = getSimpleName(d2);
-                const val1 = crit[simple1] !== undefined ? crit[simple1] : crit[d1.toLowerCase()] !== undefined ? crit[d1.toLowerCase()] : "-";
-                const val2 = crit[simple2] !== undefined ? crit[simple2] : crit[d2.toLowerCase()] !== undefined ? crit[d2.toLowerCase()] : "-";
-                const rowVals = [crit.nom, val1, val2];
-                const cellHeights = rowVals.map((val, i) => {
-                  const split = doc.splitTextToSize(val, colWidths[i] - 8);
-                  return split.length * 5;
-                });
-                const rowHeight = Math.max(...cellHeights, 10) + 4;
-                for (let c = 0; c < colWidths.length; c++) {
-                  doc.rect(margin + colWidths.slice(0, c).reduce((a, b) => a + b, 0), rowY, colWidths[c], rowHeight);
-                  const split = doc.splitTextToSize(rowVals[c], colWidths[c] - 8);
-                  for (let l = 0; l < split.length; l++) {
-                    doc.text(split[l], margin + colWidths.slice(0, c).reduce((a, b) => a + b, 0) + 4, rowY + 9 + l * 5);
-                  }
-                }
-                rowY += rowHeight;
-                if (rowY > 270) { doc.addPage(); rowY = 20; }
-              });
-              y = rowY + 5;
-            }
-          }
-        });
-      }
-
-      // --- Notes du médecin ---
-      doc.setFont('helvetica', 'bold');
-      doc.setFontSize(14);
-      doc.setTextColor(34, 197, 94);
-      doc.text("Notes du médecin", margin, y);
-      y += 7;
-      doc.setDrawColor(200, 230, 201);
-      doc.setLineWidth(0.5);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 4;
-      doc.setFont('helvetica', 'normal');
-      doc.setFontSize(12);
-      doc.setTextColor(33, 37, 41);
-      if (notesData.notes && notesData.notes.length > 0) {
-        notesData.notes.forEach((n: any, i: number) => {
-          const noteText = `- ${n.note} (${new Date(n.date).toLocaleString("fr-FR")})`;
-          const split = doc.splitTextToSize(noteText, pageWidth - 2 * margin - 8);
-          doc.text(split, margin + 3, y);
-          y += split.length * 6;
-          if (y > 270) { doc.addPage(); y = 20; }
-        });
-      } else {
-        doc.text("Aucune note enregistrée.", margin + 3, y); y += 7;
-      }
-
-      y += 10;
-      doc.setFont('helvetica', 'italic');
-      doc.setTextColor(100, 100, 100);
-      doc.setFontSize(11);
-      doc.text("Merci d'utiliser DermaScan AI.", margin, y);
-
-      // Pied de page
-      doc.setFontSize(9);
-      doc.setTextColor(180, 180, 180);
-      doc.text("Rapport généré automatiquement - DermaScan AI", pageWidth / 2, 290, { align: "center" });
-
-      // Sauvegarde du PDF
-      const fileName = `rapport_${prediction.patient_nom || "patient"}_${prediction.id}.pdf`;
-      doc.save(fileName);
+      // PDF généré (et mis en cache) par le backend à partir de l'analyse enregistrée
+      await downloadReport(`/prediction/${result.prediction_id}/report`, token, `rapport_patient_${result.prediction_id}.pdf`);
     } catch (error) {
       console.error('Erreur lors de la génération du rapport:', error);
       alert("Erreur lors de la génération du rapport PDF.");
@@ -782,506 +301,22 @@ const Medecin: React.FC<{ token: string }> = ({ token }) => {
   // Ajouter la fonction handleDownloadReport
   const handleDownloadReport = async (prediction: Prediction) => {
     try {
-      // Récupère les notes du médecin
-      const notesRes = await fetch(`${API_URL}/prediction/${prediction.id}/notes`, {
-        headers: { 
-          Authorization: `Bearer ${token}`,
-          'Content-Type': 'application/json'
-        }
-      });
-      const notesData = await notesRes.json();
-
-      // Récupère les JSON nécessaires pour conseils, profils et comparaisons
-      const [adviceJson, profilesJson, comparisonsJson] = await Promise.all([
-        fetch("/disease_advice.json").then(r => r.json()).catch(() => ({})),
-        fetch("/disease_profiles.json").then(r => r.json()).catch(() => ({})),
-        fetch("/comparisons.json").then(r => r.json()).catch(() => ({}))
-      ]);
-
-      // Top 3 maladies
-      let top3 = [];
-      try {
-        top3 = Array.isArray(prediction.top_predictions)
-          ? prediction.top_predictions
-          : JSON.parse(prediction.top_predictions || "[]");
-      } catch {
-        top3 = [];
-      }
-
-      function getAllPairs(arr: string[]): [string, string][] {
-        const pairs: [string, string][] = [];
-        for (let i = 0; i < arr.length; i++) {
-          for (let j = i + 1; j < arr.length; j++) {
-            pairs.push([arr[i], arr[j]]);
-          }
-        }
-        return pairs;
-      }
-
-      // --- PDF PRO ---
-      const doc = new jsPDF();
-      let y = 20;
-      const pageWidth = doc.internal.pageSize.getWidth();
-      const margin = 18;
-      const sectionSpace = 12;
-
-      // Logo DermaScan AI (simple carré bleu/vert)
-      doc.setFillColor(34, 197, 94); // vert
-      doc.rect(margin, y - 12, 10, 10, 'F');
-      doc.setFillColor(59, 130, 246); // bleu
-      doc.rect(margin + 12, y - 12, 10, 10, 'F');
-      doc.setFontSize(22);
-      doc.setTextColor(34, 197, 94);
-      doc.setFont('helvetica', 'bold');
-      doc.text("DermaScan AI - Rapport d'analyse", pageWidth / 2, y, { align: "center" });
-      y += 10;
-      doc.setDrawColor(34, 197, 94);
-      doc.setLineWidth(1.2);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 6;
-
-      // --- Infos patient ---
-      doc.setFontSize(15);
-      doc.setTextColor(59, 130, 246);
-      doc.setFont('helvetica', 'bold');
-      doc.text("Informations du patient", margin, y);
-      y += 7;
-      doc.setDrawColor(200, 230, 201);
-      doc.setLineWidth(0.7);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 4;
-      doc.setFont('helvetica', 'normal');
-      doc.setFontSize(12);
-      doc.setTextColor(33, 37, 41);
-      doc.text(`Nom : ${prediction.patient_prenom || ""} ${prediction.patient_nom || ""}`, margin, y); y += 6;
-      doc.text(`Téléphone : ${prediction.telephone || ""}`, margin, y); y += 6;
-      doc.text(`Sexe : ${prediction.sexe || ""}`, margin, y); y += 6;
-      doc.text(`Âge : ${prediction.age || ""}`, margin, y); y += sectionSpace;
-
-      // --- Image analysée ---
-      doc.setFontSize(15);
-      doc.setTextColor(34, 197, 94);
-      doc.setFont('helvetica', 'bold');
-      doc.text("Image analysée", margin, y);
-      y += 7;
-      doc.setDrawColor(191, 219, 254);
-      doc.setLineWidth(0.7);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 4;
-
-      // Ajoute l'image si disponible
-      if (prediction.image_data) {
-        try {
-          const img = new Image();
-          img.src = `data:image/jpeg;base64,${prediction.image_data}`;
-          await new Promise((resolve) => {
-            img.onload = resolve;
-          });
-
-          // Calcule les dimensions pour que l'image tienne sur la page
-          const maxWidth = pageWidth - 2 * margin;
-          const maxHeight = 60;
-          let imgWidth = img.width;
-          let imgHeight = img.height;
-
-          if (imgWidth > maxWidth) {
-            const ratio = maxWidth / imgWidth;
-            imgWidth = maxWidth;
-            imgHeight = imgHeight * ratio;
-          }
-          if (imgHeight > maxHeight) {
-            const ratio = maxHeight / imgHeight;
-            imgHeight = maxHeight;
-            imgWidth = imgWidth * ratio;
-          }
-
-          const x = (pageWidth - imgWidth) / 2;
-          doc.addImage(img, 'JPEG', x, y, imgWidth, imgHeight);
-          y += imgHeight + 2;
-
-          doc.setFont('helvetica', 'italic');
-          doc.setFontSize(7);
-          doc.setTextColor(100, 100, 100);
-          doc.text("Image analysée par DermaScan AI", pageWidth / 2, y, { align: "center" });
-          y += 3;
-          y += 2;
-        } catch (error) {
-          console.error("Erreur lors de l'ajout de l'image au PDF:", error);
-          doc.setFont('helvetica', 'normal');
-          doc.setFontSize(12);
-          doc.setTextColor(33, 37, 41);
-          doc.text("Image non disponible", margin, y);
-          y += sectionSpace;
-        }
-      } else {
-        doc.setFont('helvetica', 'normal');
-        doc.setFontSize(12);
-        doc.setTextColor(33, 37, 41);
-        doc.text("Image non disponible", margin, y);
-        y += sectionSpace;
-      }
-
-      // --- Résultat principal ---
-      doc.setFontSize(15);
-      doc.setTextColor(34, 197, 94);
-      doc.setFont('helvetica', 'bold');
-      doc.text("Résultat de l'analyse", margin, y);
-      y += 7;
-      doc.setDrawColor(191, 219, 254);
-      doc.setLineWidth(0.7);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 4;
-      doc.setFont('helvetica', 'normal');
-      doc.setFontSize(12);
-      doc.setTextColor(33, 37, 41);
-      const dateStr = prediction.date ? new Date(prediction.date).toLocaleString('fr-FR', { dateStyle: 'short', timeStyle: 'short' }) : '';
-      doc.text(`Date de l'analyse : ${dateStr}`, margin, y); y += 6;
-      doc.text(`Maladie prédite : ${cleanDiseaseName(prediction.predicted_class)}`, margin, y); y += 6;
-      let confVal = '';
-      if (typeof prediction.confidence === 'number') {
-        confVal = (prediction.confidence <= 1 ? (prediction.confidence * 100).toFixed(1) : prediction.confidence.toFixed(1)) + '%';
-      } else if (typeof prediction.confidence === 'string') {
-        const numConf = parseFloat(prediction.confidence);
-        if (!isNaN(numConf)) {
-          confVal = (numConf <= 1 ? (numConf * 100).toFixed(1) : numConf.toFixed(1)) + '%';
-        } else {
-          confVal = prediction.confidence;
-        }
-      }
-      doc.text(`Confiance : ${confVal}`, margin, y); y += sectionSpace;
-
-      // --- Top 3 maladies ---
-      doc.setFontSize(13);
-      doc.setTextColor(59, 130, 246);
-      doc.setFont('helvetica', 'bold');
-      doc.text("Top 3 maladies les plus probables", margin, y);
-      y += 5;
-      doc.setDrawColor(191, 219, 254);
-      doc.setLineWidth(0.5);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 3;
-      doc.setFont('helvetica', 'normal');
-      doc.setFontSize(11);
-      doc.setTextColor(33, 37, 41);
-      if (top3 && top3.length > 0) {
-        const colors = [
-          { bg: [220, 252, 231], text: [22, 163, 74] },
-          { bg: [219, 234, 254], text: [37, 99, 235] },
-          { bg: [254, 243, 199], text: [202, 138, 4] }
-        ];
-        top3.forEach((item: any, idx: number) => {
-          const c = colors[idx] || { bg: [243, 244, 246], text: [55, 65, 81] };
-          const boxHeight = 18;
-          doc.setFillColor(c.bg[0], c.bg[1], c.bg[2]);
-          doc.roundedRect(margin, y, pageWidth - 2 * margin, boxHeight, 3, 3, 'F');
-          doc.setFont('helvetica', 'bold');
-          doc.setFontSize(11);
-          doc.setTextColor(c.text[0], c.text[1], c.text[2]);
-          doc.text(cleanDiseaseName(item.class_name), margin + 6, y + 11);
-          doc.setFont('helvetica', 'bold');
-          doc.setFontSize(10);
-          doc.setFillColor(255, 255, 255);
-          doc.setDrawColor(c.text[0], c.text[1], c.text[2]);
-          doc.roundedRect(pageWidth - margin - 28, y + 2, 24, 14, 4, 4, 'FD');
-          doc.setTextColor(c.text[0], c.text[1], c.text[2]);
-          const conf = (item.confidence <= 1 ? (item.confidence * 100).toFixed(1) : item.confidence.toFixed(1)) + '%';
-          doc.text(conf, pageWidth - margin - 16, y + 12, { align: 'center' });
-          const key = Object.keys(adviceJson).find((k: string) => item.class_name.includes(k));
-          if (key && adviceJson[key]?.description) {
-            doc.setFont('helvetica', 'italic');
-            doc.setFontSize(9);
-            doc.setTextColor(100, 100, 100);
-            const desc = doc.splitTextToSize(adviceJson[key].description, pageWidth - 2 * margin - 12);
-            doc.setFillColor(243, 244, 246);
-            doc.roundedRect(margin + 4, y + boxHeight + 1, pageWidth - 2 * margin - 8, desc.length * 5 + 4, 2, 2, 'F');
-            doc.text(desc, margin + 6, y + boxHeight + 6);
-            y += boxHeight + desc.length * 5 + 12;
-          } else {
-            y += boxHeight + 6;
-          }
-        });
-      } else {
-        doc.text("Non disponible.", margin + 3, y); y += 5;
-      }
-      y += 2;
-
-      // --- Tableau de profils cliniques ---
-      if (top3.length >= 2) {
-        function findProfileKey(disease: string) {
-          let mainName = disease
-            .replace(/^\d+\.\s*/, "")
-            .replace(/-\s*\d+(\.\d+)?[kK]?/, "")
-            .replace(/\([^)]+\)/g, "")
-            .replace(/[^a-zA-Z\s]/g, "")
-            .replace(/\s+/g, " ")
-            .trim()
-            .toLowerCase();
-          const diseaseWords = mainName.split(" ").filter((w: string) => w.length > 2);
-          let bestKey = Object.keys(profilesJson).find((key: string) => {
-            const keyLow = key.toLowerCase();
-            return diseaseWords.every((word: string) => keyLow.includes(word));
-          });
-          if (!bestKey && diseaseWords.length > 0) {
-            bestKey = Object.keys(profilesJson).find((key: string) => {
-              const keyLow = key.toLowerCase();
-              return diseaseWords.some((word: string) => keyLow.includes(word));
-            });
-          }
-          if (!bestKey) {
-            bestKey = Object.keys(profilesJson).find(key =>
-              key.toLowerCase().startsWith(mainName.split(" ")[0])
-            );
-          }
-          return bestKey;
-        }
-
-        const selectedProfiles = top3
-          .map((d: any) => {
-            const key = findProfileKey(d.class_name);
-            return key ? { name: key, data: profilesJson[key] } : null;
-          })
-          .filter(Boolean);
-
-        if (selectedProfiles.length >= 2) {
-          const allKeys = selectedProfiles.map((p: any) => p ? Object.keys(p.data) : []);
-          const commonKeys = allKeys.reduce((a: string[], b: string[]) => a.filter((k: string) => b.includes(k)), allKeys[0] || []);
-
-          if (commonKeys.length > 0) {
-            doc.addPage();
-            y = 20;
-
-            doc.setFontSize(15);
-            doc.setTextColor(34, 197, 94);
-            doc.setFont('helvetica', 'bold');
-            doc.text("Tableau de comparaison clinique", margin, y);
-            y += 7;
-            doc.setDrawColor(59, 130, 246);
-            doc.setLineWidth(0.7);
-            doc.line(margin, y, pageWidth - margin, y);
-            y += 4;
-            y += 10;
-
-            const totalCols = 1 + selectedProfiles.length;
-            const tableWidth = pageWidth - 2 * margin;
-            const colWidth = Math.floor(tableWidth / totalCols);
-            const colWidths = Array(totalCols).fill(colWidth);
-            colWidths[colWidths.length - 1] = tableWidth - colWidth * (totalCols - 1);
-            let rowY = y;
-
-            let x = margin;
-            doc.setFont('helvetica', 'bold');
-            doc.setFontSize(9);
-            
-            const headerColors = [
-              [220, 252, 231],
-              [219, 234, 254],
-              [254, 243, 199]
-            ];
-
-            const headerLines = [doc.splitTextToSize('CRITÈRE', colWidths[0] - 6)];
-            selectedProfiles.forEach((p: any, idx: number) => {
-              headerLines.push(doc.splitTextToSize(p.name.toUpperCase(), colWidths[idx + 1] - 6));
-        });
-            const headerHeight = Math.max(...headerLines.map(l => l.length)) * 4 + 6;
-
-            for (let c = 0; c < colWidths.length; c++) {
-              const color = c === 0 ? headerColors[0] : headerColors[(c - 1) % headerColors.length];
-              doc.setFillColor(color[0], color[1], color[2]);
-              doc.rect(x, rowY, colWidths[c], headerHeight, 'F');
-              
-              doc.setTextColor(44, 62, 80);
-              headerLines[c].forEach((line: string, lidx: number) => {
-                doc.text(line, x + 3, rowY + 8 + lidx * 4);
-              });
-              x += colWidths[c];
-            }
-            rowY += headerHeight + 1;
-
-            doc.setFont('helvetica', 'normal');
-            doc.setFontSize(7);
-            commonKeys.forEach((crit: string, idx: number) => {
-              x = margin;
-              const rowVals = [
-                crit.toLowerCase(), 
-                ...selectedProfiles.map((p: any) => (p.data[crit] || "-").toLowerCase())
-              ];
-              const cellHeights = rowVals.map((val, i) => {
-                const split = doc.splitTextToSize(val, colWidths[i] - 8);
-                return split.length * 3.2;
-              });
-              const rowHeight = Math.max(...cellHeights, 7) + 4;
-
-              for (let c = 0; c < colWidths.length; c++) {
-                if (idx % 2 === 0) {
-                  doc.setFillColor(236, 240, 241);
-      } else {
-                  doc.setFillColor(255, 255, 255);
-                }
-                doc.rect(x, rowY, colWidths[c], rowHeight, 'F');
-                
-                doc.setDrawColor(200, 200, 200);
-                doc.rect(x, rowY, colWidths[c], rowHeight);
-
-                if (c === 0) {
-                  doc.setTextColor(44, 62, 80);
-                } else {
-                  doc.setTextColor(41, 128, 185);
-                }
-                const split = doc.splitTextToSize(rowVals[c], colWidths[c] - 8);
-                for (let l = 0; l < split.length; l++) {
-                  doc.text(split[l], x + 4, rowY + 7 + l * 3.2);
-                }
-                x += colWidths[c];
-              }
-              rowY += rowHeight;
-
-              if (rowY > 260) {
-                doc.addPage();
-                rowY = 20;
-              }
-            });
-            y = rowY + 8;
-
-            const lastColWidth = Math.max(colWidths[colWidths.length - 1], 45);
-            if (lastColWidth > colWidths[colWidths.length - 1]) {
-              const totalWidth = tableWidth - lastColWidth;
-              const remainingCols = colWidths.length - 1;
-              const newColWidth = Math.floor(totalWidth / remainingCols);
-              colWidths.fill(newColWidth, 0, remainingCols);
-              colWidths[colWidths.length - 1] = lastColWidth;
-            }
-
-            y += 10;
-          }
-        }
-      }
-
-      // --- Tableaux de comparaison entre maladies proches ---
-      if (top3.length >= 2) {
-        const pairs = getAllPairs(top3.map((p: any) => p.class_name));
-        pairs.forEach(([d1, d2]) => {
-          function getSimpleName(d: string) {
-            const parts = d.split(/[ .-]/).filter(Boolean);
-            if (parts.length > 1) {
-              return parts[1].toLowerCase().replace(/[^a-z]/gi, "");
-            }
-            return d.toLowerCase().replace(/[^a-z]/gi, "");
-          }
-          const s1 = getSimpleName(d1);
-          const s2 = getSimpleName(d2);
-          const key = Object.keys(comparisonsJson).find(k => {
-            const keyNorm = k
-              .toLowerCase()
-              .replace(/[^a-z_]/g, "")
-              .split("_vs_")
-              .sort()
-              .join("_vs_");
-            const pairNorm = [s1, s2].sort().join("_vs_");
-            return keyNorm === pairNorm;
-          });
-          if (key) {
-            const criteres = comparisonsJson[key]?.["critères"];
-            if (criteres && criteres.length > 0) {
-              doc.setFont('helvetica', 'bold');
-              doc.setFontSize(13);
-              doc.setTextColor(34, 34, 34);
-              doc.text(`Comparaison : ${d1} / ${d2}`, margin, y);
-        y += 7;
-              doc.setDrawColor(180, 180, 180);
-              doc.setLineWidth(0.3);
-              doc.line(margin, y, pageWidth - margin, y);
-              y += 4;
-              const tableWidth = pageWidth - 2 * margin;
-              const colWidths = [Math.floor(tableWidth / 3), Math.floor(tableWidth / 3), tableWidth - 2 * Math.floor(tableWidth / 3)];
-              const d1Lines = doc.splitTextToSize(d1, colWidths[1] - 8);
-              const d2Lines = doc.splitTextToSize(d2, colWidths[2] - 8);
-              const headerHeight = Math.max(d1Lines.length, d2Lines.length, 1) * 6 + 6;
-              let rowY = y;
-              let x = margin;
-              doc.setFont('helvetica', 'bold');
-              doc.setFontSize(11);
-              doc.rect(x, rowY, colWidths[0], headerHeight);
-              doc.text('Critère', x + 4, rowY + 10);
-              x += colWidths[0];
-              doc.rect(x, rowY, colWidths[1], headerHeight);
-              d1Lines.forEach((line: string, lidx: number) => {
-                doc.text(line, x + 4, rowY + 10 + lidx * 6);
-              });
-              x += colWidths[1];
-              doc.rect(x, rowY, colWidths[2], headerHeight);
-              d2Lines.forEach((line: string, lidx: number) => {
-                doc.text(line, x + 4, rowY + 10 + lidx * 6);
-              });
-              rowY += headerHeight;
-              doc.setFont('helvetica', 'normal');
-              doc.setFontSize(10);
-              criteres.forEach((crit: any, idx: number) => {
-                x = margin;
-                const simple1 = getSimpleName(d1);
-                const simple2 = getSimpleName(d2);
-                const val1 = crit[simple1] !== undefined ? crit[simple1] : crit[d1.toLowerCase()] !== undefined ? crit[d1.toLowerCase()] : "-";
-                const val2 = crit[simple2] !== undefined ? crit[simple2] : crit[d2.toLowerCase()] !== undefined ? crit[d2.toLowerCase()] : "-";
-                const rowVals = [crit.nom, val1, val2];
-                const cellHeights = rowVals.map((val, i) => {
-                  const split = doc.splitTextToSize(val, colWidths[i] - 8);
-                  return split.length * 5;
-                });
-                const rowHeight = Math.max(...cellHeights, 10) + 4;
-                for (let c = 0; c < colWidths.length; c++) {
-                  doc.rect(margin + colWidths.slice(0, c).reduce((a, b) => a + b, 0), rowY, colWidths[c], rowHeight);
-                  const split = doc.splitTextToSize(rowVals[c], colWidths[c] - 8);
-                  for (let l = 0; l < split.length; l++) {
-                    doc.text(split[l], margin + colWidths.slice(0, c).reduce((a, b) => a + b, 0) + 4, rowY + 9 + l * 5);
-                  }
-                }
-                rowY += rowHeight;
-                if (rowY > 270) { doc.addPage(); rowY = 20; }
-              });
-              y = rowY + 5;
-            }
-          }
-        });
-      }
-
-      // --- Notes du médecin ---
-      doc.setFont('helvetica', 'bold');
-      doc.setFontSize(14);
-      doc.setTextColor(34, 197, 94);
-      doc.text("Notes du médecin", margin, y);
-      y += 7;
-      doc.setDrawColor(200, 230, 201);
-      doc.setLineWidth(0.5);
-      doc.line(margin, y, pageWidth - margin, y);
-      y += 4;
-      doc.setFont('helvetica', 'normal');
-      doc.setFontSize(12);
-      doc.setTextColor(33, 37, 41);
-      if (notesData.notes && notesData.notes.length > 0) {
-        notesData.notes.forEach((n: any, i: number) => {
-          const noteText = `- ${n.note} (${new Date(n.date).toLocaleString("fr-FR")})`;
-          const split = doc.splitTextToSize(noteText, pageWidth - 2 * margin - 8);
-          doc.text(split, margin + 3, y);
-          y += split.length * 6;
-          if (y > 270) { doc.addPage(); y = 20; }
-        });
-      } else {
-        doc.text("Aucune note enregistrée.", margin + 3, y); y += 7;
-      }
-
-      y += 10;
-      doc.setFont('helvetica', 'italic');
-      doc.setTextColor(100, 100, 100);
-      doc.setFontSize(11);
-      doc.text("Merci d'utiliser DermaScan AI.", margin, y);
-
-      // Pied de page
-      doc.setFontSize(9);
-      doc.setTextColor(180, 180, 180);
-      doc.text("Rapport généré automatiquement - DermaScan AI", pageWidth / 2, 290, { align: "center" });
+      // PDF généré (et mis en cache) par le backend à partir de l'analyse enregistrée
+      await downloadReport(`/prediction/${prediction.id}/report`, token, `rapport_${prediction.patient_nom || "patient"}_${prediction.id}.pdf`);
+    } catch (error) {
+      console.error('Erreur lors de la génération du rapport:', error);
+      alert("Erreur lors de la génération du rapport PDF.");
+    }
+  };
 
-      // Sauvegarde du PDF
-      const fileName = `rapport_${prediction.patient_nom || "patient"}_${prediction.id}.pdf`;
-      doc.save(fileName);
+  // Rapport PDF de toutes les analyses d'un patient (même nom et prénom), généré par le backend
+  const handleDownloadPatientHistory = async (prediction: Prediction) => {
+    const params = new URLSearchParams({
+      patient_nom: prediction.patient_nom || "",
+      patient_prenom: prediction.patient_prenom || "",
+    });
+    try {
+      await downloadReport(`/reports/history?${params}`, token, `rapport_historique_${prediction.patient_nom || "patient"}.pdf`);
     } catch (error) {
       console.error('Erreur lors de la génération du rapport:', error);
       alert("Erreur lors de la génération du rapport PDF.");
@@ -1314,7 +349,7 @@ const Medecin: React.FC<{ token: string }> = ({ token }) => {
           <div className="hidden md:flex items-center gap-4">
             <button
               className="flex items-center gap-2 px-4 py-2 rounded-xl bg-green-100 hover:bg-green-200 text-green-700 font-semibold shadow transition"
-              onClick={fetchHistory}
+              onClick={() => fetchHistory()}
               title="Voir l'historique"
             >
               <History size={20} /> Historique
@@ -1686,10 +721,10 @@ const Medecin: React.FC<{ token: string }> = ({ token }) => {
 
                       {/* Image de la prédiction */}
                       <div className="w-full mb-6">
-                        {selectedHistory.image_data ? (
+                        {selectedImageUrl ? (
                           <div className="relative w-full h-64 rounded-xl overflow-hidden shadow-lg">
                             <img 
-                              src={`data:image/jpeg;base64,${selectedHistory.image_data}`}
+                              src={selectedImageUrl}
                               alt="Image de la prédiction"
                               className="w-full h-full object-contain bg-white"
                             />
@@ -1713,6 +748,15 @@ const Medecin: React.FC<{ token: string }> = ({ token }) => {
                               <rect x="2" y="9" width="20" height="6" rx="3" fill="#22c55e" />
                             </svg>
                             Informations du patient
+                            {(selectedHistory.patient_nom || selectedHistory.patient_prenom) && (
+                              <button
+                                className="ml-auto flex items-center gap-1 px-3 py-1 rounded-lg bg-green-100 hover:bg-green-200 text-green-700 font-semibold shadow transition text-sm"
+                                onClick={() => handleDownloadPatientHistory(selectedHistory)}
+                                title="Télécharger le rapport de toutes les analyses de ce patient"
+                              >
+                                <Download size={16} /> Rapport complet
+                              </button>
+                            )}
                           </div>
                           <div className="grid grid-cols-1 sm:grid-cols-2 gap-x-8 gap-y-2 bg-green-50 border border-green-200 rounded-xl p-4 shadow-inner">
                             <div>
@@ -1878,6 +922,16 @@ const Medecin: React.FC<{ token: string }> = ({ token }) => {
                         </li>
                       );
                     })}
+                    {historyCursor && (
+                      <li className="pt-4 flex justify-center">
+                        <button
+                          onClick={() => fetchHistory(historyCursor)}
+                          className="px-4 py-2 bg-gray-100 hover:bg-gray-200 text-gray-700 rounded-lg transition-colors text-sm"
+                        >
+                          Charger plus
+                        </button>
+                      </li>
+                    )}
                   </ul>
                 )}
               </div>
@@ -2341,30 +1395,34 @@ function DiseaseProfilesComparison({ diseases }: { diseases: string[] }) {
   );
 }
 
-// Ajoute la zone de saisie et l'affichage des notes du médecin sous le résultat principal
-function MedecinNotesZone({ predictionId, token }: { predictionId: number, token: string }) {
+// Notes d'une prédiction par pages de 50 (X-Next-Cursor) ; X-Total-Count sert à la numérotation
+function usePagedNotes(predictionId: number, token: string) {
   const [notes, setNotes] = React.useState<{ note: string; date: string }[]>([]);
   const [loading, setLoading] = React.useState(false);
-  const [noteInput, setNoteInput] = React.useState("");
-  const [error, setError] = React.useState<string | null>(null);
-  const [submitting, setSubmitting] = React.useState(false);
-  const [editIndex, setEditIndex] = React.useState<number | null>(null);
-  const [editValue, setEditValue] = React.useState<string>("");
+  const [nextCursor, setNextCursor] = React.useState<string | null>(null);
+  const [total, setTotal] = React.useState<number | null>(null);
 
-  // Récupère toutes les notes à chaque changement de predictionId
-  const fetchNotes = React.useCallback(() => {
+  const fetchNotes = React.useCallback((cursor: string | null = null) => {
     if (!predictionId) return;
-    setLoading(true);
-    fetch(`http://localhost:8000/prediction/${predictionId}/notes`, {
+    if (!cursor) setLoading(true);
+    const params = new URLSearchParams({ limit: "50" });
+    if (cursor) params.set("cursor", cursor);
+    fetch(`http://localhost:8000/prediction/${predictionId}/notes?${params}`, {
       headers: { Authorization: `Bearer ${token}` }
     })
       .then(async res => {
         if (!res.ok) throw new Error("Erreur lors de la récupération des notes");
         const data = await res.json();
-        if (data && Array.isArray(data.notes)) setNotes(data.notes);
-        else setNotes([]);
+        const page = data && Array.isArray(data.notes) ? data.notes : [];
+        setNotes(prev => (cursor ? [...prev, ...page] : page));
+        setNextCursor(res.headers.get("X-Next-Cursor"));
+        const count = res.headers.get("X-Total-Count");
+        if (count !== null) setTotal(Number(count));
+      })
+      .catch(() => {
+        if (!cursor) setNotes([]);
+        setNextCursor(null);
       })
-      .catch(() => setNotes([]))
       .finally(() => setLoading(false));
   }, [predictionId, token]);
 
@@ -2372,6 +1430,33 @@ function MedecinNotesZone({ predictionId, token }: { predictionId: number, token
     fetchNotes();
   }, [fetchNotes]);
 
+  return { notes, loading, nextCursor, total, fetchNotes };
+}
+
+function LoadMoreNotes({ cursor, onLoad }: { cursor: string | null; onLoad: (cursor: string) => void }) {
+  if (!cursor) return null;
+  return (
+    <div className="flex justify-center mt-4">
+      <button
+        type="button"
+        onClick={() => onLoad(cursor)}
+        className="px-4 py-2 bg-gray-100 hover:bg-gray-200 text-gray-700 rounded-lg transition-colors text-sm"
+      >
+        Charger plus
+      </button>
+    </div>
+  );
+}
+
+// Ajoute la zone de saisie et l'affichage des notes du médecin sous le résultat principal
+function MedecinNotesZone({ predictionId, token }: { predictionId: number, token: string }) {
+  const { notes, loading, nextCursor, total, fetchNotes } = usePagedNotes(predictionId, token);
+  const [noteInput, setNoteInput] = React.useState("");
+  const [error, setError] = React.useState<string | null>(null);
+  const [submitting, setSubmitting] = React.useState(false);
+  const [editIndex, setEditIndex] = React.useState<number | null>(null);
+  const [editValue, setEditValue] = React.useState<string>("");
+
   // Ajoute une note (et recharge la liste après ajout)
   const handleAddNote = async (e?: React.FormEvent) => {
     if (e) e.preventDefault();
@@ -2533,7 +1618,7 @@ function MedecinNotesZone({ predictionId, token }: { predictionId: number, token
                       <rect x="9" y="2" width="6" height="20" rx="3" fill="#38bdf8" />
                       <rect x="2" y="9" width="20" height="6" rx="3" fill="#22c55e" />
                     </svg>
-                    Note {notes.length - idx}
+                    Note {(total ?? notes.length) - idx}
                   </span>
                   <span className="text-xs text-gray-400 ml-2">
                     {new Date(n.date).toLocaleString("fr-FR", {
@@ -2579,6 +1664,7 @@ function MedecinNotesZone({ predictionId, token }: { predictionId: number, token
             ))}
           </ul>
         )}
+        <LoadMoreNotes cursor={nextCursor} onLoad={fetchNotes} />
       </div>
       <style>
         {`
@@ -2596,24 +1682,7 @@ function MedecinNotesZone({ predictionId, token }: { predictionId: number, token
 
 // Affiche les notes en lecture seule
 function ReadOnlyNotes({ predictionId, token }: { predictionId: number, token: string }) {
-  const [notes, setNotes] = React.useState<{ note: string; date: string }[]>([]);
-  const [loading, setLoading] = React.useState(false);
-
-  React.useEffect(() => {
-    if (!predictionId) return;
-    setLoading(true);
-    fetch(`http://localhost:8000/prediction/${predictionId}/notes`, {
-      headers: { Authorization: `Bearer ${token}` }
-    })
-      .then(async res => {
-        if (!res.ok) throw new Error("Erreur lors de la récupération des notes");
-        const data = await res.json();
-        if (data && Array.isArray(data.notes)) setNotes(data.notes);
-        else setNotes([]);
-      })
-      .catch(() => setNotes([]))
-      .finally(() => setLoading(false));
-  }, [predictionId, token]);
+  const { notes, loading, nextCursor, total, fetchNotes } = usePagedNotes(predictionId, token);
 
   return (
     <div>
@@ -2638,7 +1707,7 @@ function ReadOnlyNotes({ predictionId, token }: { predictionId: number, token: s
                     <rect x="9" y="2" width="6" height="20" rx="3" fill="#38bdf8" />
                     <rect x="2" y="9" width="20" height="6" rx="3" fill="#22c55e" />
                   </svg>
-                  Note {notes.length - idx}
+                  Note {(total ?? notes.length) - idx}
                 </span>
                 <span className="text-xs text-gray-400 ml-2">
                   {new Date(n.date).toLocaleString("fr-FR", {
@@ -2654,6 +1723,7 @@ function ReadOnlyNotes({ predictionId, token }: { predictionId: number, token: s
           ))}
         </ul>
       )}
+      <LoadMoreNotes cursor={nextCursor} onLoad={fetchNotes} />
     </div>
   );
 }
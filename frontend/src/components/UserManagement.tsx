@@ -25,6 +25,8 @@ const UserManagement: React.FC<UserManagementProps> = ({ token }) => {
   const [editForm, setEditForm] = useState<Partial<User>>({});
   const [searchTerm, setSearchTerm] = useState('');
   const [roleFilter, setRoleFilter] = useState<string>('all');
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [totalCount, setTotalCount] = useState<number | null>(null);
   const [showAddForm, setShowAddForm] = useState(false);
   const [newUser, setNewUser] = useState<Partial<User>>({
     email: '',
@@ -36,16 +38,24 @@ const UserManagement: React.FC<UserManagementProps> = ({ token }) => {
     role: 'patient'
   });
 
-  const fetchUsers = async () => {
+  // Recherche et filtre par rôle faits côté serveur, par pages de 50 (X-Next-Cursor)
+  const fetchUsers = async (cursor: string | null = null) => {
     try {
-      const response = await fetch('http://localhost:8000/users', {
+      const params = new URLSearchParams({ limit: '50' });
+      if (searchTerm.trim()) params.set('q', searchTerm.trim());
+      if (roleFilter !== 'all') params.set('role', roleFilter);
+      if (cursor) params.set('cursor', cursor);
+      const response = await fetch(`http://localhost:8000/users?${params}`, {
         headers: {
           'Authorization': `Bearer ${token}`
         }
       });
       if (response.ok) {
         const data = await response.json();
-        setUsers(data);
+        setUsers(prev => (cursor ? [...prev, ...data] : data));
+        setNextCursor(response.headers.get('X-Next-Cursor'));
+        const total = response.headers.get('X-Total-Count');
+        if (total !== null) setTotalCount(Number(total));
       } else {
         console.error('Erreur lors du chargement des utilisateurs');
       }
@@ -57,8 +67,10 @@ const UserManagement: React.FC<UserManagementProps> = ({ token }) => {
   };
 
   useEffect(() => {
-    fetchUsers();
-  }, [token]);
+    const timer = setTimeout(() => fetchUsers(), 300);
+    return () => clearTimeout(timer);
+    // eslint-disable-next-line
+  }, [token, searchTerm, roleFilter]);
 
   const handleEdit = (user: User) => {
     setEditingUser(user.id);
@@ -155,16 +167,7 @@ const UserManagement: React.FC<UserManagementProps> = ({ token }) => {
     navigate("/admin");
   };
 
-  const filteredUsers = users.filter(user => {
-    const matchesSearch = 
-      user.email.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      (user.nom && user.nom.toLowerCase().includes(searchTerm.toLowerCase())) ||
-      (user.prenom && user.prenom.toLowerCase().includes(searchTerm.toLowerCase()));
-    
-    const matchesRole = roleFilter === 'all' || user.role === roleFilter;
-    
-    return matchesSearch && matchesRole;
-  });
+  const filteredUsers = users;
 
   if (loading) {
     return (
@@ -463,6 +466,22 @@ const UserManagement: React.FC<UserManagementProps> = ({ token }) => {
           Aucun utilisateur trouvé
         </div>
       )}
+
+      {filteredUsers.length > 0 && (
+        <div className="flex items-center justify-between mt-4 text-sm text-gray-600">
+          <span>
+            {filteredUsers.length}{totalCount !== null ? ` / ${totalCount}` : ''} utilisateur(s)
+          </span>
+          {nextCursor && (
+            <button
+              onClick={() => fetchUsers(nextCursor)}
+              className="px-4 py-2 bg-gray-100 hover:bg-gray-200 text-gray-700 rounded-lg transition-colors"
+            >
+              Charger plus
+            </button>
+          )}
+        </div>
+      )}
     </div>
   );
 };
@@ -0,0 +1,25 @@
+// Rapports PDF générés par le backend (GET /prediction/{id}/report, GET /reports/history)
+const API_URL = "http://localhost:8000";
+
+// Télécharge un rapport PDF ; le nom du fichier vient de l'en-tête Content-Disposition du serveur
+export async function downloadReport(path: string, token: string, fallbackName: string) {
+  const res = await fetch(`${API_URL}${path}`, {
+    headers: { Authorization: `Bearer ${token}` }
+  });
+  if (!res.ok) {
+    throw new Error(`Rapport indisponible (${res.status})`);
+  }
+  const blob = await res.blob();
+  const disposition = res.headers.get("Content-Disposition") || "";
+  const match = disposition.match(/filename\*=utf-8''([^;]+)|filename="?([^";]+)"?/i);
+  const fileName = match ? decodeURIComponent(match[1] || match[2]) : fallbackName;
+
+  const url = URL.createObjectURL(blob);
+  const link = document.createElement("a");
+  link.href = url;
+  link.download = fileName;
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+  URL.revokeObjectURL(url);
+}